@@ -0,0 +1,969 @@
+import argparse
+import glob
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+
+STARTUP_SNIPPET = """
+import sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {src!r})
+import parser, lex
+lex.lexer.input("int main() {{ return 0; }}")
+lex.lexer.token()
+print(time.perf_counter() - t0)
+"""
+
+
+def _run_python(snippet, env=None, args=()):
+    out = subprocess.run(
+        [sys.executable, *args, "-c", snippet],
+        env=env,
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return out
+
+
+def _summarize(name, timings):
+    print(
+        f"{name:<24} min: {min(timings) * 1000:8.2f} ms   median: {statistics.median(timings) * 1000:8.2f} ms"
+        + f"   runs: {len(timings)}"
+    )
+
+
+def bench_startup(args):
+    # Import-to-first-token time of a fresh interpreter with and without the table cache
+    snippet = STARTUP_SNIPPET.format(src=SRC_DIR)
+    for name, cache in (("without table cache", "off"), ("with table cache", args.cache_dir)):
+        env = dict(os.environ)
+        if cache is None:
+            env.pop("CS335_TABLE_CACHE", None)
+        else:
+            env["CS335_TABLE_CACHE"] = cache
+        # Prime the cache (and the OS page cache) before timing
+        _run_python(snippet, env)
+        timings = [float(_run_python(snippet, env).stdout.split()[-1]) for _ in range(args.runs)]
+        _summarize(name, timings)
+
+
+def bench_imports(args):
+    # Summarize `python -X importtime` per top level package
+    out = _run_python(f"import sys; sys.path.insert(0, {SRC_DIR!r}); import {args.module}", args=("-X", "importtime"))
+    self_times = {}
+    total = 0
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        package = name.strip().split(".")[0]
+        self_times[package] = self_times.get(package, 0) + int(self_us)
+        if not name[1:].startswith(" "):
+            # Only top level imports contribute to the total
+            total += int(cumulative_us)
+
+    print(f"{'package':<32}{'self [ms]':>12}{'share':>9}")
+    for package, t in sorted(self_times.items(), key=lambda x: -x[1])[: args.top]:
+        print(f"{package:<32}{t / 1000:12.2f}{100 * t / max(total, 1):8.1f}%")
+    print(f"{'total':<32}{total / 1000:12.2f}")
+    if args.budget is not None and total / 1000 > args.budget:
+        print(f"Import time {total / 1000:.2f} ms exceeds the budget of {args.budget:.2f} ms")
+        sys.exit(1)
+
+
+def _typedef_unit(count):
+    # Synthetic translation unit with `count` typedefs, each used once in a declaration
+    lines = [f"typedef int t{i};" for i in range(count)]
+    lines += ["int main() {"] + [f"    t{i} v{i} = {i};" for i in range(count)] + ["    return 0;", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def bench_typedefs(args):
+    # TYPE_NAME classification cost with the scoped registry vs the old list of names
+    sys.path.insert(0, SRC_DIR)
+    import lex
+    import parser
+    import symtab
+
+    data = _typedef_unit(args.count)
+    names = [f"t{i}" for i in range(args.count)]
+    registry = symtab.TypeNameRegistry()
+    registry.push_scope()
+    for name in names:
+        registry.define(name, "int")
+
+    for name, type_names in (("list", names), ("registry", registry)):
+        lex.TYPE_NAMES = type_names
+        timings = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            lex.lexer.input(data)
+            ntokens = sum(1 for _ in iter(lex.lexer.token, None))
+            timings.append(time.perf_counter() - t0)
+        _summarize(f"lex ({name})", timings)
+    lex.TYPE_NAMES = symtab.TYPE_NAMES
+
+    # End to end parse, the typedefs are registered by the parser itself
+    symtab.push_scope(symtab.new_scope(symtab.get_current_symtab()))
+    parser.populate_global_symbol_table()
+    t0 = time.perf_counter()
+    lex.lexer.lineno = 1
+    parser.parser.parse(data, lexer=lex.lexer, tracking=True)
+    elapsed = time.perf_counter() - t0
+    symtab.pop_scope()
+    if len(parser.GLOBAL_ERROR_LIST) > 0:
+        print("\n".join(parser.GLOBAL_ERROR_LIST))
+        sys.exit(1)
+    print(f"{'parse':<24} {elapsed * 1000:8.2f} ms   typedefs: {args.count}   tokens: {ntokens}")
+
+
+def _lex_all(lexer, data):
+    # Token stream (and any diagnostics printed) of a fresh lexer run over data
+    out = io.StringIO()
+    with redirect_stdout(out):
+        lexer.lineno = 1
+        lexer.input(data)
+        toks = [(t.type, t.value, t.lineno, t.lexpos) for t in iter(lexer.token, None)]
+    return toks, out.getvalue()
+
+
+def bench_lexers(args):
+    # Differential check of the fast lexer against PLY on every source under tests/ and stdlib/,
+    # followed by the throughput of both engines
+    sys.path.insert(0, SRC_DIR)
+    import lex
+
+    sources = []
+    for d in ("tests", "stdlib"):
+        for root, _, files in os.walk(os.path.join(ROOT_DIR, d)):
+            sources += [os.path.join(root, f) for f in sorted(files)]
+    ply_lexer, fast_lexer = lex.get_lexer("ply"), lex.get_lexer("fast")
+
+    mismatches = 0
+    ntokens = 0
+    for source in sorted(sources):
+        with open(source, "r") as f:
+            data = f.read()
+        expected, got = _lex_all(ply_lexer, data), _lex_all(fast_lexer, data)
+        ntokens += len(expected[0])
+        if expected == got:
+            continue
+        mismatches += 1
+        diff = next((i for i, (a, b) in enumerate(zip(expected[0], got[0])) if a != b), None)
+        if diff is None:
+            print(f"MISMATCH {os.path.relpath(source, ROOT_DIR)}: {len(expected[0])} vs {len(got[0])} tokens")
+        else:
+            print(f"MISMATCH {os.path.relpath(source, ROOT_DIR)}: ply {expected[0][diff]} fast {got[0][diff]}")
+    print(f"{len(sources)} files, {ntokens} tokens, {mismatches} mismatches")
+
+    data = "".join(open(source, "r").read() for source in sorted(sources)) * args.repeat
+    for name, lexer in (("ply", ply_lexer), ("fast", fast_lexer)):
+        timings = []
+        for _ in range(args.runs):
+            with redirect_stdout(io.StringIO()):
+                t0 = time.perf_counter()
+                lexer.input(data)
+                ntokens = sum(1 for _ in iter(lexer.token, None))
+                timings.append(time.perf_counter() - t0)
+        _summarize(f"lex ({name})", timings)
+    print(f"{ntokens} tokens per run")
+    if mismatches > 0:
+        sys.exit(1)
+
+
+REDUCTIONS_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+import lex, parser
+from preprocessor import preprocess
+
+reductions = [0]
+def counted(func):
+    def production(p):
+        reductions[0] += 1
+        func(p)
+    return production
+for production in parser.parser.productions:
+    if production.callable is not None:
+        production.callable = counted(production.callable)
+
+data = preprocess({path!r}).data
+lexer = lex.get_lexer("ply")
+lexer.input(data)
+ntokens = sum(1 for _ in iter(lexer.token, None))
+
+parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+parser.populate_global_symbol_table()
+reductions[0] = 0
+lexer.lineno = 1
+t0 = time.perf_counter()
+parser.parser.parse(data, lexer=lexer, tracking=True)
+elapsed = time.perf_counter() - t0
+print(json.dumps([ntokens, reductions[0], elapsed]))
+"""
+
+
+LOOKUPS_SNIPPET = """
+import json, sys
+sys.path.insert(0, {src!r})
+import lex, parser, symtab
+from preprocessor import preprocess
+
+calls = {{"lookup": 0, "lookup_current_table": 0, "_search_for_function": 0}}
+def counted(name):
+    func = getattr(symtab.SymbolTable, name)
+    def method(*args, **kwargs):
+        calls[name] += 1
+        return func(*args, **kwargs)
+    setattr(symtab.SymbolTable, name, method)
+for name in calls:
+    counted(name)
+
+data = preprocess({path!r}).data
+parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+parser.populate_global_symbol_table()
+parser.parser.parse(data, lexer=lex.get_lexer("ply"), tracking=True)
+resolver = getattr(symtab, "OVERLOADS", None)
+print(json.dumps([calls["lookup"], calls["lookup_current_table"], calls["_search_for_function"], getattr(resolver, "hits", 0)]))
+"""
+
+
+def bench_lookups(args):
+    # Symbol table lookups made while parsing every program under tests/final. lookup counts every
+    # level of the scope chain visited, lookup_current_table the per level probes of all the dicts and
+    # function the probes of the function tables alone
+    sources = sorted(glob.glob(os.path.join(ROOT_DIR, "tests", "final", "*.c")))
+    print(f"{'program':<36}{'lookup':>10}{'per level':>12}{'function':>12}{'cache hits':>12}")
+    totals = [0, 0, 0, 0]
+    for source in sources:
+        snippet = LOOKUPS_SNIPPET.format(src=SRC_DIR, path=os.path.relpath(source, ROOT_DIR))
+        counts = json.loads(_run_python(snippet).stdout.splitlines()[-1])
+        totals = [a + b for a, b in zip(totals, counts)]
+        print(f"{os.path.basename(source):<36}{counts[0]:>10}{counts[1]:>12}{counts[2]:>12}{counts[3]:>12}")
+    print(f"{'total':<36}{totals[0]:>10}{totals[1]:>12}{totals[2]:>12}{totals[3]:>12}")
+
+
+MEMORY_SNIPPET = """
+import json, sys, tracemalloc
+sys.path.insert(0, {src!r})
+import lex, parser, symtab
+
+with open({path!r}, "r") as f:
+    data = f.read()
+lexer = lex.get_lexer("ply")
+parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+parser.populate_global_symbol_table()
+tracemalloc.start()
+parser.parser.parse(data, lexer=lexer, tracking=True)
+snapshot = tracemalloc.take_snapshot()
+current, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+assert len(parser.GLOBAL_ERROR_LIST) == 0, parser.GLOBAL_ERROR_LIST[:5]
+
+# Memory still allocated by the symbol table module once parsing is done
+stats = snapshot.filter_traces([tracemalloc.Filter(True, symtab.__file__), tracemalloc.Filter(True, "*symbols.py")])
+entries = [e for t in symtab.get_tabname_mapping().values() for e in (*t._symtab_variables.values(), *t._symtab_functions.values())]
+print(json.dumps([current, peak, sum(s.size for s in stats.statistics("filename")), len(entries), sum(map(sys.getsizeof, entries))]))
+"""
+
+
+def _functions_unit(lines):
+    # Many small functions with a couple of locals and temporaries, about `lines` lines long
+    body = [
+        "int f{i}(int a, int b) {{",
+        "    int c, d;",
+        "    c = a * b + a;",
+        "    d = c - b * 2;",
+        "    return c + d;",
+        "}}",
+    ]
+    out = []
+    for i in range(max(lines // len(body), 1)):
+        out += [line.format(i=i) for line in body]
+    return "\n".join(out + ["int main() {", "    return f0(1, 2);", "}"]) + "\n"
+
+
+def bench_memory(args):
+    # tracemalloc report of parsing a large unit with symbol table entries stored as dicts and as
+    # the __slots__ records of symbols.py
+    # entries: shallow size of the entry objects, symtab: everything allocated from symtab.py that is
+    # still alive after parsing, retained / peak: the whole process
+    print(
+        f"{'storage':<10}{'symbols':>10}{'entries [MiB]':>15}{'B / entry':>11}{'symtab [MiB]':>14}"
+        + f"{'retained [MiB]':>16}{'peak [MiB]':>12}"
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "functions.c")
+        with open(path, "w") as f:
+            f.write(_functions_unit(args.lines))
+        for name in ("dict", "records"):
+            env = dict(os.environ)
+            env["CS335_SYMBOL_RECORDS"] = "off" if name == "dict" else "on"
+            out = _run_python(MEMORY_SNIPPET.format(src=SRC_DIR, path=path), env)
+            current, peak, symtab_size, entries, entries_size = json.loads(out.stdout.splitlines()[-1])
+            print(
+                f"{name:<10}{entries:>10}{entries_size / 2**20:>15.2f}{entries_size / entries:>11.1f}"
+                + f"{symtab_size / 2**20:>14.2f}{current / 2**20:>16.2f}{peak / 2**20:>12.2f}"
+            )
+
+
+def bench_reductions(args):
+    # Parser reductions per token and parse time of every program under tests/final
+    sources = sorted(glob.glob(os.path.join(ROOT_DIR, "tests", "final", "*.c")))
+    print(f"{'program':<36}{'tokens':>8}{'reductions':>12}{'per token':>11}{'parse [ms]':>12}")
+    total_tokens = total_reductions = total_time = 0
+    for source in sources:
+        runs = []
+        for _ in range(args.runs):
+            snippet = REDUCTIONS_SNIPPET.format(src=SRC_DIR, path=os.path.relpath(source, ROOT_DIR))
+            runs.append(json.loads(_run_python(snippet).stdout.splitlines()[-1]))
+        ntokens, nreductions, _ = runs[0]
+        elapsed = min(r[2] for r in runs)
+        total_tokens, total_reductions, total_time = (
+            total_tokens + ntokens,
+            total_reductions + nreductions,
+            total_time + elapsed,
+        )
+        name = os.path.basename(source)
+        print(f"{name:<36}{ntokens:>8}{nreductions:>12}{nreductions / ntokens:>11.2f}{elapsed * 1000:>12.2f}")
+    print(
+        f"{'total':<36}{total_tokens:>8}{total_reductions:>12}{total_reductions / total_tokens:>11.2f}"
+        + f"{total_time * 1000:>12.2f}"
+    )
+
+
+SCALING_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+import lex, parser
+
+with open({path!r}, "r") as f:
+    data = f.read()
+lexer = lex.get_lexer("ply")
+parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+parser.populate_global_symbol_table()
+t0 = time.perf_counter()
+tree = parser.parser.parse(data, lexer=lexer, tracking=True)
+elapsed = time.perf_counter() - t0
+assert len(parser.GLOBAL_ERROR_LIST) == 0, parser.GLOBAL_ERROR_LIST
+print(json.dumps([sum(len(t["code"]) for t in tree), elapsed]))
+"""
+
+
+def _scaled_stats_unit(scale):
+    # tests/final/stats.c with the loop nest in main repeated `scale` times
+    with open(os.path.join(ROOT_DIR, "tests", "final", "stats.c"), "r") as f:
+        lines = f.read().splitlines()
+    begin = lines.index("int main() {") + 3
+    end = begin + 6
+    return "\n".join(lines[:begin] + lines[begin:end] * scale + lines[end:]) + "\n"
+
+
+def bench_scaling(args):
+    # Parse time (semantic actions included) of one function growing linearly in size. With
+    # linear IR accumulation the time per instruction stays flat as the function grows
+    print(f"{'scale':>8}{'instructions':>14}{'parse [ms]':>12}{'us / instr':>12}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for scale in args.scales:
+            path = os.path.join(tmpdir, f"stats_{scale}.c")
+            with open(path, "w") as f:
+                f.write(_scaled_stats_unit(scale))
+            runs = [
+                json.loads(_run_python(SCALING_SNIPPET.format(src=SRC_DIR, path=path)).stdout.splitlines()[-1])
+                for _ in range(args.runs)
+            ]
+            ninstructions = runs[0][0]
+            elapsed = min(r[1] for r in runs)
+            print(f"{scale:>8}{ninstructions:>14}{elapsed * 1000:>12.2f}{elapsed * 1e6 / ninstructions:>12.2f}")
+
+
+DATAFLOW_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+import dot, ir, lex, parser
+
+with open({path!r}, "r") as f:
+    data = f.read()
+lexer = lex.get_lexer("ply")
+parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+parser.populate_global_symbol_table()
+tree = parser.parser.parse(data, lexer=lexer, tracking=True)
+assert len(parser.GLOBAL_ERROR_LIST) == 0, parser.GLOBAL_ERROR_LIST
+units = dot.parse_code(tree, "AST", False, False)
+
+stats = [0, 0]
+solve = dot.solve
+def counted(cfg, problem):
+    result = solve(cfg, problem)
+    stats[0] += len(cfg.blocks)
+    stats[1] += result.visits
+    return result
+dot.solve = counted
+
+t0 = time.perf_counter()
+optimized = [dot.optimize_ir(unit) for unit in units]
+elapsed = time.perf_counter() - t0
+print(json.dumps([sum(map(len, units)), sum(map(len, optimized)), stats[0], stats[1], elapsed]))
+"""
+
+
+def bench_dataflow(args):
+    # optimize_ir on tests/final/stats.c with main scaled up. Every pass runs to a fixpoint, the
+    # solver visits per block stay constant and the time per instruction flat
+    print(
+        f"{'scale':>8}{'instructions':>14}{'optimized':>11}{'blocks':>9}{'visits / block':>16}"
+        + f"{'optimize [ms]':>15}{'us / instr':>12}"
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for scale in args.scales:
+            path = os.path.join(tmpdir, f"stats_{scale}.c")
+            with open(path, "w") as f:
+                f.write(_scaled_stats_unit(scale))
+            before, after, blocks, visits, elapsed = json.loads(
+                _run_python(DATAFLOW_SNIPPET.format(src=SRC_DIR, path=path)).stdout.splitlines()[-1]
+            )
+            print(
+                f"{scale:>8}{before:>14}{after:>11}{blocks:>9}{visits / max(blocks, 1):>16.2f}"
+                + f"{elapsed * 1000:>15.2f}{elapsed * 1e6 / before:>12.2f}"
+            )
+
+
+DCE_SNIPPET = """
+import io, json, sys
+from contextlib import redirect_stdout
+sys.path.insert(0, {src!r})
+import dot, ir, lex, parser
+from preprocessor import preprocess
+
+unit = preprocess({path!r})
+lexer = lex.get_lexer("ply")
+lexer.unit = unit
+parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+parser.populate_global_symbol_table()
+with redirect_stdout(io.StringIO()):
+    tree = parser.parser.parse(unit.data, lexer=lexer, tracking=True)
+    parser.pop_scope()
+    assert len(parser.GLOBAL_ERROR_LIST) == 0 and tree is not None
+    codes = dot.parse_code(tree, "AST", False, False)
+
+removed = {{}}
+dce = dot.compiler_optimization_dead_code_elimination
+def counted(code):
+    new_code, no_change = dce(code)
+    for before, after in zip(ir.split_functions(code), ir.split_functions(new_code)):
+        if before[0].op is ir.Op.LABEL:
+            name = before[0].args[0].text
+            removed[name] = removed.get(name, 0) + len(before) - len(after)
+    return new_code, no_change
+passes = dot.OPTIMIZATION_PASSES[:-1] + (counted,)
+
+rows = []
+for unit in codes:
+    optimized = dot.optimize_ir(unit, passes)
+    for before, after in zip(ir.split_functions(unit), ir.split_functions(optimized)):
+        if before[0].op is ir.Op.LABEL:
+            name = before[0].args[0].text
+            rows.append([name, len(before), len(after), removed.get(name, 0)])
+print(json.dumps(rows))
+"""
+
+
+def bench_dce(args):
+    # Instructions of every function of tests/final before and after optimize_ir, and how many of
+    # them dead code elimination removed
+    print(f"{'function':<52}{'instructions':>14}{'optimized':>11}{'dce removed':>13}")
+    totals = [0, 0, 0]
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "tests", "final", "*.c"))):
+        try:
+            out = _run_python(DCE_SNIPPET.format(src=SRC_DIR, path=path))
+        except subprocess.CalledProcessError:
+            print(f"{os.path.basename(path)}: does not compile, skipped")
+            continue
+        for name, before, after, removed in json.loads(out.stdout.splitlines()[-1]):
+            print(f"{os.path.basename(path) + ':' + name:<52}{before:>14}{after:>11}{removed:>13}")
+            totals[0] += before
+            totals[1] += after
+            totals[2] += removed
+    print(f"{'total':<52}{totals[0]:>14}{totals[1]:>11}{totals[2]:>13}")
+
+
+FOLD_OPERATORS = ["+", "-", "*", "/", "%", "<<", ">>", "&", "|", "^", "<", "<=", "==", "!=", "&&", "||"]
+FOLD_INTS = ["0", "1", "2", "7", "-7", "31", "32", "65536", "2147483647", "-2147483648"]
+FOLD_FLOATS = ["0.0", "0.1", "1.5", "-2.5", "3.4e38"]
+
+
+def bench_folding(args):
+    # Folding of constant binary instructions, through consteval against the eval() of the text
+    # of the instruction it replaced, along with the number of results that differ
+    sys.path.insert(0, SRC_DIR)
+    from consteval import evaluate_binary
+    from ir import FloatConst, IntConst, operand
+
+    def legacy(op, a, b, _type):
+        if op == "&&":
+            op = "and"
+        elif op == "||":
+            op = "or"
+        try:
+            res = eval(" ".join((a.text, op, b.text)))
+            res = int(res) if isinstance(res, bool) else res
+            return operand(str(res))
+        except Exception:
+            return None
+
+    ints = [IntConst(x) for x in FOLD_INTS]
+    floats = [FloatConst(x) for x in FOLD_FLOATS]
+    # Shift counts stay small, eval would build huge ints for the others
+    cases = [
+        (op, a, b, "int") for op in FOLD_OPERATORS for a in ints for b in ints if op not in ("<<", ">>") or b.value < 64
+    ]
+    cases += [(op, a, b, "float") for op in FOLD_OPERATORS for a in floats for b in floats + ints[:3]]
+
+    counts = {"same": 0, "different": 0, "only eval": 0, "only consteval": 0, "neither": 0}
+    for case in cases:
+        old, new = legacy(*case), evaluate_binary(*case)
+        if old is None or new is None:
+            key = "neither" if old is new else "only eval" if new is None else "only consteval"
+        else:
+            key = "same" if old.text == new.text else "different"
+        counts[key] += 1
+
+    timings = []
+    for f in (legacy, evaluate_binary):
+        t0 = time.perf_counter()
+        for _ in range(args.runs):
+            for case in cases:
+                f(*case)
+        timings.append((time.perf_counter() - t0) * 1e6 / (args.runs * len(cases)))
+    print(f"{len(cases)} constant binary instructions: " + ", ".join(f"{v} {k}" for k, v in counts.items()))
+    print(f"{'eval [us]':>16}{'consteval [us]':>16}{'speedup':>10}")
+    print(f"{timings[0]:>16.2f}{timings[1]:>16.2f}{timings[0] / timings[1]:>9.1f}x")
+
+
+def bench_nesting(args):
+    # Cost of looking up a global variable, a builtin operator and a type from the innermost of
+    # `depth` nested block scopes, with the flattened scope index and by walking the parents
+    sys.path.insert(0, SRC_DIR)
+    import parser
+    import symtab
+
+    print(f"{'depth':>8}{'indexed [us]':>16}{'walking [us]':>16}")
+    for depth in args.depths:
+        parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+        parser.populate_global_symbol_table()
+        table = parser.get_current_symtab()
+        table.insert({"name": "g", "type": "int", "is_array": False, "dimensions": []})
+        for i in range(depth):
+            parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+            parser.get_current_symtab().insert({"name": f"v{i}", "type": "int", "is_array": False, "dimensions": []})
+        table = parser.get_current_symtab()
+
+        timings = []
+        for enabled in (True, False):
+            symtab.SCOPE_INDEX.enabled = enabled
+            t0 = time.perf_counter()
+            for _ in range(args.lookups):
+                table.lookup("g")
+                table.lookup("+(int,int)")
+                table.lookup_type("struct missing")
+            timings.append((time.perf_counter() - t0) * 1e6 / (3 * args.lookups))
+        symtab.SCOPE_INDEX.enabled = True
+
+        for _ in range(depth + 1):
+            parser.pop_scope()
+        print(f"{depth:>8}{timings[0]:>16.3f}{timings[1]:>16.3f}")
+
+
+def bench_scopes(args):
+    # Memory per block scope (with the entries of the temporaries in it), and the memory retained
+    # by parsing tests/final/stats.c with main scaled up, which opens two scopes per loop nest
+    sys.path.insert(0, SRC_DIR)
+    import tracemalloc
+
+    import lex
+    import parser
+    import symtab
+
+    parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+    parser.populate_global_symbol_table()
+    for temporaries in (0, 2, 8):
+        tracemalloc.start()
+        for _ in range(args.count):
+            parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+            for _ in range(temporaries):
+                symtab.get_tmp_var("int")
+            parser.pop_scope()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{f'scope with {temporaries} temporaries':<32}{size / args.count:10.1f} B")
+
+    data = _scaled_stats_unit(args.scale)
+    nscopes = len(symtab.get_tabname_mapping())
+    tracemalloc.start()
+    parser.parser.parse(data, lexer=lex.get_lexer("ply"), tracking=True)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    nscopes = len(symtab.get_tabname_mapping()) - nscopes
+    print(f"{f'stats.c x{args.scale}':<32}{size / 2**20:10.2f} MiB   scopes: {nscopes}")
+
+
+TYPE_SPELLINGS = ["int", "int*", "char**", "unsigned long int", "float[3][2]", "int*[]", "struct foo", "union bar*"]
+
+
+def bench_types(args):
+    # Per use cost of the type queries the frontend makes, re-parsing the spelling every time
+    # against the interned type_utils.Type
+    sys.path.insert(0, SRC_DIR)
+    from symtab import DATATYPE2SIZE, INTEGER_TYPES
+    from type_utils import Type, _parse_type_fields, get_type_fields
+
+    queries = [
+        ("fields", _parse_type_fields, get_type_fields),
+        ("pointer level", lambda t: t.count("*"), lambda t: Type.of(t).pointer_lvl),
+        ("is integer", lambda t: t.upper() in INTEGER_TYPES, lambda t: Type.of(t).is_integer),
+        ("size", lambda t: DATATYPE2SIZE.get(t.upper(), None), lambda t: Type.of(t).size),
+    ]
+    print(f"{'query':<16}{'strings [ns]':>16}{'interned [ns]':>16}")
+    for name, old, new in queries:
+        for t in TYPE_SPELLINGS:
+            assert old(t) == new(t), (name, t)
+        timings = []
+        for f in (old, new):
+            t0 = time.perf_counter()
+            for _ in range(args.runs):
+                for t in TYPE_SPELLINGS:
+                    f(t)
+            timings.append((time.perf_counter() - t0) * 1e9 / (args.runs * len(TYPE_SPELLINGS)))
+        print(f"{name:<16}{timings[0]:>16.1f}{timings[1]:>16.1f}")
+
+
+def bench_casts(args):
+    # type_cast on every pair of basic types (including the ambiguous ones), through the
+    # precomputed conversion table against the if-chain on upper cased strings it replaced
+    sys.path.insert(0, SRC_DIR)
+    import parser
+    from symtab import BASIC_TYPES
+    from type_utils import _usual_arithmetic_conversion
+
+    def ladder(s1, s2):
+        s1, s2 = s1["type"].upper(), s2["type"].upper()
+        if s1 not in BASIC_TYPES or s2 not in BASIC_TYPES:
+            return None
+        result = _usual_arithmetic_conversion(s1, s2)
+        return None if result is None else {"type": result.lower(), "pointer_lvl": 0}
+
+    def table(s1, s2):
+        try:
+            return parser.type_cast(s1, s2)
+        except SyntaxError:
+            return None
+
+    pairs = [({"type": t1.lower()}, {"type": t2.lower()}) for t1 in BASIC_TYPES for t2 in BASIC_TYPES]
+    for s1, s2 in pairs:
+        assert ladder(s1, s2) == table(s1, s2), (s1, s2)
+    parser.GLOBAL_ERROR_LIST.clear()
+    nerrors = sum(ladder(s1, s2) is None for s1, s2 in pairs)
+
+    timings = []
+    for f in (ladder, table):
+        t0 = time.perf_counter()
+        for _ in range(args.runs):
+            for s1, s2 in pairs:
+                f(s1, s2)
+        timings.append((time.perf_counter() - t0) * 1e9 / (args.runs * len(pairs)))
+        parser.GLOBAL_ERROR_LIST.clear()
+    print(f"{len(pairs)} pairs of basic types, {nerrors} of them ambiguous")
+    print(f"{'if-chain [ns]':>16}{'table [ns]':>16}")
+    print(f"{timings[0]:>16.1f}{timings[1]:>16.1f}")
+
+
+LAYOUT_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+import lex, parser, symtab
+
+with open({path!r}, "r") as f:
+    data = f.read()
+calls = 0
+compute_storage_size = symtab.compute_storage_size
+
+
+def counted(*args, **kwargs):
+    global calls
+    calls += 1
+    return compute_storage_size(*args, **kwargs)
+
+
+symtab.compute_storage_size = counted
+lexer = lex.get_lexer("ply")
+parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+parser.populate_global_symbol_table()
+t0 = time.perf_counter()
+parser.parser.parse(data, lexer=lexer, tracking=True)
+elapsed = time.perf_counter() - t0
+assert len(parser.GLOBAL_ERROR_LIST) == 0, parser.GLOBAL_ERROR_LIST[:5]
+print(json.dumps([calls, elapsed]))
+"""
+
+
+def _nested_structs_unit(depth):
+    # tests/working/custom_types.c generalized: struct s<i> nests struct s<i-1>, and main declares a
+    # variable of every struct, then assigns one field of each
+    lines = ["struct s0 {", "    int k;", "    float kk;", "};", ""]
+    for i in range(1, depth):
+        lines += [f"struct s{i} {{", f"    struct s{i - 1} g;", "    int a;", "    float b;", "};", ""]
+    lines += ["int main() {"]
+    lines += [f"    struct s{i} v{i};" for i in range(1, depth)]
+    lines += [f"    v{i}.a = {i};" for i in range(1, depth)]
+    lines += ["    return 0;", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def bench_layout(args):
+    # Storage size computations (calls of compute_storage_size, recursive ones included) and parse
+    # time for chains of nested structs
+    print(f"{'depth':>8}{'size calls':>14}{'parse [ms]':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for depth in args.depths:
+            path = os.path.join(tmp, f"structs_{depth}.c")
+            with open(path, "w") as f:
+                f.write(_nested_structs_unit(depth))
+            calls, elapsed = json.loads(
+                _run_python(LAYOUT_SNIPPET.format(src=SRC_DIR, path=path)).stdout.splitlines()[-1]
+            )
+            print(f"{depth:>8}{calls:>14}{elapsed * 1000:>12.2f}")
+
+
+def _legacy_symtab_csv(table, path, first):
+    # What SymbolTable.display used to do for every table: reopen the file in append mode and
+    # format each row with f-strings
+    import csv
+
+    header = ["SYMBOL TABLE", "FUNCTION SCOPE", "VARIABLE/FUNCTION", "NAME", "TYPE", "SIZE", "OFFSET"]
+    header += ["DIMENSIONS", "RETURN TYPE", "PARAMETERS", "NAME RESOLUTION"]
+    with open(path, mode="w" if first else "a+") as sym_file:
+        sym_writer = csv.writer(sym_file, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        if first:
+            sym_writer.writerow(header)
+        for k, v in table._symtab_variables.items():
+            if v["name"][: min(2, len(k))] == "__":
+                continue
+            sym_writer.writerow(
+                [
+                    f"{table.table_name}",
+                    f"{table.func_scope}",
+                    "Variable",
+                    f"{k}",
+                    f"{v['type'] + '*' * v['pointer_lvl']}",
+                    f"{v['size']}",
+                    f"{v['offset']}",
+                    "" if not v["is_array"] else f"{v['dimensions']}",
+                    "",
+                    "",
+                    "",
+                ]
+            )
+        for k, v in table._symtab_functions.items():
+            if v["name"][: min(1, len(k))] == "__" or not v["name"][0].isalpha():
+                continue
+            sym_writer.writerow(
+                [
+                    f"{table.table_name}",
+                    f"{table.func_scope}",
+                    "Function",
+                    f"{v['name']}",
+                    "",
+                    "",
+                    "",
+                    "",
+                    f"{v['return type']}",
+                    f"{v['parameter types']}",
+                    f"{k}",
+                ]
+            )
+
+
+def bench_symexport(args):
+    # Symbol table export of a generated unit with many functions: one append mode open per table
+    # as display used to do, against export_symbol_tables in every format
+    sys.path.insert(0, SRC_DIR)
+    import lex
+    import parser
+    import symtab
+
+    parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+    parser.populate_global_symbol_table()
+    parser.parser.parse(_functions_unit(args.lines), lexer=lex.get_lexer("ply"), tracking=True)
+    gtab = parser.pop_scope()
+    tables = []
+    stack = [gtab]
+    while len(stack) > 0:
+        tables.append(stack.pop())
+        stack.extend(reversed(tables[-1].children))
+
+    print(f"{len(tables)} tables")
+    print(f"{'export':<20}{'records':>10}{'time [ms]':>12}{'size [KiB]':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "legacy.csv")
+        t0 = time.perf_counter()
+        for i, table in enumerate(tables):
+            _legacy_symtab_csv(table, path, i == 0)
+        elapsed = time.perf_counter() - t0
+        with open(path, "r") as f:
+            nrecords = sum(1 for _ in f) - 1
+        print(f"{'legacy csv':<20}{nrecords:>10}{elapsed * 1000:>12.2f}{os.path.getsize(path) / 1024:>12.1f}")
+        for fmt in symtab.FORMATS:
+            path = os.path.join(tmp, f"symtables.{fmt}")
+            t0 = time.perf_counter()
+            with open(path, "wb", buffering=1 << 20) as f:
+                nrecords = symtab.export_symbol_tables(gtab, f, fmt)
+            elapsed = time.perf_counter() - t0
+            print(f"{fmt:<20}{nrecords:>10}{elapsed * 1000:>12.2f}{os.path.getsize(path) / 1024:>12.1f}")
+
+
+def _scaled_arraynptr_unit(scale):
+    # tests/final/arraynptr.c with the statements of main repeated `scale` times
+    with open(os.path.join(ROOT_DIR, "tests", "final", "arraynptr.c"), "r") as f:
+        lines = f.read().splitlines()
+    begin = lines.index("    int *ptr;") + 1
+    end = lines.index("    return a + b;")
+    return "\n".join(lines[:begin] + lines[begin:end] * scale + lines[end:]) + "\n"
+
+
+def bench_profile(args):
+    # cProfile of parsing a pointer heavy program, along with the number of deep copies made
+    sys.path.insert(0, SRC_DIR)
+    import cProfile
+    import copy
+    import pstats
+
+    import lex
+    import parser
+    from preprocessor import preprocess
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, f"arraynptr_{args.scale}.c")
+        with open(path, "w") as f:
+            f.write(_scaled_arraynptr_unit(args.scale))
+        # Run from the repository root so that the @include resolves
+        os.chdir(ROOT_DIR)
+        data = preprocess(path).data
+
+    parser.push_scope(parser.new_scope(parser.get_current_symtab()))
+    parser.populate_global_symbol_table()
+    lexer = lex.get_lexer("ply")
+    profile = cProfile.Profile()
+    profile.enable()
+    parser.parser.parse(data, lexer=lexer, tracking=True)
+    profile.disable()
+    if len(parser.GLOBAL_ERROR_LIST) > 0:
+        print("\n".join(parser.GLOBAL_ERROR_LIST))
+        sys.exit(1)
+
+    stats = pstats.Stats(profile)
+    stats.sort_stats(args.sort).print_stats(args.top)
+    deepcopies = sum(v[1] for k, v in stats.stats.items() if k[2] == "deepcopy" and k[0] == copy.__file__)
+    print(f"copy.deepcopy calls: {deepcopies}")
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Performance reports for the compiler")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    startup = subparsers.add_parser("startup", help="Import-to-first-token time with and without cached tables")
+    startup.add_argument("--runs", type=int, default=10, help="Number of fresh interpreters to time")
+    startup.add_argument("--cache-dir", type=str, default=None, help="Table cache directory to use")
+    startup.set_defaults(func=bench_startup)
+
+    imports = subparsers.add_parser("imports", help="Import time profile summarized per package")
+    imports.add_argument("--module", type=str, default="parser", help="Module to import")
+    imports.add_argument("--top", type=int, default=15, help="Number of packages to report")
+    imports.add_argument("--budget", type=float, default=None, help="Fail if the total import time exceeds this (ms)")
+    imports.set_defaults(func=bench_imports)
+
+    typedefs = subparsers.add_parser("typedefs", help="TYPE_NAME classification on a unit with many typedefs")
+    typedefs.add_argument("--count", type=int, default=5000, help="Number of typedefs to generate")
+    typedefs.add_argument("--runs", type=int, default=5, help="Number of times to lex the unit")
+    typedefs.set_defaults(func=bench_typedefs)
+
+    lexers = subparsers.add_parser("lexers", help="Check the fast lexer against PLY and compare throughput")
+    lexers.add_argument("--runs", type=int, default=5, help="Number of timed runs per engine")
+    lexers.add_argument("--repeat", type=int, default=10, help="Number of copies of the sources to lex per run")
+    lexers.set_defaults(func=bench_lexers)
+
+    reductions = subparsers.add_parser("reductions", help="Parser reductions per token on tests/final")
+    reductions.add_argument("--runs", type=int, default=3, help="Parse time is the best of this many runs")
+    reductions.set_defaults(func=bench_reductions)
+
+    lookups = subparsers.add_parser("lookups", help="Symbol table lookups made while parsing tests/final")
+    lookups.set_defaults(func=bench_lookups)
+
+    memory = subparsers.add_parser("memory", help="Memory held by the symbol tables, dicts against records")
+    memory.add_argument("--lines", type=int, default=100000, help="Approximate length of the generated unit")
+    memory.set_defaults(func=bench_memory)
+
+    scopes = subparsers.add_parser("scopes", help="Memory per block scope")
+    scopes.add_argument("--count", type=int, default=20000, help="Number of scopes to open")
+    scopes.add_argument("--scale", type=int, default=1000, help="Copies of the loop nest in stats.c")
+    scopes.set_defaults(func=bench_scopes)
+
+    types = subparsers.add_parser("types", help="Type queries on spellings against interned types")
+    types.add_argument("--runs", type=int, default=20000, help="Queries of each spelling")
+    types.set_defaults(func=bench_types)
+
+    casts = subparsers.add_parser("casts", help="type_cast on every pair of basic types")
+    casts.add_argument("--runs", type=int, default=200, help="Casts of each pair")
+    casts.set_defaults(func=bench_casts)
+
+    layout = subparsers.add_parser("layout", help="Struct layout work for chains of nested structs")
+    layout.add_argument("--depths", type=int, nargs="+", default=[10, 50, 200], help="Nesting depths")
+    layout.set_defaults(func=bench_layout)
+
+    symexport = subparsers.add_parser("symexport", help="Symbol table export in every format")
+    symexport.add_argument("--lines", type=int, default=20000, help="Approximate length of the generated unit")
+    symexport.set_defaults(func=bench_symexport)
+
+    dataflow = subparsers.add_parser("dataflow", help="optimize_ir on tests/final/stats.c with main scaled up")
+    dataflow.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 400], help="Copies of the loop nest")
+    dataflow.set_defaults(func=bench_dataflow)
+
+    dce = subparsers.add_parser("dce", help="Instructions removed by dead code elimination per function of tests/final")
+    dce.set_defaults(func=bench_dce)
+
+    folding = subparsers.add_parser("folding", help="Constant folding with consteval against eval()")
+    folding.add_argument("--runs", type=int, default=20, help="Passes over the instructions")
+    folding.set_defaults(func=bench_folding)
+
+    nesting = subparsers.add_parser("nesting", help="Symbol table lookup cost against the nesting depth")
+    nesting.add_argument("--depths", type=int, nargs="+", default=[1, 4, 16, 64, 256], help="Nesting depths")
+    nesting.add_argument("--lookups", type=int, default=2000, help="Lookups of each kind per depth")
+    nesting.set_defaults(func=bench_nesting)
+
+    scaling = subparsers.add_parser("scaling", help="Parse time of tests/final/stats.c with main scaled up")
+    scaling.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000], help="Copies of the loop nest")
+    scaling.add_argument("--runs", type=int, default=3, help="Parse time is the best of this many runs")
+    scaling.set_defaults(func=bench_scaling)
+
+    profile = subparsers.add_parser("profile", help="Profile parsing tests/final/arraynptr.c scaled up")
+    profile.add_argument("--scale", type=int, default=200, help="Copies of the statements in main")
+    profile.add_argument("--top", type=int, default=20, help="Number of functions to report")
+    profile.add_argument("--sort", type=str, default="tottime", help="pstats sort key")
+    profile.set_defaults(func=bench_profile)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_args().parse_args()
+    args.func(args)
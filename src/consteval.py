@@ -0,0 +1,239 @@
+import math
+import struct
+from typing import Optional, Union
+
+from ir import CharConst, FloatConst, IntConst, Operand
+from type_utils import Type
+
+# Folding of constant expressions of the three address code with the semantics of the target
+# instead of Python's. Integer operations wrap to the width of the type of their operands (the
+# sizes of type_utils.DATATYPE2SIZE), 32 bit ints for literals, and division truncates toward
+# zero. Floating point operations are done in single precision unless the operands are doubles,
+# the constants of the IR don't carry their type so an operation on two of them whose precision
+# is unknown is only folded if both precisions agree. Everything that C leaves undefined or that
+# the target would trap on (division by zero, shifts out of range, float to int overflow, inf /
+# nan) is not folded: the functions return None and the instruction is kept as is
+
+Number = Union[int, float]
+
+INT_BITS = 32
+
+_ESCAPES = {
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "0": "\0",
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "v": "\v",
+    "\\": "\\",
+    "'": "'",
+    '"': '"',
+    "?": "?",
+}
+
+_COMPARISONS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+def wrap(value: int, bits: int, signed: bool = True) -> int:
+    value &= (1 << bits) - 1
+    if signed and value >> (bits - 1):
+        value -= 1 << bits
+    return value
+
+
+def to_single(value: float) -> Optional[float]:
+    # Rounds to the nearest float, None if it overflows
+    try:
+        return struct.unpack("<f", struct.pack("<f", value))[0]
+    except OverflowError:
+        return None
+
+
+def constant_value(x: Operand) -> Optional[Number]:
+    if isinstance(x, IntConst):
+        return int(x.text)
+    elif isinstance(x, FloatConst):
+        return float(x.text)
+    elif isinstance(x, CharConst):
+        body = x.text[1:-1]
+        if len(body) == 1:
+            return ord(body)
+        if len(body) == 2 and body[0] == "\\" and body[1] in _ESCAPES:
+            return ord(_ESCAPES[body[1]])
+    return None
+
+
+def _is_double(_type: Optional[str]) -> bool:
+    return _type is not None and Type.of(_type).upper in ("DOUBLE", "LONG DOUBLE")
+
+
+def make_constant(value: Number, _type: Optional[str] = None) -> Optional[Operand]:
+    # The constant operand of `value` converted to `_type` (int or float following the value
+    # if it is None), None if the conversion is undefined or the type is not a basic type
+    if _type is None:
+        _type = "float" if isinstance(value, float) else "int"
+    t = Type.of(_type)
+    if t.pointer_lvl > 0 or len(t.dimensions) > 0:
+        return None
+    if t.is_integer or t.is_character:
+        bits = t.size * 8
+        signed = "UNSIGNED" not in t.upper
+        if isinstance(value, float):
+            # Truncates toward zero, undefined if the result does not fit
+            if not math.isfinite(value):
+                return None
+            value = int(value)
+            if not (-(1 << (bits - 1)) if signed else 0) <= value < (1 << (bits - 1 if signed else bits)):
+                return None
+        return IntConst(str(wrap(value, bits, signed)))
+    elif t.is_floating_point:
+        value = float(value)
+        if not _is_double(_type):
+            value = to_single(value)
+        if value is None or not math.isfinite(value):
+            return None
+        return FloatConst(_float_text(value, _is_double(_type)))
+    return None
+
+
+def _float_text(value: float, double: bool) -> str:
+    # Shortest text that reads back as the same float / double
+    if not double:
+        for digits in range(1, 10):
+            text = "%.*g" % (digits, value)
+            if to_single(float(text)) == value:
+                break
+    else:
+        text = repr(value)
+    if "." not in text and "e" not in text and "n" not in text:
+        text += ".0"
+    return text
+
+
+def _integer_format(_type: Optional[str]):
+    # (bits, signed) of the integer or character type `_type`, an int for anything else
+    if _type is not None:
+        t = Type.of(_type)
+        if (t.is_integer or t.is_character) and t.pointer_lvl == 0 and len(t.dimensions) == 0:
+            return t.size * 8, "UNSIGNED" not in t.upper
+    return INT_BITS, True
+
+
+def _fold(op: str, x: Number, y: Number, operand_type: Optional[str]) -> Optional[Number]:
+    # `x op y` computed in `operand_type`, the precision or width of the operands
+    if isinstance(x, float) or isinstance(y, float):
+        x, y = float(x), float(y)
+        if not _is_double(operand_type):
+            x, y = to_single(x), to_single(y)
+            if x is None or y is None:
+                return None
+    if op in _COMPARISONS:
+        return int(_COMPARISONS[op](x, y))
+    elif op == "&&":
+        return int(x != 0 and y != 0)
+    elif op == "||":
+        return int(x != 0 or y != 0)
+
+    if isinstance(x, float):
+        if op == "+":
+            return x + y
+        elif op == "-":
+            return x - y
+        elif op == "*":
+            return x * y
+        elif op == "/" and y != 0:
+            return x / y
+        # % and the bitwise operators are not defined on floats
+        return None
+
+    bits, signed = _integer_format(operand_type)
+    if op == "+":
+        res = x + y
+    elif op == "-":
+        res = x - y
+    elif op == "*":
+        res = x * y
+    elif op in ("/", "%"):
+        if y == 0 or (signed and x == -(1 << (bits - 1)) and y == -1):
+            return None
+        q = abs(x) // abs(y)
+        q = q if (x < 0) == (y < 0) else -q
+        res = q if op == "/" else x - y * q
+    elif op in ("<<", ">>"):
+        if y < 0 or y >= bits:
+            return None
+        res = x << y if op == "<<" else x >> y
+    elif op == "&":
+        res = x & y
+    elif op == "|":
+        res = x | y
+    elif op == "^":
+        res = x ^ y
+    else:
+        return None
+    return wrap(res, bits, signed)
+
+
+def evaluate_binary(
+    op: str, a: Operand, b: Operand, _type: Optional[str] = None, operand_type: Optional[str] = None
+) -> Optional[Operand]:
+    # `a op b` stored into a variable of type `_type`. Except for comparisons and logical
+    # operators the operands have the type of the result, otherwise `operand_type` gives it
+    if operand_type is None and op not in _COMPARISONS and op not in ("&&", "||"):
+        operand_type = _type
+    x, y = constant_value(a), constant_value(b)
+    if x is None or y is None:
+        return None
+    res = _fold(op, x, y, operand_type)
+    if res is None:
+        return None
+    if operand_type is None and (isinstance(x, float) or isinstance(y, float)):
+        # Floating point constants of unknown precision, only fold if the precision doesn't matter
+        if res != _fold(op, x, y, "double"):
+            return None
+    return make_constant(res, _type)
+
+
+def evaluate_unary(op: str, a: Operand, _type: Optional[str] = None) -> Optional[Operand]:
+    x = constant_value(a)
+    if x is None:
+        return None
+    if op == "!":
+        return make_constant(int(x == 0), _type)
+    elif op == "+":
+        return make_constant(x, _type)
+    if isinstance(x, float):
+        if not _is_double(_type):
+            x = to_single(x)
+        if x is None or op != "-":
+            return None
+        return make_constant(-x, _type)
+    bits, signed = _integer_format(_type)
+    if op == "-":
+        return make_constant(wrap(-x, bits, signed), _type)
+    elif op == "~":
+        return make_constant(wrap(~x, bits, signed), _type)
+    return None
+
+
+def evaluate_cast(cast: str, a: Operand) -> Optional[Operand]:
+    # `(type) a`, cast is the operator token of the CAST instruction
+    x = constant_value(a)
+    if x is None:
+        return None
+    return make_constant(x, cast[1:-1])
+
+
+def evaluate_condition(op: str, a: Operand, b: Operand, operand_type: Optional[str] = None) -> Optional[bool]:
+    # Outcome of `IF a op b GOTO ...`
+    res = evaluate_binary(op, a, b, "int", operand_type)
+    return None if res is None else int(res.text) != 0
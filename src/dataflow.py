@@ -0,0 +1,217 @@
+import heapq
+from typing import Hashable, Iterable, Iterator, List
+
+from ir import BasicBlock, ControlFlowGraph
+
+# Iterative dataflow analysis over an ir.ControlFlowGraph. A problem gives its direction, the
+# value at the boundary (function entry for forward problems, the exits for backward ones), the
+# initial value of every other block, the meet, the block transfer function and optionally what
+# flows along each edge. `solve` runs a worklist ordered by reverse postorder (postorder for
+# backward problems) until nothing changes. Sets of facts are encoded as bitsets in Python ints,
+# see `FactIndex`
+
+
+class FactIndex:
+    # Numbers the facts of a bitset lattice. Sets of facts are ints with bit i set for fact i
+    __slots__ = ("facts", "bits")
+
+    def __init__(self, facts: Iterable[Hashable] = ()) -> None:
+        self.facts = []
+        self.bits = {}
+        for fact in facts:
+            self.add(fact)
+
+    def add(self, fact: Hashable) -> int:
+        bit = self.bits.get(fact, None)
+        if bit is None:
+            bit = self.bits[fact] = len(self.facts)
+            self.facts.append(fact)
+        return bit
+
+    def mask(self, facts: Iterable[Hashable]) -> int:
+        m = 0
+        for fact in facts:
+            m |= 1 << self.bits[fact]
+        return m
+
+    @property
+    def full(self) -> int:
+        return (1 << len(self.facts)) - 1
+
+    def members(self, bits: int) -> Iterator[Hashable]:
+        i = 0
+        while bits:
+            if bits & 1:
+                yield self.facts[i]
+            bits >>= 1
+            i += 1
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+
+class DataflowProblem:
+    forward = True
+
+    def boundary(self):
+        raise NotImplementedError
+
+    def initial(self):
+        raise NotImplementedError
+
+    def meet(self, a, b):
+        raise NotImplementedError
+
+    def transfer(self, block: BasicBlock, value):
+        raise NotImplementedError
+
+    def edge(self, src: BasicBlock, dst: BasicBlock, value):
+        # Value that flows from src into dst (in the direction of the problem)
+        return value
+
+    def roots(self, cfg: ControlFlowGraph) -> List[bool]:
+        # Blocks that receive the boundary value
+        if self.forward:
+            return _forward_roots(cfg)
+        return [len(b.successors) == 0 for b in cfg.blocks]
+
+
+class GenKillProblem(DataflowProblem):
+    # Bitset problems with out = gen | (in & ~kill). Subclasses give the gen and kill sets of every
+    # block, `may` problems meet with union and start empty, `must` problems meet with intersection
+    # and start full
+    may = True
+
+    def __init__(self, cfg: ControlFlowGraph, full: int) -> None:
+        self.full = full
+        self.gen = [0] * len(cfg.blocks)
+        self.kill = [0] * len(cfg.blocks)
+
+    def boundary(self) -> int:
+        return 0
+
+    def initial(self) -> int:
+        return 0 if self.may else self.full
+
+    def meet(self, a: int, b: int) -> int:
+        return a | b if self.may else a & b
+
+    def transfer(self, block: BasicBlock, value: int) -> int:
+        return self.gen[block.index] | (value & ~self.kill[block.index])
+
+
+_NOTHING = object()
+
+
+class DataflowResult:
+    # ins[i] / outs[i] are the values at the start / end of block i in program order, whatever
+    # the direction of the problem
+    __slots__ = ("ins", "outs", "visits")
+
+    def __init__(self, ins: List, outs: List, visits: int) -> None:
+        self.ins = ins
+        self.outs = outs
+        self.visits = visits
+
+
+def postorder(cfg: ControlFlowGraph) -> List[BasicBlock]:
+    # Depth first from the entry, then from the blocks it does not reach in program order, so
+    # every block appears exactly once
+    seen = [False] * len(cfg.blocks)
+    order = []
+    for root in cfg.blocks:
+        if seen[root.index]:
+            continue
+        seen[root.index] = True
+        stack = [(root, iter(root.successors))]
+        while len(stack) > 0:
+            block, succs = stack[-1]
+            for succ in succs:
+                if not seen[succ.index]:
+                    seen[succ.index] = True
+                    stack.append((succ, iter(succ.successors)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+    return order
+
+
+def reverse_postorder(cfg: ControlFlowGraph) -> List[BasicBlock]:
+    order = postorder(cfg)
+    order.reverse()
+    return order
+
+
+def solve(cfg: ControlFlowGraph, problem: DataflowProblem) -> DataflowResult:
+    n = len(cfg.blocks)
+    forward = problem.forward
+    order = reverse_postorder(cfg) if forward else postorder(cfg)
+    rank = [0] * n
+    for i, block in enumerate(order):
+        rank[block.index] = i
+
+    initial = problem.initial()
+    boundary = problem.boundary()
+    meet = problem.meet
+    transfer = problem.transfer
+    edge = problem.edge
+    # Values flowing into / out of each block in the direction of the problem
+    before = [initial] * n
+    after = [initial] * n
+    # By default forward problems apply the boundary to the entry and to the blocks not reachable
+    # from it, backward problems to the blocks without successors
+    roots = problem.roots(cfg)
+    if forward:
+        sources = [b.predecessors for b in cfg.blocks]
+        targets = [b.successors for b in cfg.blocks]
+    else:
+        sources = [b.successors for b in cfg.blocks]
+        targets = [b.predecessors for b in cfg.blocks]
+
+    # Every block is visited once, then again only when one of its sources changed
+    worklist = list(range(n))
+    queued = [True] * n
+    visits = 0
+    while len(worklist) > 0:
+        block = order[heapq.heappop(worklist)]
+        i = block.index
+        queued[i] = False
+        visits += 1
+
+        value = boundary if roots[i] else _NOTHING
+        for src in sources[i]:
+            v = edge(src, block, after[src.index])
+            value = v if value is _NOTHING else meet(value, v)
+        if value is _NOTHING:
+            value = initial
+        before[i] = value
+        out = transfer(block, value)
+        if out != after[i]:
+            after[i] = out
+            for dst in targets[i]:
+                if not queued[dst.index]:
+                    queued[dst.index] = True
+                    heapq.heappush(worklist, rank[dst.index])
+
+    if forward:
+        return DataflowResult(before, after, visits)
+    return DataflowResult(after, before, visits)
+
+
+def _forward_roots(cfg: ControlFlowGraph) -> List[bool]:
+    # The entry, and the first block of every region the entry does not reach
+    roots = [False] * len(cfg.blocks)
+    seen = [False] * len(cfg.blocks)
+    for root in cfg.blocks:
+        if seen[root.index]:
+            continue
+        roots[root.index] = True
+        seen[root.index] = True
+        stack = [root]
+        while len(stack) > 0:
+            for succ in stack.pop().successors:
+                if not seen[succ.index]:
+                    seen[succ.index] = True
+                    stack.append(succ)
+    return roots
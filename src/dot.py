@@ -1,10 +1,22 @@
 from typing import Mapping
-from graphviz import Digraph
-import networkx as nx
-import matplotlib.pyplot as plt
-from networkx.drawing.nx_pydot import graphviz_layout, write_dot
+from consteval import constant_value, evaluate_binary, evaluate_cast, evaluate_condition, evaluate_unary, make_constant
+from dataflow import DataflowProblem, FactIndex, GenKillProblem, solve
+from ir import (
+    CharConst,
+    ControlFlowGraph,
+    FloatConst,
+    Instruction,
+    IntConst,
+    Memory,
+    Op,
+    Temp,
+    Var,
+    lower,
+    split_functions,
+)
 from mips import print_data
 from symtab import (
+    aggregate_layout,
     get_stdlib_codes,
     get_tmp_label,
     get_tmp_var,
@@ -12,11 +24,7 @@ from symtab import (
     get_default_value,
     get_tabname_mapping,
 )
-
-
-NODE_COUNTER = 0
-NODE_MAPPING = {}
-in_function = 1
+from type_utils import Type
 
 
 def _resolve_fcall_graph_names(args):
@@ -233,6 +241,7 @@ def _rewrite_code_2nd_pass(code, indent):
                 tvar = get_tmp_var(_type, cur_symtab)
                 new_codes.append([tvar, ":=", c[1]])
                 new_codes.append(["RETURN", tvar])
+                new_indents.extend((i, i))
             else:
                 new_codes.append(c)
                 new_indents.append(i)
@@ -265,192 +274,630 @@ def size_of_child(symtab):
     return s
 
 
-def is_number(s: str) -> bool:
-    try:
-        if not s.isnumeric():
-            float(s)
-            return True
+def draw_scope_tree(gtab, output_file):
+    # Writes the tree of symbol tables to <output_file>.dot and draws it to <output_file>.png.
+    # graphviz / networkx / matplotlib dominate the startup time of the compiler, so they are only
+    # imported when a drawing is asked for
+    import graphviz
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
+    dot = graphviz.Digraph(name="scopes")
+    G = nx.DiGraph()
+    stack = [(gtab, None, 0)]
+    while len(stack) > 0:
+        table, parent, depth = stack.pop()
+        node = table.table_name if table.parent is not None else "GLOBAL"
+        names = [k for k in table._symtab_variables if not k.startswith("__")]
+        label = "\n".join([node if table.func_scope in (None, "GLOBAL") else f"{node}\n{table.func_scope}"] + names)
+        dot.node(node, label, shape="box")
+        G.add_node(node, label=label, depth=depth)
+        if parent is not None:
+            dot.edge(parent, node)
+            G.add_edge(parent, node)
+        stack.extend((child, node, depth + 1) for child in reversed(table.children))
+    dot.save(output_file + ".dot")
+
+    plt.figure(figsize=(max(8, len(G) / 2), 8))
+    pos = nx.multipartite_layout(G, subset_key="depth", align="horizontal", scale=-1)
+    nx.draw(G, pos, labels=nx.get_node_attributes(G, "label"), node_color="white", font_size=6)
+    plt.savefig(output_file + ".png")
+    plt.close()
+
+
+def _print_code(code):
+    for instr in code:
+        _z = str(instr)
+        idt = instr.indent
+        if _z[-1] == ":":
+            idt -= 16
+        else:
+            _z = _z + ";"
+        print(" " * idt + _z)
+    print()
+
+
+def _identity(op, a, b, _type):
+    # x + 0, x - 0, x * 1, x / 1, 0 + x, 1 * x, and x * 0, 0 * x, 0 / x for integer results
+    x, y = constant_value(a), constant_value(b)
+    integer = _type is not None and Type.of(_type).is_integer
+    if x is not None and y is None:
+        if x == 0 and op == "+" or x == 1 and op == "*":
+            return b
+        elif x == 0 and op in ("*", "/") and integer:
+            return make_constant(0, _type)
+    elif y is not None and x is None:
+        if y == 0 and op in ("+", "-") or y == 1 and op in ("*", "/"):
+            return a
+        elif y == 0 and op == "*" and integer:
+            return make_constant(0, _type)
+    return None
+
+
+def compiler_optimization_algebraic_simplication(instr, _type=None):
+    # Operates on a line by line basis, _type is the type of the assigned variable
+    if instr.op is Op.BINARY:
+        a, b = instr.args
+        res = evaluate_binary(instr.operator, a, b, _type)
+        if res is None:
+            res = _identity(instr.operator, a, b, _type)
+    elif instr.op is Op.UNARY:
+        res = evaluate_unary(instr.operator, instr.args[0], _type)
+    elif instr.op is Op.CAST:
+        res = evaluate_cast(instr.operator, instr.args[0])
+    else:
+        return instr, True
+    if res is None:
+        return instr, True
+    return _assign(instr, res), False
+
+
+def _assign(instr, value):
+    return Instruction(Op.COPY, instr.dst, (value,), indent=instr.indent)
+
+
+class _Scopes:
+    # Resolves the names of a unit the way the MIPS backend does: from the symbol table active at
+    # the instruction (following SYMTAB PUSH / POP), with the struct fields of `s.f` and the
+    # renamed statics. Names of different scopes get different keys, and the group of a key is
+    # the key of its root variable, so `s` and `s.f` are in the same group
+    def __init__(self, code):
+        tmap = get_tabname_mapping()
+        table = tmap["GLOBAL"]
+        self.tables = []
+        for instr in code:
+            if instr.op is Op.SCOPE_PUSH:
+                table = tmap[instr.extra[0]]
+            self.tables.append(table)
+            if instr.op is Op.SCOPE_POP and table.parent is not None:
+                table = table.parent
+        self._cache = {}
+
+    def resolve(self, name, table):
+        # -> (key, group, type, is_global)
+        res = self._cache.get((name, table), None)
+        if res is not None:
+            return res
+        splits = name.split(".")
+        entry = table.lookup(splits[0])
+        if entry is None and table.func_scope is not None:
+            entry = table.lookup(splits[0] + ".static." + table.func_scope)
+        if entry is None or "table name" not in entry:
+            res = (name, name, None, True)
         else:
-            return True
-    except ValueError:
+            tname = entry["table name"]
+            _type = entry["type"]
+            try:
+                for f in splits[1:]:
+                    _type = aggregate_layout(table.lookup_type(_type)).field_types[f]
+            except Exception:
+                _type = None
+            is_global = tname == "GLOBAL" or ".static." in name or ".static." in entry["name"]
+            res = (tname + "-" + name, tname + "-" + splits[0], _type, is_global)
+        self._cache[(name, table)] = res
+        return res
+
+
+def _copy_fact_allowed(dst_type, src, src_type):
+    if dst_type is None:
         return False
+    if isinstance(src, (Temp, Var)):
+        return src_type == dst_type
+    t = Type.of(dst_type)
+    if isinstance(src, IntConst):
+        return t.is_integer
+    elif isinstance(src, FloatConst):
+        return t.is_floating_point
+    elif isinstance(src, CharConst):
+        return t.is_character
+    return False
+
+
+def _address_taken(code, tables, scopes):
+    groups = set()
+    for instr, table in zip(code, tables):
+        if instr.op is Op.UNARY and instr.operator == "&":
+            for v in instr.args[0].variables()[:1]:
+                groups.add(scopes.resolve(v, table)[1])
+    return groups
+
+
+class _AvailableCopies(GenKillProblem):
+    # Copies `x := y` (y a variable or a constant) that hold on every path. A definition kills the
+    # copies of its group, calls and stores through memory also kill the copies of the globals and
+    # of the variables whose address is taken
+    may = False
+
+    def __init__(self, cfg, code, tables, scopes):
+        facts = FactIndex()
+        by_dst = {}
+        effects = []
+        address_taken = _address_taken(code, tables, scopes)
+        global_groups = set()
+
+        groups_of_fact = []
+        for instr, table in zip(code, tables):
+            fact = None
+            kill_groups = []
+            for d in instr.defs:
+                key, group, _type, is_global = scopes.resolve(d, table)
+                kill_groups.append(group)
+                if is_global:
+                    global_groups.add(group)
+                if instr.op is Op.COPY:
+                    src = instr.args[0]
+                    if isinstance(src, (Temp, Var)):
+                        src_key, src_group, src_type, src_global = scopes.resolve(src.text, table)
+                        if src_global:
+                            global_groups.add(src_group)
+                    else:
+                        src_key, src_group, src_type = None, None, None
+                    if src_key != key and _copy_fact_allowed(_type, src, src_type):
+                        fact = (key, src, src_key)
+                        bit = facts.add(fact)
+                        if bit == len(groups_of_fact):
+                            groups_of_fact.append((group, src_group))
+                            by_dst.setdefault(key, []).append((bit, src, src_key))
+            touches_memory = instr.op is Op.CALL or isinstance(instr.dst, Memory)
+            opaque = instr.op is Op.RAW or instr.op is Op.ASM
+            effects.append((kill_groups, touches_memory, opaque, fact))
+
+        group_masks = {}
+        for bit, groups in enumerate(groups_of_fact):
+            for g in groups:
+                if g is not None:
+                    group_masks[g] = group_masks.get(g, 0) | (1 << bit)
+        memory_mask = 0
+        for g in address_taken | global_groups:
+            memory_mask |= group_masks.get(g, 0)
+
+        super().__init__(cfg, facts.full)
+        self.facts = facts
+        self.by_dst = by_dst
+        self.effects = []
+        for kill_groups, touches_memory, opaque, fact in effects:
+            kill = facts.full if opaque else 0
+            for g in kill_groups:
+                kill |= group_masks.get(g, 0)
+            if touches_memory:
+                kill |= memory_mask
+            gen = 0 if fact is None else 1 << facts.bits[fact]
+            self.effects.append((gen, kill))
+
+        i = 0
+        for block in cfg.blocks:
+            gen, kill = 0, 0
+            for _ in block.instructions:
+                g, k = self.effects[i]
+                gen = (gen & ~k) | g
+                kill = (kill | k) & ~g
+                i += 1
+            self.gen[block.index] = gen
+            self.kill[block.index] = kill
+
+
+def compiler_optimization_copy_propagation(code):
+    scopes = _Scopes(code)
+    new_code = []
+    no_change = True
+    offset = 0
+    for function in split_functions(code):
+        tables = scopes.tables[offset : offset + len(function)]
+        offset += len(function)
+        function, nc = _propagate_copies(function, tables, scopes)
+        no_change = no_change and nc
+        new_code.extend(function)
+    return new_code, no_change
 
 
-def get_lhs_rhs_variables(expr):
-    # For function call send empty lhs since we dont want to remove that line
-
-    tag = expr[0]
-    if tag == "PUSHPARAM":
-        return [], [] if is_number(expr[1]) else [expr[1]], False
-    elif tag == "IF":
-        return [], [expr[1]], False
-    elif "CALL" in expr:
-        return [expr[0]], [], True
-    elif "RETURN" in expr:
-        return (
-            [],
-            [] if len(expr) == 1 or is_number(expr[1]) else [expr[1]],
-            False,
-        )
-    elif len(expr) == 4 and expr[2][0] == "(" and expr[2][-1] == ")":
-        return [expr[0]], [expr[-1]], True
-    elif len(expr) >= 2 and expr[1] == ":=":
-        lhs = [expr[0]]
-        if len(expr) == 3:
-            rhs = [] if is_number(expr[2]) else [expr[2]]
-            return lhs, rhs, True
-        elif len(expr) == 5:
-            rhs = [] if is_number(expr[2]) else [expr[2]]
-            rhs += [] if is_number(expr[4]) else [expr[4]]
-            return lhs, rhs, True
-    return [], [], False
-
-
-def compiler_optimization_algebraic_simplication(line):
-    # Operates on a line by line basis
-    if len(line) != 5 or (len(line) >= 2 and line[1] != ":="):
-        return line, True
-    try:
-        no_change = True
-        if is_number(line[2]):
-            if is_number(line[4]):
-                if line[3] == "&&":
-                    line[3] = "and"
-                elif line[3] == "||":
-                    line[3] = "or"
-                res = eval(" ".join(line[2:]))
-                res = int(res) if isinstance(res, bool) else res
-                line = [line[0], ":=", str(res)]
+def _propagate_copies(code, tables, scopes):
+    cfg = ControlFlowGraph(code)
+    problem = _AvailableCopies(cfg, code, tables, scopes)
+    if len(problem.facts) == 0:
+        return code, True
+    result = solve(cfg, problem)
+
+    new_code = []
+    no_change = True
+    i = 0
+    for block in cfg.blocks:
+        avail = result.ins[block.index]
+        for instr in block.instructions:
+            if instr.op is Op.COPY or instr.op is Op.BINARY or instr.op is Op.IF:
+                table = tables[i]
+                args = list(instr.args)
+                for j, a in enumerate(args):
+                    if not isinstance(a, (Temp, Var)):
+                        continue
+                    for bit, src, src_key in problem.by_dst.get(scopes.resolve(a.text, table)[0], ()):
+                        if avail >> bit & 1 and (src_key is None or scopes.resolve(src.text, table)[0] == src_key):
+                            args[j] = src
+                            break
+                args = tuple(args)
+                if args != instr.args:
+                    instr = instr.replace(args=args)
+                    no_change = False
+            gen, kill = problem.effects[i]
+            avail = gen | (avail & ~kill)
+            i += 1
+            if instr.op is Op.COPY and instr.args[0] == instr.dst:
+                # x := x
                 no_change = False
+                continue
+            new_code.append(instr)
+    return new_code, no_change
+
+
+_TYPED_CONSTANTS = {"int": IntConst, "float": FloatConst}
+_FOLDED_OPS = (Op.BINARY, Op.UNARY, Op.CAST)
+
+
+class _Constants(DataflowProblem):
+    # Conditional constant propagation. The value of a block is None while no executable edge
+    # reaches it, otherwise the constant value of the variables (by key, a missing key is not
+    # constant) and at the end of the block the outcome of its IF if it is known. Only the taken
+    # edge of an IF with a known outcome is executable, so branches that are never taken
+    # don't weaken the values after them, and blocks that stay None are unreachable
+    def __init__(self, cfg, code, tables, scopes):
+        self.cfg = cfg
+        self.tables = tables
+        self.scopes = scopes
+        self.address_taken = _address_taken(code, tables, scopes)
+        self.in_memory = {}
+        self.starts = []
+        i = 0
+        for block in cfg.blocks:
+            self.starts.append(i)
+            i += len(block.instructions)
+
+    def boundary(self):
+        return {}
+
+    def initial(self):
+        return None
+
+    def roots(self, cfg):
+        return [block.index == 0 for block in cfg.blocks]
+
+    def meet(self, a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return {k: v for k, v in a.items() if b.get(k, None) == v}
+
+    def edge(self, src, dst, value):
+        if value is None:
+            return None
+        env, outcome = value
+        if outcome is not None:
+            if outcome:
+                taken = self.cfg.labels.get(src.instructions[-1].target, None)
             else:
-                n = eval(line[2])
-                if n == 0:
-                    if line[3] in ("+", "-"):
-                        line = [line[0], ":=", line[4]]
-                        no_change = False
-                    elif line[3] in ("/", "*"):
-                        line = [line[0], ":=", "0"]
-                        no_change = False
-                elif n == 1:
-                    if line[3] == "*":
-                        line = [line[0], ":=", line[4]]
-                        no_change = False
-        elif is_number(line[4]):
-            n = eval(line[4])
-            if n == 0:
-                if line[3] in ("+", "-"):
-                    line = [line[0], ":=", line[2]]
-                    no_change = False
-                elif line[3] == "*":
-                    line = [line[0], ":=", "0"]
+                taken = self.cfg.blocks[src.index + 1] if src.index + 1 < len(self.cfg.blocks) else None
+            if dst is not taken:
+                return None
+        return env
+
+    def transfer(self, block, env):
+        if env is None:
+            return None
+        env = dict(env)
+        i = self.starts[block.index]
+        for instr in block.instructions:
+            self.step(env, instr, self.tables[i])
+            i += 1
+        last = block.instructions[-1]
+        outcome = None
+        if last.op is Op.IF:
+            outcome = self.outcome(env, last, self.tables[i - 1])
+        return env, outcome
+
+    def value(self, env, x, table):
+        if isinstance(x, (Temp, Var)):
+            return env.get(self.scopes.resolve(x.text, table)[0], x)
+        return x
+
+    def operand_type(self, args, table):
+        # Type of the operands of a BINARY or an IF, known if one of them is a variable
+        for x in args:
+            if isinstance(x, (Temp, Var)):
+                return self.scopes.resolve(x.text, table)[2]
+        return None
+
+    def substitute(self, env, instr, table):
+        # The instruction with the constant value of the operands it reads. The array of an INDEX
+        # and the operand of & and * stay variables, PARAM, RETURN and CAST only take the int and
+        # float constants of variables of that type, the backend picks the registers from them
+        def index(x):
+            if isinstance(x, Memory) and x.index is not None:
+                v = self.value(env, x.index, table)
+                if v is not x.index:
+                    return Memory(x.text[: x.text.index("[") + 1] + v.text + "]", x.base, v)
+            return x
+
+        op = instr.op
+        args = tuple(index(a) for a in instr.args)
+        if op is Op.COPY or op is Op.BINARY:
+            args = tuple(self.value(env, a, table) for a in args)
+        elif op is Op.IF:
+            args = (self.value(env, args[0], table), self.value(env, args[1], table), args[2])
+        elif op is Op.INDEX:
+            args = (args[0], self.value(env, args[1], table))
+        elif op is Op.UNARY and instr.operator not in ("&", "*"):
+            args = (self.value(env, args[0], table),)
+        elif (op is Op.PARAM or op is Op.RETURN or op is Op.CAST) and len(args) > 0:
+            v = self.value(env, args[0], table)
+            if isinstance(v, _TYPED_CONSTANTS.get(self.scopes.resolve(args[0].text, table)[2], ())):
+                args = (v,)
+        dst = index(instr.dst)
+        if args == instr.args and dst is instr.dst:
+            return instr
+        return instr.replace(dst=dst, args=args)
+
+    def outcome(self, env, instr, table):
+        a, b = (self.value(env, x, table) for x in instr.args[:2])
+        return evaluate_condition(instr.operator, a, b, self.operand_type(instr.args[:2], table))
+
+    def step(self, env, instr, table):
+        op = instr.op
+        if op is Op.RAW or op is Op.ASM:
+            env.clear()
+            return
+        if op is Op.CALL or isinstance(instr.dst, Memory):
+            # Calls and stores may write the globals and the variables whose address is taken
+            for k in list(env):
+                if self.in_memory[k]:
+                    del env[k]
+        if len(instr.defs) == 0:
+            return
+        key, group, _type, is_global = self.scopes.resolve(instr.dst.text, table)
+        for k in list(env):
+            if k == key or k == group or k.startswith(group + "."):
+                del env[k]
+        res = None
+        if op is Op.COPY:
+            res = self.value(env, instr.args[0], table)
+        elif op is Op.BINARY:
+            a, b = (self.value(env, x, table) for x in instr.args)
+            res = evaluate_binary(instr.operator, a, b, _type, self.operand_type(instr.args, table))
+        elif op is Op.UNARY:
+            res = evaluate_unary(instr.operator, self.value(env, instr.args[0], table), _type)
+        elif op is Op.CAST:
+            res = evaluate_cast(instr.operator, self.value(env, instr.args[0], table))
+        if isinstance(res, (IntConst, FloatConst)) and _copy_fact_allowed(_type, res, None):
+            env[key] = res
+            self.in_memory[key] = is_global or group in self.address_taken
+
+
+_STRUCTURAL_OPS = (Op.LABEL, Op.SCOPE_PUSH, Op.SCOPE_POP, Op.BEGINFUNC, Op.ENDFUNC)
+
+
+def compiler_optimization_constant_propagation(code):
+    # Replaces the variables with their constant value across blocks, folds the IFs whose outcome
+    # is known and removes the unreachable code
+    scopes = _Scopes(code)
+    new_code = []
+    no_change = True
+    offset = 0
+    for function in split_functions(code):
+        tables = scopes.tables[offset : offset + len(function)]
+        offset += len(function)
+        function, nc = _propagate_constants(function, tables, scopes)
+        no_change = no_change and nc
+        new_code.extend(function)
+    return new_code, no_change
+
+
+def _propagate_constants(code, tables, scopes):
+    cfg = ControlFlowGraph(code)
+    problem = _Constants(cfg, code, tables, scopes)
+    result = solve(cfg, problem)
+
+    new_code = []
+    no_change = True
+    i = 0
+    for block in cfg.blocks:
+        env = result.ins[block.index]
+        if env is None:
+            # Unreachable, only keep what the backend needs to follow the scopes and functions
+            for instr in block.instructions:
+                if instr.op in _STRUCTURAL_OPS:
+                    new_code.append(instr)
+                else:
                     no_change = False
-            elif n == 1:
-                if line[3] in ("*", "/"):
-                    line = [line[0], ":=", line[2]]
+            i += len(block.instructions)
+            continue
+        env = dict(env)
+        for instr in block.instructions:
+            table = tables[i]
+            if instr.op is Op.IF:
+                outcome = problem.outcome(env, instr, table)
+                if outcome is not None:
                     no_change = False
-        return line, no_change
-    except:
-        return line, True
-
-
-def compiler_optimization_copy_propagation(line, replace_var):
-    if len(line) not in (3, 5) or (len(line) >= 2 and line[1] != ":="):
-        return line, True
-    try:
-        if len(line) == 3:
-            rep = replace_var.get(line[2], line[2])
-            return [line[0], ":=", rep], rep == line[2]
+                    if outcome:
+                        new_code.append(Instruction(Op.GOTO, args=(instr.args[2],), indent=instr.indent))
+                    i += 1
+                    continue
+            new = problem.substitute(env, instr, table)
+            problem.step(env, instr, table)
+            if new.op in _FOLDED_OPS:
+                # x := 2 * 3 becomes x := 6
+                res = env.get(scopes.resolve(new.dst.text, table)[0], None)
+                if res is not None:
+                    new = Instruction(Op.COPY, new.dst, (res,), indent=new.indent)
+            if new is not instr:
+                no_change = False
+            new_code.append(new)
+            i += 1
+
+    n = len(new_code)
+    new_code = _remove_empty_jumps(_remove_empty_scopes(new_code))
+    return new_code, no_change and len(new_code) == n
+
+
+def _remove_empty_scopes(code):
+    # SYMTAB PUSH directly followed by its SYMTAB POP, left behind by the removed statements
+    new_code = []
+    for instr in code:
+        if instr.op is Op.SCOPE_POP and len(new_code) > 0 and new_code[-1].op is Op.SCOPE_PUSH:
+            new_code.pop()
         else:
-            rep1 = replace_var.get(line[2], line[2])
-            rep2 = replace_var.get(line[4], line[4])
-            return [line[0], ":=", rep1, line[3], rep2], rep1 == line[2] and rep2 == line[4]
-    except:
-        return line, True
+            new_code.append(instr)
+    return new_code
 
 
-def optimize_ir(code, indents, depth=5):
+def _remove_empty_jumps(code):
+    # GOTOs that only jump over labels to their target, falling through reaches it as well
+    new_code = []
+    for j, instr in enumerate(code):
+        if instr.op is Op.GOTO:
+            k = j + 1
+            while k < len(code) and code[k].op is Op.LABEL and code[k].args != instr.args:
+                k += 1
+            if k < len(code) and code[k].op is Op.LABEL:
+                continue
+        new_code.append(instr)
+    return new_code
+
+
+_PURE_OPS = (Op.COPY, Op.UNARY, Op.CAST, Op.INDEX, Op.BINARY)
+
+
+class _LiveVariables(GenKillProblem):
+    # Groups of variables that may be read before they are assigned again. Only an assignment of
+    # the whole variable kills its group, not one of a field, and RAW / ASM instructions read
+    # everything
+    forward = False
+
+    def __init__(self, cfg, code, tables, scopes):
+        facts = FactIndex()
+        effects = []
+        for instr, table in zip(code, tables):
+            uses = 0
+            for u in instr.uses:
+                uses |= 1 << facts.add(scopes.resolve(u, table)[1])
+            defs = 0
+            for d in instr.defs:
+                key, group, _, _ = scopes.resolve(d, table)
+                bit = facts.add(group)
+                if key == group:
+                    defs |= 1 << bit
+            effects.append((uses, defs, instr.op is Op.RAW or instr.op is Op.ASM))
+
+        super().__init__(cfg, facts.full)
+        self.facts = facts
+        self.effects = [(facts.full if opaque else uses, defs) for uses, defs, opaque in effects]
+
+        i = 0
+        for block in cfg.blocks:
+            gen, kill = 0, 0
+            for uses, defs in reversed(self.effects[i : i + len(block.instructions)]):
+                gen = uses | (gen & ~defs)
+                kill = (kill | defs) & ~uses
+            i += len(block.instructions)
+            self.gen[block.index] = gen
+            self.kill[block.index] = kill
+
+
+def compiler_optimization_dead_code_elimination(code):
+    # Removes the side effect free assignments whose result is not live. Globals, statics and
+    # variables whose address is taken are always kept, as well as the global initializers
+    scopes = _Scopes(code)
     new_code = []
-    new_indents = []
     no_change = True
-    replace_var = dict()
-    var_lhs = dict()
-    var_rhs = dict()
-    encounter_label = False
-    first_label = float("inf")
-    for i, (c, idt) in enumerate(zip(code, indents)):
-        # Apply Algebraic Simplification
-        c, nc = compiler_optimization_algebraic_simplication(c)
-        no_change = no_change and nc
+    offset = 0
+    for function in split_functions(code):
+        tables = scopes.tables[offset : offset + len(function)]
+        offset += len(function)
+        if function[0].op is Op.LABEL:
+            function, nc = _remove_dead_code(function, tables, scopes)
+            no_change = no_change and nc
+        new_code.extend(function)
+    return new_code, no_change
 
-        if not encounter_label:
-            encounter_label = i > 0 and len(c) == 1 and c[0].endswith(":") or c[0] == "IF"
-            if encounter_label:
-                first_label = i
 
-        if not encounter_label:
-            # Apply Copy Propagation
-            c, nc = compiler_optimization_copy_propagation(c, replace_var)
-            no_change = no_change and nc
+def _remove_dead_code(code, tables, scopes):
+    cfg = ControlFlowGraph(code)
+    problem = _LiveVariables(cfg, code, tables, scopes)
+    result = solve(cfg, problem)
+    kept = _address_taken(code, tables, scopes)
 
-        lhs, rhs, is_arth_expr = get_lhs_rhs_variables(c)
-        for l in lhs:
-            if l not in var_lhs:
-                var_lhs[l] = [i]
-            else:
-                var_lhs[l].append(i)
-        for r in rhs:
-            if r not in var_rhs:
-                var_rhs[r] = [i]
-            else:
-                var_rhs[r].append(i)
-
-        if is_arth_expr:
-            if len(rhs) <= 1 and len(c) == 3:
-                replace_var[lhs[0]] = c[2]
-            elif lhs[0] in replace_var:
-                del replace_var[lhs[0]]
-
-        new_code.append(c)
-        new_indents.append(idt)
-
-    # Dead Code Elimination
-    if code[0][0][-1] == ":":
-        for var, lidx in var_lhs.items():
-            ridx = var_rhs.get(var, [])
-            if len(ridx) == 0:
-                removals = lidx
-            else:
-                _r = 0
-                _l = 0
-                removals = []
-                for (l1, l2) in zip(lidx[:-1], lidx[1:]):
-                    while _r < len(ridx) and ridx[_r] < l1:
-                        _r += 1
-                    if not (ridx[_r] > l1 and ridx[_r] <= l2):
-                        removals.append(l1)
-            for r in removals:
-                if r >= first_label:
-                    break
-                no_change = False
-                if "CALL" in new_code[r]:
+    new_code = []
+    i = len(code)
+    for block in reversed(cfg.blocks):
+        live = result.outs[block.index]
+        for instr in reversed(block.instructions):
+            i -= 1
+            if instr.op in _PURE_OPS and len(instr.defs) > 0:
+                _, group, _, is_global = scopes.resolve(instr.dst.text, tables[i])
+                if not (is_global or group in kept or live >> problem.facts.bits[group] & 1):
                     continue
-                new_code[r] = []
-                new_indents[r] = []
+            uses, defs = problem.effects[i]
+            live = uses | (live & ~defs)
+            new_code.append(instr)
+    new_code.reverse()
+    return new_code, len(new_code) == len(code)
 
-        new_code = list(filter(lambda x: x != [], new_code))
-        new_indents = list(filter(lambda x: x != [], new_indents))
 
-    return (new_code, new_indents) if depth == 1 or no_change else optimize_ir(new_code, new_indents, depth - 1)
+def _algebraic_simplification_pass(code):
+    scopes = None
+    new_code = []
+    no_change = True
+    for i, instr in enumerate(code):
+        if instr.op in (Op.BINARY, Op.UNARY, Op.CAST) and isinstance(instr.dst, (Temp, Var)):
+            if scopes is None:
+                scopes = _Scopes(code)
+            _type = scopes.resolve(instr.dst.text, scopes.tables[i])[2]
+            instr, nc = compiler_optimization_algebraic_simplication(instr, _type)
+            no_change = no_change and nc
+        new_code.append(instr)
+    return new_code, no_change
 
 
-def parse_code(tree, output_file, optimize, print_code):
-    # global NODE_COUNTER, NODE_MAPPING
-    # G = nx.DiGraph()
+OPTIMIZATION_PASSES = (
+    _algebraic_simplification_pass,
+    compiler_optimization_constant_propagation,
+    compiler_optimization_copy_propagation,
+    compiler_optimization_dead_code_elimination,
+)
 
-    # v = _add_new_node(G, "global")
 
-    # parent_scope = [v]
+def optimize_ir(code, passes=OPTIMIZATION_PASSES):
+    # Runs the passes in turn until none of them changes the code
+    no_change = False
+    while not no_change:
+        no_change = True
+        for optimization in passes:
+            code, nc = optimization(code)
+            no_change = no_change and nc
+    return code
+
 
+def parse_code(tree, output_file, optimize, print_code):
     if tree is None:
         return
 
@@ -470,39 +917,19 @@ def parse_code(tree, output_file, optimize, print_code):
         code = t["code"]
         code, indents = _rewrite_code(code, sizes, ret_sizes)
         code, indents = _rewrite_code_2nd_pass(code, indents)
+        code = lower(code, indents)
         if print_code:
             print("Before Compiler Optimizations")
             print()
-            for c, idt in zip(code, indents):
-                _z = " ".join(c)
-                if _z[-1] == ":":
-                    idt -= 16
-                else:
-                    _z = _z + ";"
-                print(" " * idt + _z)
-            print()
+            _print_code(code)
 
         if optimize:
-            code, indents = optimize_ir(code, indents)
+            code = optimize_ir(code)
             if print_code:
                 print("After Compiler Optimizations")
                 print()
-                for c, idt in zip(code, indents):
-                    _z = " ".join(c)
-                    if _z[-1] == ":":
-                        idt -= 16
-                    else:
-                        _z = _z + ";"
-                    print(" " * idt + _z)
-                print()
+                _print_code(code)
 
         codes.append(code)
 
-    # #print(get_stdlib_codes())
-
-    # pos = graphviz_layout(G, prog="dot")
-    # nx.draw(G, pos, with_labels = True, node_color="white")
-    # write_dot(G, output_file+".dot")
-    # plt.show()
-
     return codes
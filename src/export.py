@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+import struct
+from typing import IO, Iterable, List, Tuple
+
+FORMATS = ("csv", "jsonl", "binary")
+
+# Binary layout (little endian):
+#   header  : MAGIC, u16 version, u16 #fields, then per field: str name, u8 kind,
+#             and for enum fields u32 #choices followed by the choices as str
+#   records : the fixed size fields in schema order (u32 -> 4 bytes, i64 -> 8 bytes,
+#             enum -> u16 index into the choices), then the u32 byte length of every
+#             str field, then the utf-8 bytes of the str fields
+# so a record is a single struct pack plus the string payload
+MAGIC = b"CS335REC"
+VERSION = 1
+KINDS = {"u32": 0, "i64": 1, "str": 2, "enum": 3}
+_STRUCT_CODES = {"u32": "I", "i64": "q", "enum": "H"}
+
+
+def _pack_str(s: str) -> bytes:
+    b = s.encode("utf-8")
+    return struct.pack("<I", len(b)) + b
+
+
+class RecordWriter:
+    # Writes fixed schema records in batches. fields is a list of (name, kind) where kind is one
+    # of "u32", "i64", "str" or ("enum", choices). Nothing touches the stream until a batch is full
+    def __init__(self, stream: IO[bytes], fmt: str, fields: List[Tuple[str, object]], batch_size: int = 4096) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {fmt}, expected one of {FORMATS}")
+        self.stream = stream
+        self.fmt = fmt
+        self.names = [name for name, _ in fields]
+        self.kinds = [kind if isinstance(kind, str) else kind[0] for _, kind in fields]
+        self.batch_size = batch_size
+        self.count = 0
+        self._batch = []
+        self._enums = {
+            i: {c: j for j, c in enumerate(kind[1])} for i, (_, kind) in enumerate(fields) if not isinstance(kind, str)
+        }
+
+        if fmt == "csv":
+            self._text = io.TextIOWrapper(stream, encoding="utf-8", newline="", write_through=True)
+            self._csv = csv.writer(self._text)
+            self._csv.writerow(self.names)
+        elif fmt == "jsonl":
+            self._text = io.TextIOWrapper(stream, encoding="utf-8", write_through=True)
+            # Only the strings need json escaping, numbers are formatted directly
+            self._json_line = "{" + ", ".join(json.dumps(name) + ": %s" for name in self.names) + "}\n"
+            self._json_strs = [i for i, kind in enumerate(self.kinds) if kind in ("str", "enum")]
+        else:
+            header = [MAGIC, struct.pack("<HH", VERSION, len(fields))]
+            for name, kind in fields:
+                header.append(_pack_str(name) + struct.pack("<B", KINDS[kind if isinstance(kind, str) else kind[0]]))
+                if not isinstance(kind, str):
+                    header.append(struct.pack("<I", len(kind[1])) + b"".join(_pack_str(c) for c in kind[1]))
+            stream.write(b"".join(header))
+            self._fixed = [i for i, kind in enumerate(self.kinds) if kind != "str"]
+            self._strs = [i for i, kind in enumerate(self.kinds) if kind == "str"]
+            codes = "".join(_STRUCT_CODES[self.kinds[i]] for i in self._fixed) + "I" * len(self._strs)
+            self._struct = struct.Struct("<" + codes)
+            self._enum_slots = [(self._fixed.index(i), choices) for i, choices in self._enums.items()]
+
+    def write(self, record: tuple) -> None:
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records: Iterable[tuple]) -> None:
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+        batch, self._batch = self._batch, []
+        self.count += len(batch)
+        if len(batch) == 0:
+            return
+        if self.fmt == "csv":
+            self._csv.writerows(batch)
+        elif self.fmt == "jsonl":
+            line, strs, dumps = self._json_line, self._json_strs, json.dumps
+            out = []
+            for r in batch:
+                r = list(r)
+                for i in strs:
+                    r[i] = dumps(r[i])
+                out.append(line % tuple(r))
+            self._text.write("".join(out))
+        else:
+            self.stream.write(b"".join(self._pack(r) for r in batch))
+
+    def _pack(self, record: tuple) -> bytes:
+        fixed = [record[i] for i in self._fixed]
+        for slot, choices in self._enum_slots:
+            fixed[slot] = choices[fixed[slot]]
+        strs = [record[i].encode("utf-8") for i in self._strs]
+        return self._struct.pack(*fixed, *map(len, strs)) + b"".join(strs)
+
+    def close(self) -> None:
+        self.flush()
+        if self.fmt != "binary":
+            # Don't let the wrapper close the underlying stream
+            self._text.flush()
+            self._text.detach()
+        self.stream.flush()
+
+
+def read_binary_records(stream: IO[bytes]):
+    # Inverse of the binary RecordWriter, yields (field names, record) for every record
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a record file")
+    data = stream.read()
+    version, nfields = struct.unpack_from("<HH", data, 0)
+    if version != VERSION:
+        raise ValueError(f"Unsupported record file version {version}")
+    pos = 4
+
+    def _str():
+        nonlocal pos
+        (n,) = struct.unpack_from("<I", data, pos)
+        s = data[pos + 4 : pos + 4 + n].decode("utf-8")
+        pos += 4 + n
+        return s
+
+    fields = []
+    kind_names = {v: k for k, v in KINDS.items()}
+    for _ in range(nfields):
+        name = _str()
+        kind = kind_names[data[pos]]
+        pos += 1
+        choices = None
+        if kind == "enum":
+            (n,) = struct.unpack_from("<I", data, pos)
+            pos += 4
+            choices = [_str() for _ in range(n)]
+        fields.append((name, kind, choices))
+
+    names = [name for name, _, _ in fields]
+    fixed = [i for i, (_, kind, _) in enumerate(fields) if kind != "str"]
+    strs = [i for i, (_, kind, _) in enumerate(fields) if kind == "str"]
+    record_struct = struct.Struct("<" + "".join(_STRUCT_CODES[fields[i][1]] for i in fixed) + "I" * len(strs))
+    while pos < len(data):
+        values = record_struct.unpack_from(data, pos)
+        pos += record_struct.size
+        record = [None] * len(fields)
+        for i, v in zip(fixed, values):
+            choices = fields[i][2]
+            record[i] = v if choices is None else choices[v]
+        for i, n in zip(strs, values[len(fixed) :]):
+            record[i] = data[pos : pos + n].decode("utf-8")
+            pos += n
+        yield names, tuple(record)
@@ -0,0 +1,441 @@
+import re
+from enum import Enum
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+Tokens = list
+Segment = Union[List[Tokens], "CodeRope"]
+
+
+class CodeRope:
+    # Three address code of a statement sequence. Semantic actions append whole segments (lists of
+    # instructions or other ropes) by reference in O(1), the instructions are only copied once when
+    # the rope is flattened at the end of the function
+    __slots__ = ("segments", "length")
+
+    def __init__(self, *segments: Segment) -> None:
+        self.segments = []
+        self.length = 0
+        for segment in segments:
+            self.append(segment)
+
+    def append(self, segment: Segment) -> "CodeRope":
+        # The segment must not be modified afterwards, it is shared and not copied
+        if len(segment) > 0:
+            self.segments.append(segment)
+            self.length += len(segment)
+        return self
+
+    __iadd__ = append
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Tokens]:
+        # Explicit stack so that deeply nested statements don't hit the recursion limit
+        stack = [iter(self.segments)]
+        while len(stack) > 0:
+            for segment in stack[-1]:
+                if isinstance(segment, CodeRope):
+                    stack.append(iter(segment.segments))
+                    break
+                yield from segment
+            else:
+                stack.pop()
+
+    def flatten(self) -> List[Tokens]:
+        return list(self)
+
+
+# Typed three address code. The frontend emits the string lists above and `lower` converts the
+# rewritten code of every unit once. The optimizer, the -v dump and the MIPS backend all work on
+# `Instruction`s
+
+
+class Op(Enum):
+    LABEL = "label"
+    BEGINFUNC = "beginfunc"
+    ENDFUNC = "endfunc"
+    SCOPE_PUSH = "scope push"
+    SCOPE_POP = "scope pop"
+    GOTO = "goto"
+    IF = "if"
+    PARAM = "param"
+    POPPARAMS = "popparams"
+    CALL = "call"
+    RETURN = "return"
+    COPY = "copy"  # x := a
+    UNARY = "unary"  # x := op a, with op one of + - ! & *
+    CAST = "cast"  # x := (type) a
+    INDEX = "index"  # x := a [i]
+    BINARY = "binary"  # x := a op b
+    ASM = "asm"
+    RAW = "raw"  # Anything else, kept as is and treated as opaque
+
+
+class Operand:
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.text == other.text
+
+    def __hash__(self) -> int:
+        return hash(self.text)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.text!r})"
+
+    def __str__(self) -> str:
+        return self.text
+
+    def variables(self) -> Tuple[str, ...]:
+        # Names read when the operand is evaluated
+        return ()
+
+
+class Temp(Operand):
+    __slots__ = ()
+
+    def variables(self) -> Tuple[str, ...]:
+        return (self.text,)
+
+
+class Var(Operand):
+    # Variables, struct fields spilled as variables (`s.f`) and renamed statics (`x.static.f`)
+    __slots__ = ()
+
+    def variables(self) -> Tuple[str, ...]:
+        return (self.text,)
+
+
+class Const(Operand):
+    __slots__ = ()
+
+
+class IntConst(Const):
+    __slots__ = ()
+
+    @property
+    def value(self) -> int:
+        return int(self.text)
+
+
+class FloatConst(Const):
+    __slots__ = ()
+
+    @property
+    def value(self) -> float:
+        return float(self.text)
+
+
+class CharConst(Const):
+    __slots__ = ()
+
+
+class StringConst(Const):
+    __slots__ = ()
+
+
+class Label(Operand):
+    __slots__ = ()
+
+
+class Memory(Operand):
+    # Array elements (`a[i]`, `a [i]`), dereferences (`*p`) and member accesses (`p -> f`)
+    __slots__ = ("base", "index", "field")
+
+    def __init__(
+        self, text: str, base: Operand, index: Optional[Operand] = None, field: Optional[str] = None
+    ) -> None:
+        self.text = text
+        self.base = base
+        self.index = index
+        self.field = field
+
+    def variables(self) -> Tuple[str, ...]:
+        if self.index is None:
+            return self.base.variables()
+        return self.base.variables() + self.index.variables()
+
+
+_INT_RE = re.compile(r"[+-]?\d+$")
+_FLOAT_RE = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+
+
+def operand(text: str) -> Operand:
+    if len(text) == 0:
+        return Var(text)
+    if text.startswith("__tmp_var_"):
+        return Temp(text)
+    if _INT_RE.match(text):
+        return IntConst(text)
+    if _FLOAT_RE.match(text):
+        return FloatConst(text)
+    if text[0] == "'":
+        return CharConst(text)
+    if text[0] == '"':
+        return StringConst(text)
+    if text[-1] == "]" and "[" in text:
+        i = text.index("[")
+        return Memory(text, operand(text[:i].rstrip()), operand(text[i + 1 : -1]))
+    if text[0] == "*":
+        return Memory(text, operand(text[1:]))
+    if " -> " in text:
+        base, field = text.split(" -> ", 1)
+        return Memory(text, operand(base), field=field)
+    return Var(text)
+
+
+def is_constant(x: Operand) -> bool:
+    return isinstance(x, (IntConst, FloatConst))
+
+
+_ASSIGN_OPS = (Op.COPY, Op.UNARY, Op.CAST, Op.INDEX, Op.BINARY, Op.CALL)
+
+
+class Instruction:
+    # op      : Op
+    # dst     : assigned operand (Temp, Var or Memory for stores), None if nothing is assigned
+    # args    : operands read, in the order they are written
+    # operator: "+", "==", "(float)", ... for BINARY, IF, UNARY and CAST
+    # extra   : untyped trailing tokens (function name and #params of a CALL, frame sizes, ...)
+    # indent  : indentation of the line in the -v dump
+    __slots__ = ("op", "dst", "args", "operator", "extra", "indent", "defs", "uses")
+
+    def __init__(
+        self,
+        op: Op,
+        dst: Optional[Operand] = None,
+        args: Tuple[Operand, ...] = (),
+        operator: Optional[str] = None,
+        extra: Tuple[str, ...] = (),
+        indent: int = 0,
+    ) -> None:
+        self.op = op
+        self.dst = dst
+        self.args = args
+        self.operator = operator
+        self.extra = extra
+        self.indent = indent
+
+        uses = [v for a in args for v in a.variables()]
+        if isinstance(dst, (Temp, Var)):
+            self.defs = frozenset((dst.text,))
+        else:
+            self.defs = frozenset()
+            if dst is not None:
+                # A store reads the pointer / index it writes through
+                uses.extend(dst.variables())
+        self.uses = frozenset(uses)
+
+    def replace(self, **fields) -> "Instruction":
+        new = {
+            "op": self.op,
+            "dst": self.dst,
+            "args": self.args,
+            "operator": self.operator,
+            "extra": self.extra,
+            "indent": self.indent,
+        }
+        new.update(fields)
+        return Instruction(**new)
+
+    @property
+    def target(self) -> Optional[str]:
+        # Label jumped to by a GOTO / IF
+        if self.op is Op.GOTO or self.op is Op.IF:
+            return self.args[-1].text
+        return None
+
+    @property
+    def is_assignment(self) -> bool:
+        return self.op in _ASSIGN_OPS
+
+    def tokens(self) -> Tokens:
+        op = self.op
+        a = [x.text for x in self.args]
+        if op is Op.COPY:
+            return [self.dst.text, ":=", a[0]]
+        elif op is Op.BINARY:
+            return [self.dst.text, ":=", a[0], self.operator, a[1]]
+        elif op is Op.UNARY or op is Op.CAST:
+            return [self.dst.text, ":=", self.operator, a[0]]
+        elif op is Op.INDEX:
+            return [self.dst.text, ":=", a[0], "[" + a[1] + "]"]
+        elif op is Op.CALL:
+            return [self.dst.text, ":=", "CALL", *self.extra]
+        elif op is Op.LABEL:
+            return [a[0] + ":"]
+        elif op is Op.GOTO:
+            return ["GOTO", a[0]]
+        elif op is Op.IF:
+            return ["IF", a[0], self.operator, a[1], "GOTO", a[2]]
+        elif op is Op.PARAM:
+            return ["PUSHPARAM", a[0]]
+        elif op is Op.RETURN:
+            return ["RETURN", *a]
+        elif op is Op.SCOPE_PUSH:
+            return ["SYMTAB", "PUSH", *self.extra]
+        elif op is Op.SCOPE_POP:
+            return ["SYMTAB", "POP"]
+        elif op is Op.BEGINFUNC:
+            return ["BEGINFUNC", *self.extra]
+        elif op is Op.ENDFUNC:
+            return ["ENDFUNC"]
+        elif op is Op.POPPARAMS:
+            return ["POPPARAMS", *self.extra]
+        elif op is Op.ASM:
+            return ["ASSEMBLY_DIRECTIVE", *self.extra]
+        return list(self.extra)
+
+    def __str__(self) -> str:
+        return " ".join(self.tokens())
+
+    def __repr__(self) -> str:
+        return f"Instruction({self.op.name}, {str(self)!r})"
+
+    @classmethod
+    def parse(cls, c: Tokens, indent: int = 0) -> "Instruction":
+        # The only place where the shape of an instruction is inferred from its tokens
+        n = len(c)
+        if n >= 3 and c[1] == ":=":
+            dst = operand(c[0])
+            if n == 3:
+                return cls(Op.COPY, dst, (operand(c[2]),), indent=indent)
+            if n == 5 and c[2] == "CALL":
+                return cls(Op.CALL, dst, (), extra=(c[3], c[4]), indent=indent)
+            if n == 5:
+                return cls(Op.BINARY, dst, (operand(c[2]), operand(c[4])), c[3], indent=indent)
+            if n == 4 and c[2][0] == "(" and c[2][-1] == ")":
+                return cls(Op.CAST, dst, (operand(c[3]),), c[2], indent=indent)
+            if n == 4 and c[3][0] == "[" and c[3][-1] == "]":
+                return cls(Op.INDEX, dst, (operand(c[2]), operand(c[3][1:-1])), indent=indent)
+            if n == 4 and c[2] in ("+", "-", "!", "~", "&", "*"):
+                return cls(Op.UNARY, dst, (operand(c[3]),), c[2], indent=indent)
+        elif n == 1 and c[0].endswith(":"):
+            return cls(Op.LABEL, args=(Label(c[0][:-1]),), indent=indent)
+        elif c[0] == "GOTO" and n == 2:
+            return cls(Op.GOTO, args=(Label(c[1]),), indent=indent)
+        elif c[0] == "IF" and n == 6 and c[4] == "GOTO":
+            return cls(Op.IF, args=(operand(c[1]), operand(c[3]), Label(c[5])), operator=c[2], indent=indent)
+        elif c[0] == "PUSHPARAM" and n == 2:
+            return cls(Op.PARAM, args=(operand(c[1]),), indent=indent)
+        elif c[0] == "RETURN" and n <= 2:
+            return cls(Op.RETURN, args=tuple(operand(x) for x in c[1:]), indent=indent)
+        elif c[0] == "SYMTAB" and n == 3 and c[1] == "PUSH":
+            return cls(Op.SCOPE_PUSH, extra=(c[2],), indent=indent)
+        elif c[0] == "SYMTAB" and n == 2 and c[1] == "POP":
+            return cls(Op.SCOPE_POP, indent=indent)
+        elif c[0] == "BEGINFUNC":
+            return cls(Op.BEGINFUNC, extra=tuple(c[1:]), indent=indent)
+        elif c[0] == "ENDFUNC" and n == 1:
+            return cls(Op.ENDFUNC, indent=indent)
+        elif c[0] == "POPPARAMS":
+            return cls(Op.POPPARAMS, extra=tuple(c[1:]), indent=indent)
+        elif c[0] == "ASSEMBLY_DIRECTIVE":
+            return cls(Op.ASM, extra=tuple(c[1:]), indent=indent)
+        return cls(Op.RAW, extra=tuple(c), indent=indent)
+
+
+def lower(code: Iterable[Tokens], indents: Iterable[int]) -> List[Instruction]:
+    return [Instruction.parse(c, idt) for c, idt in zip(code, indents)]
+
+
+def split_functions(code: List[Instruction]) -> List[List[Instruction]]:
+    # A unit is the code of one function, preceded by the global initializers for the first
+    # function. Functions start at their label, which is followed by BEGINFUNC
+    parts = []
+    start = 0
+    for i in range(1, len(code)):
+        if code[i].op is Op.LABEL and i + 1 < len(code) and code[i + 1].op is Op.BEGINFUNC:
+            parts.append(code[start:i])
+            start = i
+    if start < len(code):
+        parts.append(code[start:])
+    return parts
+
+
+class BasicBlock:
+    __slots__ = ("index", "instructions", "successors", "predecessors")
+
+    def __init__(self, index: int, instructions: List[Instruction]) -> None:
+        self.index = index
+        self.instructions = instructions
+        self.successors = []
+        self.predecessors = []
+
+    @property
+    def label(self) -> Optional[str]:
+        first = self.instructions[0]
+        return first.args[0].text if first.op is Op.LABEL else None
+
+    def __iter__(self) -> Iterator[Instruction]:
+        return iter(self.instructions)
+
+    def __len__(self) -> int:
+        return len(self.instructions)
+
+    def __repr__(self) -> str:
+        return f"BasicBlock({self.index}, {len(self.instructions)} instructions)"
+
+
+class ControlFlowGraph:
+    # Basic blocks of a single function (or of the global initializers) in program order. A block
+    # starts at a label or after a jump / return, GOTO and IF add an edge to the block of their
+    # label, and every block that does not end with an unconditional transfer falls through
+    __slots__ = ("name", "blocks", "labels")
+
+    def __init__(self, instructions: List[Instruction]) -> None:
+        self.blocks = []
+        self.labels = {}
+        self.name = None
+        if len(instructions) > 0 and instructions[0].op is Op.LABEL:
+            self.name = instructions[0].args[0].text
+
+        current = []
+        for instr in instructions:
+            if instr.op is Op.LABEL and len(current) > 0:
+                self._add_block(current)
+                current = []
+            current.append(instr)
+            if instr.op in (Op.GOTO, Op.IF, Op.RETURN):
+                self._add_block(current)
+                current = []
+        if len(current) > 0:
+            self._add_block(current)
+
+        for block in self.blocks:
+            last = block.instructions[-1]
+            if last.op is Op.GOTO or last.op is Op.IF:
+                dst = self.labels.get(last.target, None)
+                if dst is not None:
+                    self._add_edge(block, dst)
+            if last.op not in (Op.GOTO, Op.RETURN, Op.ENDFUNC) and block.index + 1 < len(self.blocks):
+                self._add_edge(block, self.blocks[block.index + 1])
+
+    def _add_block(self, instructions: List[Instruction]) -> None:
+        block = BasicBlock(len(self.blocks), instructions)
+        if block.label is not None:
+            self.labels[block.label] = block
+        self.blocks.append(block)
+
+    @staticmethod
+    def _add_edge(src: BasicBlock, dst: BasicBlock) -> None:
+        if dst not in src.successors:
+            src.successors.append(dst)
+            dst.predecessors.append(src)
+
+    @property
+    def entry(self) -> Optional[BasicBlock]:
+        return self.blocks[0] if len(self.blocks) > 0 else None
+
+    def __iter__(self) -> Iterator[BasicBlock]:
+        return iter(self.blocks)
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def instructions(self) -> List[Instruction]:
+        return [instr for block in self.blocks for instr in block.instructions]
@@ -1,5 +1,22 @@
+import argparse
+import re
 import sys
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+from bisect import bisect_right
+from functools import partial
+from itertools import accumulate
+from typing import Tuple, Union
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants, sre_parse
 import ply.lex as lex
+from export import FORMATS, RecordWriter
+from symtab import TYPE_NAMES
+from table_cache import LEXTAB, get_table_cache_dir, load_table_module, table_writer
 
 reserved = (
     "AUTO",
@@ -128,16 +145,8 @@ t_LE_OP = r"<="
 t_GE_OP = r">="
 t_EQ_OP = r"=="
 t_NE_OP = r"!="
-t_SEMICOLON = r";"
-t_LEFT_CURLY_BRACKET = r"({|<%)"
-t_RIGHT_CURLY_BRACKET = r"(}|%>)"
-t_COMMA = r","
 t_COLON = r":"
 t_EQ = r"="
-t_LEFT_BRACKET = r"\("
-t_RIGHT_BRACKET = r"\)"
-t_LEFT_THIRD_BRACKET = r"(\[|<:)"
-t_RIGHT_THIRD_BRACKET = r"(\]|:>)"
 t_DOT = r"\."
 t_LOGICAL_AND = r"&"
 t_NOT = r"!"
@@ -153,19 +162,121 @@ t_EXPONENT = r"\^"
 t_LOGICAL_OR = r"\|"
 t_QUESTION = r"\?"
 
-TYPE_NAMES = []
+# A visible typedef name is still an ordinary identifier when it is the tag of a struct / union /
+# enum, or the name declared right after a complete type (`int T;`, `T *T;`, `struct S T;`) or
+# after a comma of the same declaration (`int x, T;`)
+_TAG_WORDS = frozenset(("STRUCT", "UNION", "ENUM", "CLASS"))
+_TYPE_WORDS = frozenset(
+    ("CHAR", "DOUBLE", "FLOAT", "INT", "LONG", "SHORT", "SIGNED", "UNSIGNED", "VOID", "TYPE_NAME", "TAG")
+)
+_SPECIFIER_WORDS = _TYPE_WORDS | _TAG_WORDS
+
+
+class DeclarationState:
+    # Whether the commas seen separate the declarators of a declaration. A type word outside of
+    # parentheses and brackets starts a declaration, which lasts until its `;`. Braces save and
+    # restore it, so struct bodies and braced initializers don't end the declaration around them
+    __slots__ = ("active", "depth", "saved")
+
+    def __init__(self) -> None:
+        self.active = False
+        # Open parentheses and brackets
+        self.depth = 0
+        self.saved = []
+
+    def word(self, kind: str) -> None:
+        if kind in _SPECIFIER_WORDS and self.depth == 0:
+            self.active = True
+
+    def punctuator(self, kind: str) -> bool:
+        # True for a comma followed by the next declarator
+        if kind == "COMMA":
+            return self.active and self.depth == 0
+        if kind == "LEFT_BRACKET" or kind == "LEFT_THIRD_BRACKET":
+            self.depth += 1
+        elif kind == "RIGHT_BRACKET" or kind == "RIGHT_THIRD_BRACKET":
+            self.depth = max(self.depth - 1, 0)
+        elif kind == "LEFT_CURLY_BRACKET":
+            self.saved.append((self.active, self.depth))
+            self.active, self.depth = False, 0
+        elif kind == "RIGHT_CURLY_BRACKET":
+            self.active, self.depth = self.saved.pop() if len(self.saved) > 0 else (False, 0)
+        elif kind == "SEMICOLON":
+            self.active = False
+        return False
+
+
+def _is_type_name(data, start, last_word):
+    # last_word is the (kind, end offset) of the keyword or identifier before the one at start
+    kind, end = last_word
+    if kind in _TAG_WORDS:
+        return False
+    return not (kind in _TYPE_WORDS and end <= start and data[end:start].strip(" \t\n*") == "")
 
 
 def t_IDENTIFIER(t):
     r"[A-Za-z_][\w_]*"
-    global EXPECTED_TYPENAMES
     t.type = disallowed_identifiers.get(t.value, "IDENTIFIER")
+    last_word = t.lexer.last_word
     if t.type == "IDENTIFIER":
-        if t.value in TYPE_NAMES:
+        if t.value in TYPE_NAMES and _is_type_name(t.lexer.lexdata, t.lexpos, last_word):
             t.type = "TYPE_NAME"
+    tag = t.type == "IDENTIFIER" and last_word[0] in _TAG_WORDS
+    t.lexer.last_word = ("TAG" if tag else t.type, t.lexpos + len(t.value))
+    t.lexer.declaration.word(t.lexer.last_word[0])
     return t
 
 
+# Function rules so that the lexer follows the declarations, see DeclarationState
+
+
+def _punctuator(t):
+    if t.lexer.declaration.punctuator(t.type):
+        # The next declarator is read like the name right after the type
+        t.lexer.last_word = ("TYPE_NAME", t.lexpos + 1)
+    return t
+
+
+def t_SEMICOLON(t):
+    r";"
+    return _punctuator(t)
+
+
+def t_LEFT_CURLY_BRACKET(t):
+    r"({|<%)"
+    return _punctuator(t)
+
+
+def t_RIGHT_CURLY_BRACKET(t):
+    r"(}|%>)"
+    return _punctuator(t)
+
+
+def t_COMMA(t):
+    r","
+    return _punctuator(t)
+
+
+def t_LEFT_BRACKET(t):
+    r"\("
+    return _punctuator(t)
+
+
+def t_RIGHT_BRACKET(t):
+    r"\)"
+    return _punctuator(t)
+
+
+def t_LEFT_THIRD_BRACKET(t):
+    r"(\[|<:)"
+    return _punctuator(t)
+
+
+def t_RIGHT_THIRD_BRACKET(t):
+    r"(\]|:>)"
+    return _punctuator(t)
+
+
 def t_NEWLINE(t):
     r"\n+"
     t.lexer.lineno += t.value.count("\n")
@@ -190,11 +301,296 @@ def t_error(t):
     t.lexer.skip(1)
 
 
-lexer = lex.lex()
+def build_lexer():
+    module = sys.modules[__name__]
+    cache_dir = get_table_cache_dir(__file__)
+    if cache_dir is None:
+        return lex.lex(module=module)
+    lextab = load_table_module(cache_dir, LEXTAB)
+    if lextab is not None:
+        # Rules were validated when the table was generated
+        return lex.lex(module=module, optimize=1, lextab=lextab)
+    lexer = lex.lex(module=module)
+    with table_writer(cache_dir) as outputdir:
+        if outputdir is not None:
+            lexer.writetab(LEXTAB, outputdir)
+    return lexer
+
+
+lexer = build_lexer()
+lexer.last_word = (None, 0)
+lexer.declaration = DeclarationState()
+
+_ASCII = [chr(c) for c in range(128)]
+_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: r"\d",
+    sre_constants.CATEGORY_NOT_DIGIT: r"\D",
+    sre_constants.CATEGORY_SPACE: r"\s",
+    sre_constants.CATEGORY_NOT_SPACE: r"\S",
+    sre_constants.CATEGORY_WORD: r"\w",
+    sre_constants.CATEGORY_NOT_WORD: r"\W",
+}
+
+
+def _first_chars(pattern: str):
+    # Characters a match of the (VERBOSE) pattern can start with, None if it can be anything
+    def _charset(items):
+        negate, chars = False, set()
+        for op, av in items:
+            if op is sre_constants.NEGATE:
+                negate = True
+            elif op is sre_constants.LITERAL:
+                chars.add(chr(av))
+            elif op is sre_constants.RANGE:
+                chars.update(chr(c) for c in range(av[0], av[1] + 1))
+            elif op is sre_constants.CATEGORY and av in _CATEGORIES:
+                chars.update(c for c in _ASCII if re.match(_CATEGORIES[av], c))
+            else:
+                return set(_ASCII)
+        return set(_ASCII) - chars if negate else chars
+
+    def _first(seq):
+        # (first characters, can match the empty string)
+        chars = set()
+        for op, av in seq:
+            if op is sre_constants.LITERAL:
+                return chars | {chr(av)}, False
+            elif op is sre_constants.IN:
+                return chars | _charset(av), False
+            elif op in (sre_constants.NOT_LITERAL, sre_constants.ANY):
+                return chars | set(_ASCII), False
+            elif op is sre_constants.SUBPATTERN:
+                first, nullable = _first(av[-1])
+            elif op is sre_constants.BRANCH:
+                first, nullable = set(), False
+                for branch in av[1]:
+                    _f, _n = _first(branch)
+                    first, nullable = first | _f, nullable or _n
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+                first, nullable = _first(av[2])
+                nullable = nullable or av[0] == 0
+            else:
+                return set(_ASCII), True
+            chars |= first
+            if not nullable:
+                return chars, False
+        return chars, True
+
+    try:
+        chars, nullable = _first(sre_parse.parse(pattern, re.VERBOSE))
+    except Exception:
+        return None
+    return None if nullable else chars
+
+
+_PUNCTUATORS = frozenset(
+    (
+        "SEMICOLON",
+        "LEFT_CURLY_BRACKET",
+        "RIGHT_CURLY_BRACKET",
+        "COMMA",
+        "LEFT_BRACKET",
+        "RIGHT_BRACKET",
+        "LEFT_THIRD_BRACKET",
+        "RIGHT_THIRD_BRACKET",
+    )
+)
+
+
+class FastLexer:
+    # Drop-in replacement for the PLY lexer. PLY tries the rules one after the other through
+    # its master regex and dispatches to a Python function per token. Here, the rules that can
+    # start with a given character are precombined (in the order PLY tries them), so every token
+    # is a single match against a handful of alternatives. Ignored characters are consumed as a
+    # suffix of the previous match. Produces the same LexToken stream, including lineno / lexpos
+    _dispatch = None
+
+    def __init__(self) -> None:
+        if FastLexer._dispatch is None:
+            FastLexer._dispatch = self._build_dispatch()
+        self.lexdata = ""
+        self.lexpos = 0
+        self.lineno = 1
+        self.token = partial(next, iter(()), None)
+
+    @staticmethod
+    def _build_dispatch():
+        module = sys.modules[__name__]
+        rules = [(n, f) for n, f in vars(module).items() if n.startswith("t_") and n not in ("t_ignore", "t_error")]
+        # PLY: function rules in order of definition, then string rules by decreasing regex length
+        funcs = sorted((r for r in rules if callable(r[1])), key=lambda r: r[1].__code__.co_firstlineno)
+        strs = sorted((r for r in rules if isinstance(r[1], str)), key=lambda r: len(r[1]), reverse=True)
+        rules = [(n[2:], f.__doc__) for n, f in funcs] + [(n[2:], r) for n, r in strs]
+        first = [_first_chars(r) for _, r in rules]
+
+        def _compile(selected):
+            alternatives = "".join(f"(?P<{n}>{r})|" for n, r in selected)
+            return re.compile(f"(?:{alternatives}(?P<_error>[\\s\\S]))[{t_ignore}]*", re.VERBOSE)
+
+        # Characters outside ASCII go through all the rules
+        dispatch = {c: _compile([r for r, f in zip(rules, first) if f is None or c in f]) for c in _ASCII}
+        return dispatch, _compile(rules)
+
+    def input(self, data: str) -> None:
+        self.lexdata = data
+        self.lexpos = len(data) - len(data.lstrip(t_ignore))
+        # Bound straight to the generator, saving a Python level call per token
+        self.token = partial(next, self._scan(), None)
+
+    def _scan(self):
+        LexToken, reserved_words, type_names = lex.LexToken, disallowed_identifiers, TYPE_NAMES
+        dispatch, fallback = self._dispatch
+        data, pos = self.lexdata, self.lexpos
+        last_word = (None, 0)
+        declaration = DeclarationState()
+        specifier_words, punctuators = _SPECIFIER_WORDS, _PUNCTUATORS
+        while pos < len(data):
+            m = dispatch.get(data[pos], fallback).match(data, pos)
+            pos = m.end()
+            group = kind = m.lastgroup
+            if kind == "IDENTIFIER":
+                value = m.group(group)
+                kind = reserved_words.get(value, "IDENTIFIER")
+                if kind == "IDENTIFIER" and value in type_names and _is_type_name(data, m.start(group), last_word):
+                    kind = "TYPE_NAME"
+                tag = kind == "IDENTIFIER" and last_word[0] in _TAG_WORDS
+                last_word = ("TAG" if tag else kind, m.end(group))
+                if last_word[0] in specifier_words and declaration.depth == 0:
+                    declaration.active = True
+            elif kind == "NEWLINE":
+                self.lineno += m.end(group) - m.start(group)
+                continue
+            elif kind == "comment":
+                self.lineno += m.group(group).count("\n")
+                continue
+            elif kind == "preprocessor":
+                self.lineno += 1
+                continue
+            elif kind == "_error":
+                print("Illegal character '%s'" % m.group(group))
+                continue
+            else:
+                value = m.group(group)
+                if kind in punctuators and declaration.punctuator(kind):
+                    last_word = ("TYPE_NAME", m.end(group))
+            tok = LexToken()
+            tok.type = kind
+            tok.value = value
+            tok.lineno = self.lineno
+            tok.lexpos = m.start(group)
+            self.lexpos = pos
+            yield tok
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        tok = self.token()
+        if tok is None:
+            raise StopIteration
+        return tok
+
+
+def get_lexer(engine: str = "ply"):
+    return lexer if engine == "ply" else FastLexer()
+
+
+class LineIndex:
+    # Offset of the first character of every line of the input, so a lexpos resolves to
+    # (file, line, column) by binary search. Built in one pass over the input the first time
+    # a location is needed, the lexers themselves don't pay for it per token
+    def __init__(self, data: str, unit=None) -> None:
+        self.data = data
+        self.unit = unit
+        self.line_starts = list(accumulate((len(line) + 1 for line in data.split("\n")), initial=0))[:-1]
+
+    def location(self, lexpos: int) -> Tuple[Union[str, None], int, int]:
+        # Lines and columns start from 1. Lines of an expanded translation unit are mapped
+        # back to the file they were included from
+        line = bisect_right(self.line_starts, lexpos)
+        column = lexpos - self.line_starts[line - 1] + 1
+        if self.unit is None:
+            return None, line, column
+        path, line = self.unit.original_location(line)
+        return path, line, column
+
+
+def get_line_index(lexer) -> LineIndex:
+    # Cached on the lexer and rebuilt when it is fed a new input. Set lexer.unit to the
+    # TranslationUnit being lexed to resolve locations to the original files
+    index = getattr(lexer, "line_index", None)
+    if index is None or index.data is not lexer.lexdata:
+        index = lexer.line_index = LineIndex(lexer.lexdata, getattr(lexer, "unit", None))
+    return index
+
+
+def format_location(lexer, lexpos: int) -> str:
+    path, line, column = get_line_index(lexer).location(lexpos)
+    location = f"line number {line}, column {column}"
+    return location if path is None else location + f" in {path}"
+
+
+def export_tokens(lexer, data: str, writer) -> Counter:
+    # Streams (type, value, line, column, lexpos) records of every token to writer and
+    # returns the number of tokens per type. Tokens come in order, so the column is an
+    # O(1) lookup of the token's line start
+    lexer.lineno = 1
+    lexer.input(data)
+    line_starts = get_line_index(lexer).line_starts
+    counts = Counter()
+    for tok in iter(lexer.token, None):
+        counts[tok.type] += 1
+        if writer is not None:
+            writer.write((tok.type, tok.value, tok.lineno, tok.lexpos - line_starts[tok.lineno - 1] + 1, tok.lexpos))
+    if writer is not None:
+        writer.close()
+    return counts
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", type=str, help="Input file")
+    parser.add_argument("--format", type=str, default=None, choices=FORMATS, help="Export the tokens in bulk")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Export destination (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=4096, help="Number of tokens written at once")
+    parser.add_argument("--count-only", action="store_true", help="Only print the number of tokens per type")
+    parser.add_argument("--lexer", type=str, default="ply", choices=["ply", "fast"], help="Lexer engine")
+    return parser
+
 
 if __name__ == "__main__":
-    with open(str(sys.argv[1]), "r+") as file:
+    args = get_args().parse_args()
+    with open(args.input, "r") as file:
         data = file.read()
-        file.close()
-        print("{token type, token name, line nunmber, index relative to start of input}")
-        lex.runmain(lexer, data)
+    lexer = get_lexer(args.lexer)
+
+    if args.format is None and not args.count_only:
+        print("{token type, token name, line number, column number}")
+        lexer.input(data)
+        index = get_line_index(lexer)
+        for tok in iter(lexer.token, None):
+            _, line, column = index.location(tok.lexpos)
+            print(f"({tok.type},{tok.value!r},{line},{column})")
+        sys.exit(0)
+
+    fields = [("type", ("enum", tokens)), ("value", "str")]
+    fields += [("line", "u32"), ("column", "u32"), ("lexpos", "u32")]
+    stdout = sys.stdout.buffer
+    t0 = time.perf_counter()
+    # Lexer diagnostics must not end up in the exported tokens
+    with redirect_stdout(sys.stderr):
+        if args.count_only:
+            counts = export_tokens(lexer, data, None)
+        elif args.output is None:
+            counts = export_tokens(lexer, data, RecordWriter(stdout, args.format, fields, args.batch_size))
+        else:
+            with open(args.output, "wb", buffering=1 << 20) as f:
+                counts = export_tokens(lexer, data, RecordWriter(f, args.format, fields, args.batch_size))
+    elapsed = time.perf_counter() - t0
+
+    if args.count_only:
+        ntokens = sum(counts.values())
+        for kind, count in counts.most_common():
+            print(f"{kind:<24}{count:>12}")
+        print(f"{'total':<24}{ntokens:>12}")
+        print(f"{ntokens / max(elapsed, 1e-9):.0f} tokens/s ({elapsed * 1000:.2f} ms)")
@@ -1,17 +1,17 @@
 from copy import deepcopy
-import numpy as np
 
 from symtab import (
     SymbolTable,
+    aggregate_layout,
     compute_offset_size,
-    compute_storage_size,
     get_current_symtab,
     get_global_symtab,
     get_tabname_mapping,
     get_tmp_label,
     get_default_value,
-    DATATYPE2SIZE,
 )
+from ir import Memory, Op
+from type_utils import Type
 
 import random
 
@@ -187,9 +187,13 @@ def get_mips_instr_from_binary_op(op: str, t: str, reg1: str, reg2: str, reg3: s
         return [f"\t{op_mips}\t{reg3},\t{reg1},\t{reg2}"]
 
 
+def _is_integer(s: str):
+    return s.lstrip("+-").isnumeric()
+
+
 def type_of_number(s: str):
     try:
-        if not s.isnumeric():
+        if not _is_integer(s):
             float(s)
             return "float"
         else:
@@ -200,7 +204,7 @@ def type_of_number(s: str):
 
 def is_number(s: str, return_instr=False):
     try:
-        if not s.isnumeric():
+        if not _is_integer(s):
             float(s)
             if return_instr:
                 if str(s) in DATA_TO_LABEL:
@@ -270,8 +274,7 @@ def convert_varname(var: str, cur_symtab: SymbolTable):
         entry = cur_symtab.lookup(identifier + ".static." + cur_symtab.func_scope)
     _type = entry["type"]
     for f in splits[1:]:
-        type_entry = cur_symtab.lookup_type(_type)
-        _type = type_entry["field types"][type_entry["field names"].index(f)]
+        _type = aggregate_layout(cur_symtab.lookup_type(_type)).field_types[f]
     entry = deepcopy(entry)
     entry["type"] = _type
     name = "VAR-" + entry["table name"] + "-" + var
@@ -306,14 +309,14 @@ def get_type_cast_instr(t1, t2):  # t1 -> t2
     raise NotImplementedError
 
 
-def type_cast_mips(c, dtype, current_symbol_table, offset):  # reg1 := (dtype) reg2
+def type_cast_mips(dst, src, dtype, current_symbol_table, offset):  # reg1 := (dtype) reg2
 
-    t1, offset = get_register(c[0], current_symbol_table, offset, no_flush=True)
-    is_num, instr = is_number(c[3], True)
-    t2, offset, entry = get_register(c[3], current_symbol_table, offset, True)
+    t1, offset = get_register(dst, current_symbol_table, offset, no_flush=True)
+    is_num, instr = is_number(src, True)
+    t2, offset, entry = get_register(src, current_symbol_table, offset, True)
 
     if is_num:
-        _type = type_of_number(c[3])
+        _type = type_of_number(src)
         print_text(instr(t2))
     else:
         _type = entry["type"]
@@ -374,7 +377,7 @@ def simple_register_allocator(var: str, current_symbol_table: SymbolTable, offse
     # no_load = no_flush
 
     req_fp, _type = requires_fp_register(var, entry)
-    _s = DATATYPE2SIZE[_type.upper()] if entry is None else entry["size"]
+    _s = Type.of(_type).size if entry is None else entry["size"]
     if req_fp:
         lru_list = lru_list_fp
         free_registers = fp_registers
@@ -615,650 +618,624 @@ def generate_mips_from_3ac(code, no_dump = False):
     global_scope = True
 
     for part in code:
-        for i, c in enumerate(part):
-            # print("\n# " + " ".join(c))
-            print_text("\n# " + " ".join(c))
-            if len(c) == 1:
-                if c[0].endswith(":"):
-                    global_scope = False
-                    # Label
-                    print_text(c[0].replace("(", "__").replace(")", "__").replace(",", "_").replace("*", "ptr").replace(' ', 'sp'))
-                elif c[0] == "ENDFUNC":
-                    # for v,e in var_to_mem.items():
-                    #     print(v, e, current_symbol_table.func_scope)
-                    dump_backpatch()
-                    load_registers_on_function_return("sp")
-                    print_text("\tla\t$sp,\t0($fp)")
-                    print_text("\tlw\t$ra,\t-8($sp)")
-                    print_text("\tlw\t$fp,\t-4($sp)")
-                    print_text("\tjr\t$ra")  # return
-                    free_registers_in_block()
-                    # STATIC_NESTING_LVL -= 1
-
-                elif c[0] == "RETURN":
-                    DYNAMIC_NESTING_LVL -= 1
-                    load_registers_on_function_return("sp")
-                    print_text("\tla\t$sp,\t0($fp)")
-                    print_text("\tlw\t$ra,\t-8($sp)")
-                    print_text("\tlw\t$fp,\t-4($sp)")
-                    print_text("\tjr\t$ra")  # return
+        for instr in part:
+            op, dst = instr.op, instr.dst
+            args = [x.text for x in instr.args]
+            print_text("\n# " + str(instr))
+            if op is Op.LABEL:
+                global_scope = False
+                print_text(
+                    (args[0] + ":").replace("(", "__").replace(")", "__").replace(",", "_").replace("*", "ptr").replace(' ', 'sp')
+                )
 
+            elif op is Op.ENDFUNC:
+                # for v,e in var_to_mem.items():
+                #     print(v, e, current_symbol_table.func_scope)
+                dump_backpatch()
+                load_registers_on_function_return("sp")
+                print_text("\tla\t$sp,\t0($fp)")
+                print_text("\tlw\t$ra,\t-8($sp)")
+                print_text("\tlw\t$fp,\t-4($sp)")
+                print_text("\tjr\t$ra")  # return
+                free_registers_in_block()
+                # STATIC_NESTING_LVL -= 1
+
+            elif op is Op.RETURN and len(args) == 0:
+                DYNAMIC_NESTING_LVL -= 1
+                load_registers_on_function_return("sp")
+                print_text("\tla\t$sp,\t0($fp)")
+                print_text("\tlw\t$ra,\t-8($sp)")
+                print_text("\tlw\t$fp,\t-4($sp)")
+                print_text("\tjr\t$ra")  # return
+
+            elif op is Op.SCOPE_POP:
+                # Pop Symbol Table
+                current_symbol_table = current_symbol_table.parent
+
+            elif op is Op.BEGINFUNC:
+                # STATIC_NESTING_LVL += 1
+                # Has the overall size for the function
+                print_text("\tsw\t$fp,\t-4($sp)")  # dynamic link (old fp)
+                print_text("\tsw\t$ra,\t-8($sp)")
+                print_text("\tla\t$fp,\t0($sp)")
+                sp = instr.extra[0].split(",")
+                offset = store_registers_on_function_call() - int(sp[1])
+                BACKPATCH_OFFSET = offset
+                offset -= int(sp[0])
+                LOCAL_VAR_OFFSET = offset
+                offset -= int(sp[0])
+                print_text(f"\tla\t$sp,\t{offset}($sp)")
+                BACKPATCH_INDEX = len(TEXT_SECTION)
+                create_new_register_block()
+
+            elif op is Op.RETURN:
+                DYNAMIC_NESTING_LVL -= 1
+                is_num, instr1 = is_number(args[0], True)
+                is_ch, instr2 = is_char(args[0])
+                if is_num:
+                    _type = type_of_number(args[0])
+                    reg = RETURN_REGISTERS[_type]
+                    print_text(instr1(reg))
+                elif is_ch:
+                    reg = RETURN_REGISTERS["char"]
+                    print_text(instr1(reg))
                 else:
-                    print_text(c)
-
-            elif len(c) == 2:
-                if c[0] == "SYMTAB":
-                    # Pop Symbol Table
-                    current_symbol_table = current_symbol_table.parent
-
-                elif c[0] == "BEGINFUNC":
-                    # STATIC_NESTING_LVL += 1
-                    # Has the overall size for the function
-                    print_text("\tsw\t$fp,\t-4($sp)")  # dynamic link (old fp)
-                    print_text("\tsw\t$ra,\t-8($sp)")
-                    print_text("\tla\t$fp,\t0($sp)")
-                    sp = c[1].split(",")
-                    offset = store_registers_on_function_call() - int(sp[1])
-                    BACKPATCH_OFFSET = offset
-                    offset -= int(sp[0])
-                    LOCAL_VAR_OFFSET = offset
-                    offset -= int(sp[0])
-                    print_text(f"\tla\t$sp,\t{offset}($sp)")
-                    BACKPATCH_INDEX = len(TEXT_SECTION)
-                    create_new_register_block()
-
-                elif c[0] == "RETURN":
-                    DYNAMIC_NESTING_LVL -= 1
-                    is_num, instr = is_number(c[1], True)
-                    is_ch, instr2 = is_char(c[1])
-                    if is_num:
-                        _type = type_of_number(c[1])
-                        reg = RETURN_REGISTERS[_type]
-                        print_text(instr(reg))
-                    elif is_ch:
-                        reg = RETURN_REGISTERS["char"]
-                        print_text(instr(reg))
-                    else:
-                        entry = current_symbol_table.lookup(c[1])
-                        if entry is None:
-                            raise NotImplementedError
-                        elif entry["type"].startswith("struct"):
-                            # custom type
-                            # type_details = current_symbol_table.lookup_type(_type)
-                            stack_pushables = _return_stack_custom_types(c[1], entry["type"], current_symbol_table)
-                            _o = -12
-                            for (var, s, _t) in stack_pushables:
-                                reg, offset = get_register(var, current_symbol_table, offset)
-                                save_instr = SAVE_INSTRUCTIONS[_t]
-                                print_text(f"\t{save_instr}\t{reg},\t{_o}($fp)")
-                                _o -= int(s)
-                        else:
-                            t, offset, entry = get_register(c[1], current_symbol_table, offset, True)
-                            _type = entry["type"]
-                            reg = RETURN_REGISTERS[_type]
-                            instr = MOVE_INSTRUCTIONS[_type]
-                            print_text(f"\t{instr}\t{reg},\t{t}")
-
-                    load_registers_on_function_return("sp")
-                    print_text("\tla\t$sp,\t0($fp)")
-                    print_text("\tlw\t$ra,\t-8($sp)")
-                    print_text("\tlw\t$fp,\t-4($sp)")
-                    print_text("\tjr\t$ra")
-
-                elif c[0] == "PUSHPARAM":
-                    if first_pushparam:
-                        first_pushparam = False
-                        offset = store_temp_regs_in_use(offset)
-                    # We should ideally be using the a0..a2 registers, but for ease of use we will
-                    # push everything into the stack
-                    is_num, instr1 = is_number(c[1], True)
-                    is_ch, instr2 = is_char(c[1])
-                    t, offset, entry = get_register(
-                        c[1], current_symbol_table, offset, True, no_flush=(is_num or is_ch)
-                    )
-                    if is_num:
-                        _type = type_of_number(c[1])
-                        print_text(instr1(t))
-                    elif is_ch:
-                        _type = "char"
-                        print_text(instr2(t))
+                    entry = current_symbol_table.lookup(args[0])
+                    if entry is None:
+                        raise NotImplementedError
+                    elif entry["type"].startswith("struct"):
+                        # custom type
+                        # type_details = current_symbol_table.lookup_type(_type)
+                        stack_pushables = _return_stack_custom_types(args[0], entry["type"], current_symbol_table)
+                        _o = -12
+                        for (var, s, _t) in stack_pushables:
+                            reg, offset = get_register(var, current_symbol_table, offset)
+                            save_instr = SAVE_INSTRUCTIONS[_t]
+                            print_text(f"\t{save_instr}\t{reg},\t{_o}($fp)")
+                            _o -= int(s)
                     else:
+                        t, offset, entry = get_register(args[0], current_symbol_table, offset, True)
                         _type = entry["type"]
-                    instr = SAVE_INSTRUCTIONS[_type] if not c[1] in var_to_mem else var_to_mem[c[1]]["si"]
-                    s = 4  # wont work for double
-                    all_pushparams.extend([f"\t{instr}\t{t},\t-{s}($sp)", f"\tla\t$sp,\t-{s}($sp)"])
-
-                elif c[0] == "POPPARAMS":
-                    first_pushparam = True
+                        reg = RETURN_REGISTERS[_type]
+                        move_instr = MOVE_INSTRUCTIONS[_type]
+                        print_text(f"\t{move_instr}\t{reg},\t{t}")
+
+                load_registers_on_function_return("sp")
+                print_text("\tla\t$sp,\t0($fp)")
+                print_text("\tlw\t$ra,\t-8($sp)")
+                print_text("\tlw\t$fp,\t-4($sp)")
+                print_text("\tjr\t$ra")
+
+            elif op is Op.PARAM:
+                if first_pushparam:
+                    first_pushparam = False
+                    offset = store_temp_regs_in_use(offset)
+                # We should ideally be using the a0..a2 registers, but for ease of use we will
+                # push everything into the stack
+                is_num, instr1 = is_number(args[0], True)
+                is_ch, instr2 = is_char(args[0])
+                t, offset, entry = get_register(
+                    args[0], current_symbol_table, offset, True, no_flush=(is_num or is_ch)
+                )
+                if is_num:
+                    _type = type_of_number(args[0])
+                    print_text(instr1(t))
+                elif is_ch:
+                    _type = "char"
+                    print_text(instr2(t))
+                else:
+                    _type = entry["type"]
+                save_instr = SAVE_INSTRUCTIONS[_type] if not args[0] in var_to_mem else var_to_mem[args[0]]["si"]
+                s = 4  # wont work for double
+                all_pushparams.extend([f"\t{save_instr}\t{t},\t-{s}($sp)", f"\tla\t$sp,\t-{s}($sp)"])
+
+            elif op is Op.POPPARAMS:
+                first_pushparam = True
+
+            elif op is Op.GOTO:
+                print_text(f"\tj\t{args[0]}")
+
+            elif op is Op.ASM:
+                asm_instr = "\t".join(instr.extra[0][1:-1].split(" "))
+                print_text("\t" + asm_instr)
+
+            elif op is Op.COPY and isinstance(dst, Memory) and dst.index is not None:  # arr[x] := y
+                t0, offset, entry = get_register(
+                    dst.base.text, current_symbol_table, offset, True, no_flush=True
+                )  # reg of arr
+                d_size = Type.of(entry["type"]).size
+                bits = d_size.bit_length() - 1
+
+                index = dst.index.text
+                is_num, instr1 = is_number(index, True)
+                t1, offset = get_register(index, current_symbol_table, offset, no_flush=is_num)  # reg of x
+                if is_num:
+                    print_text(instr1(t1))
+
+                is_num, instr1 = is_number(args[0], True)
+                t2, offset = get_register(args[0], current_symbol_table, offset, no_flush=is_num)  # reg of y
+                if is_num:
+                    print_text(instr1(t2))
+
+                req_fp, _type = requires_fp_register(args[0], current_symbol_table.lookup(args[0]))
+                load_instr = LOAD_INSTRUCTIONS[_type]
+                save_instr = SAVE_INSTRUCTIONS[_type]
+
+                tmp_reg, offset = get_register("1", current_symbol_table, offset, no_flush=True)
+                tmp_reg2, offset = get_register("1", current_symbol_table, offset, no_flush=True)
+
+                # array out of bounds check
+                # print_text(f"\tli\t{tmp_reg2},\t{entry['dimensions'][0]}")
+                # print_text(f"\tslt\t{tmp_reg},\t{t1},\t{tmp_reg2}")
+                # print_text(f"\tbeq\t{tmp_reg},\t$0,\t{err_label}")
+
+                print_text(f"\tsll\t{tmp_reg},\t{t1},\t{bits}")
+                print_text(f"\tadd\t{tmp_reg},\t{t0},\t{tmp_reg}")
+                print_text(f"\t{save_instr}\t{t2},\t0({tmp_reg})")
+                dump_value_to_mem(t0)
+
+            elif op is Op.COPY and isinstance(dst, Memory) and dst.field is None:  # *ptr = x
+                t0, offset, entry = get_register(
+                    dst.base.text, current_symbol_table, offset, True, no_flush=True
+                )  # reg of ptr
+
+                is_num, instr1 = is_number(args[0], True)
+                t2, offset = get_register(args[0], current_symbol_table, offset, no_flush=is_num)  # reg of x
+                if is_num:
+                    print_text(instr1(t2))
+
+                req_fp, _type = requires_fp_register(args[0], entry)
+                load_instr = LOAD_INSTRUCTIONS[_type]
+                save_instr = SAVE_INSTRUCTIONS[_type]
+
+                print_text(f"\t{save_instr}\t{t2},\t0({t0})")
+                dump_value_to_mem(t0)
+
+            elif op is Op.COPY and isinstance(dst, Memory):  # var -> field := x
+                var = dst.base.text
+                t0, offset, entry = get_register(var, current_symbol_table, offset, True, no_flush=True)
+                owner = current_symbol_table.type_owner(entry["type"])
+                layout = aggregate_layout(owner.lookup_type(entry["type"])).compute(owner)
+                field_offset = layout.offsets[dst.field][0]
+
+                ttemp, offset = get_register("1", current_symbol_table, offset, no_flush=True)
+                print_text(f"\taddi\t{ttemp},\t{t0},\t{field_offset}")
+
+                is_const, instr1 = is_number(args[0], True)
+                if not is_const:
+                    is_const, instr1 = is_char(args[0])
+                t1, offset = get_register(args[0], current_symbol_table, offset, no_flush=is_const)
+                if is_const:
+                    print_text(instr1(t1))
+
+                print_text(f"\t{var_to_mem[args[0]]['si']}\t{t1},\t({ttemp})")
+                dump_value_to_mem(t0)
+
+            elif op is Op.COPY and isinstance(instr.args[0], Memory) and instr.args[0].field is not None:
+                # x := var -> field
+                raise NotImplementedError
+
+            elif op is Op.COPY:
+                _, entry = convert_varname(dst.text, current_symbol_table)
+                _type = entry["type"]
+
+                if entry["pointer_lvl"] >= 1:
+                    t0, offset = get_register(dst.text, current_symbol_table, offset, no_flush=True)
+                    t1, offset = get_register(args[0], current_symbol_table, offset)
+                    print_text(f"\tmove\t{t0},\t{t1}")
+                    dump_value_to_mem(t0)
+                    continue
+
+                if _type.startswith("struct"):
+                    if global_scope:
+                        raise Exception("Only native datatypes can be directly assigned in global scope")
+                    # Struct
+                    all_fields_lhs = _return_stack_custom_types(dst.text, entry["type"], current_symbol_table)
+                    all_fields_rhs = _return_stack_custom_types(args[0], entry["type"], current_symbol_table)
+                    for ((l, _, t1), (r, _, t2)) in zip(all_fields_lhs, all_fields_rhs):
+                        assert t1 == t2, AssertionError(f"Something went wrong {t1} != {t2}")
+                        reg1, offset = get_register(l, current_symbol_table, offset, no_flush=True)
+                        reg2, offset = get_register(r, current_symbol_table, offset)
+                        move_instr = MOVE_INSTRUCTIONS[t1]
+                        # print_text(f"# {reg1} -> {l}, {reg2} -> {r}")
+                        print_text(f"\t{move_instr}\t{reg1},\t{reg2}")
+                        dump_value_to_mem(reg1)
+                else:
+                    is_num, instr1 = is_number(args[0], True)
+                    is_ch, instr2 = is_char(args[0])
 
-                elif c[0] == "GOTO":
-                    print_text(f"\tj\t{c[1]}")
+                    if is_num or is_ch:
+                        # Assignment with a constant
+                        instr1 = instr1 if is_num else instr2
+                        if global_scope:
+                            entry = current_symbol_table.lookup(dst.text)
+                            fp = requires_fp_register(entry["value"], entry)[0]
+                            print_data(f"{dst.text}: .{size_to_mips_standard(entry['size'], fp)} {entry['value']}")
+                        else:
+                            t1, offset, entry = get_register(
+                                dst.text, current_symbol_table, offset, True, no_flush=True
+                            )
+                            print_text(instr1(t1))
+                            dump_value_to_mem(t1)
+                    else:
+                        t1, offset, entry = get_register(dst.text, current_symbol_table, offset, True, no_flush=True)
+                        if entry["is_array"] == True:
+                            loc = var_to_mem[dst.text]["memory address"]
+                            print_text(f"\tla\t{t1},\t{loc}")
 
-                elif c[0] == "ASSEMBLY_DIRECTIVE":
-                    instr = "\t".join(c[1][1:-1].split(" "))
-                    print_text("\t" + instr)
+                        if global_scope:
+                            raise Exception("Non constant initialization in global scope")
 
-                else:
-                    print_text(c)
-
-            elif len(c) == 3:
-                if c[1] == ":=":
-                    # Assignment
-                    if c[0].endswith("]"):  # arr[x] := y
-                        t0, offset, entry = get_register(
-                            c[0].split("[")[0], current_symbol_table, offset, True, no_flush=True
-                        )  # reg of arr
-                        d_size = DATATYPE2SIZE[entry["type"].upper()]
-                        bits = int(np.log2(d_size))
-
-                        index = c[0].split("[")[1].split("]")[0]
-                        is_num, instr = is_number(index, True)
-                        t1, offset = get_register(index, current_symbol_table, offset, no_flush=is_num)  # reg of x
-                        if is_num:
-                            print_text(instr(t1))
-
-                        is_num, instr = is_number(c[2], True)
-                        t2, offset = get_register(c[2], current_symbol_table, offset, no_flush=is_num)  # reg of y
-                        if is_num:
-                            print_text(instr(t2))
-
-                        req_fp, _type = requires_fp_register(c[2], current_symbol_table.lookup(c[2]))
-                        load_instr = LOAD_INSTRUCTIONS[_type]
-                        save_instr = SAVE_INSTRUCTIONS[_type]
-
-                        tmp_reg, offset = get_register("1", current_symbol_table, offset, no_flush=True)
-                        tmp_reg2, offset = get_register("1", current_symbol_table, offset, no_flush=True)
-
-                        # array out of bounds check
-                        # print_text(f"\tli\t{tmp_reg2},\t{entry['dimensions'][0]}")
-                        # print_text(f"\tslt\t{tmp_reg},\t{t1},\t{tmp_reg2}")
-                        # print_text(f"\tbeq\t{tmp_reg},\t$0,\t{err_label}")
-
-                        print_text(f"\tsll\t{tmp_reg},\t{t1},\t{bits}")
-                        print_text(f"\tadd\t{tmp_reg},\t{t0},\t{tmp_reg}")
-                        print_text(f"\t{save_instr}\t{t2},\t0({tmp_reg})")
-                        dump_value_to_mem(t0)
-                        continue
-
-                    if c[0].startswith("*"):  # *ptr = x
-                        t0, offset, entry = get_register(
-                            c[0].split("*")[1], current_symbol_table, offset, True, no_flush=True
-                        )  # reg of ptr
-
-                        is_num, instr = is_number(c[2], True)
-                        t2, offset = get_register(c[2], current_symbol_table, offset, no_flush=is_num)  # reg of x
-                        if is_num:
-                            print_text(instr(t2))
-
-                        req_fp, _type = requires_fp_register(c[2], entry)
-                        load_instr = LOAD_INSTRUCTIONS[_type]
-                        save_instr = SAVE_INSTRUCTIONS[_type]
-
-                        print_text(f"\t{save_instr}\t{t2},\t0({t0})")
-                        dump_value_to_mem(t0)
-                        continue
-
-                    if "->" in c[0]:  # var -> field := x
-                        var, field = c[0].split(" -> ")
-                        t0, offset, entry = get_register(var, current_symbol_table, offset, True, no_flush=True)
-                        type_entry = current_symbol_table.lookup_type(entry["type"])
-                        idx = type_entry["field names"].index(field)
-                        offset = 0
-                        for z in range(idx):
-                            offset += compute_storage_size({"type": type_entry["field types"][z]}, None)
-
-                        ttemp, offset = get_register("1", current_symbol_table, offset, no_flush=True)
-                        print_text(f"\taddi\t{ttemp},\t{t0},\t{offset}")
-
-                        is_const, instr = is_number(c[2], True)
-                        if not is_const:
-                            is_const, instr = is_char(c[2])
-                        t1, offset = get_register(c[2], current_symbol_table, offset, no_flush=is_const)
-                        if is_const:
-                            print_text(instr(t1))
-
-                        print_text(f"\t{var_to_mem[c[2]]['si']}\t{t1},\t({ttemp})")
-                        dump_value_to_mem(t0)
-                        continue
-
-                    if "->" in c[2]:  # x := var -> field
-                        raise NotImplementedError
-                        continue
+                        if not args[0] == "NULL":
+                            t2, offset = get_register(args[0], current_symbol_table, offset)
+                            _type = entry["type"]
+                            move_instr = MOVE_INSTRUCTIONS[_type]
+                            print_text(f"\t{move_instr}\t{t1},\t{t2}")
+                            dump_value_to_mem(t1)
 
-                    _, entry = convert_varname(c[0], current_symbol_table)
+            elif op is Op.SCOPE_PUSH:
+                # Symbol Table
+                current_symbol_table = tabname_mapping[instr.extra[0]]
+                # var_to_mem = dict()
+                for store_name, entry in current_symbol_table._symtab_variables.items():
                     _type = entry["type"]
-
+                    _s = entry["size"]
+                    off = LOCAL_VAR_OFFSET - _s
                     if entry["pointer_lvl"] >= 1:
-                        t0, offset = get_register(c[0], current_symbol_table, offset, no_flush=True)
-                        t1, offset = get_register(c[2], current_symbol_table, offset)
-                        print_text(f"\tmove\t{t0},\t{t1}")
-                        dump_value_to_mem(t0)
-                        continue
-
-                    if _type.startswith("struct"):
-                        if global_scope:
-                            raise Exception("Only native datatypes can be directly assigned in global scope")
-                        # Struct
-                        all_fields_lhs = _return_stack_custom_types(c[0], entry["type"], current_symbol_table)
-                        all_fields_rhs = _return_stack_custom_types(c[2], entry["type"], current_symbol_table)
-                        for ((l, _, t1), (r, _, t2)) in zip(all_fields_lhs, all_fields_rhs):
-                            assert t1 == t2, AssertionError(f"Something went wrong {t1} != {t2}")
-                            reg1, offset = get_register(l, current_symbol_table, offset, no_flush=True)
-                            reg2, offset = get_register(r, current_symbol_table, offset)
-                            instr = MOVE_INSTRUCTIONS[t1]
-                            # print_text(f"# {reg1} -> {l}, {reg2} -> {r}")
-                            print_text(f"\t{instr}\t{reg1},\t{reg2}")
-                            dump_value_to_mem(reg1)
+                        _load_instr = "lw"
+                        _save_instr = "sw"
+                        load_func = lambda reg, loc, li: f"\t{li}\t{reg},\t{loc}"
+                        store_func = lambda reg, loc, si: f"\t{si}\t{reg},\t{loc}"
                     else:
-                        is_num, instr = is_number(c[2], True)
-                        is_ch, instr2 = is_char(c[2])
-
-                        if is_num or is_ch:
-                            # Assignment with a constant
-                            instr = instr if is_num else instr2
-                            if global_scope:
-                                entry = current_symbol_table.lookup(c[0])
-                                fp = requires_fp_register(entry["value"], entry)[0]
-                                print_data(f"{c[0]}: .{size_to_mips_standard(entry['size'], fp)} {entry['value']}")
-                            else:
-                                t1, offset, entry = get_register(
-                                    c[0], current_symbol_table, offset, True, no_flush=True
-                                )
-                                print_text(instr(t1))
-                                dump_value_to_mem(t1)
-                        else:
-                            t1, offset, entry = get_register(c[0], current_symbol_table, offset, True, no_flush=True)
-                            if entry["is_array"] == True:
-                                loc = var_to_mem[c[0]]["memory address"]
-                                print_text(f"\tla\t{t1},\t{loc}")
-
-                            if global_scope:
-                                raise Exception("Non constant initialization in global scope")
-
-                            if not c[2] == "NULL":
-                                t2, offset = get_register(c[2], current_symbol_table, offset)
-                                _type = entry["type"]
-                                instr = MOVE_INSTRUCTIONS[_type]
-                                print_text(f"\t{instr}\t{t1},\t{t2}")
-                                dump_value_to_mem(t1)
-
-                elif c[0] == "SYMTAB":
-                    # Symbol Table
-                    current_symbol_table = tabname_mapping[c[2]]
-                    # var_to_mem = dict()
-                    for store_name, entry in current_symbol_table._symtab_variables.items():
-                        _type = entry["type"]
-                        _s = entry["size"]
-                        off = LOCAL_VAR_OFFSET - _s
-                        if entry["pointer_lvl"] >= 1:
-                            _load_instr = "lw"
+                        if entry["is_array"]:
+                            _load_instr = "la"
                             _save_instr = "sw"
-                            load_func = lambda reg, loc, li: f"\t{li}\t{reg},\t{loc}"
-                            store_func = lambda reg, loc, si: f"\t{si}\t{reg},\t{loc}"
+                            store_func = lambda reg, loc, si: f""
                         else:
-                            if entry["is_array"]:
-                                _load_instr = "la"
+                            # Terrible hack
+                            _load_instr = LOAD_INSTRUCTIONS[_type] if _type in LOAD_INSTRUCTIONS else "lw"
+                            _save_instr = SAVE_INSTRUCTIONS[_type] if _type in SAVE_INSTRUCTIONS else "sw"
+                            store_func = lambda reg, loc, si: f"\t{si}\t{reg},\t{loc}"
+                        load_func = lambda reg, loc, li: f"\t{li}\t{reg},\t{loc}"
+                    var_to_mem[store_name] = {
+                        "wrt_register": "$fp",
+                        "offset": str(LOCAL_VAR_OFFSET),
+                        "size": _s,
+                        "type": _type,
+                        "memory address": f"{off}($fp)",
+                        "store function": store_func,
+                        "load function": load_func,
+                        "li": _load_instr,
+                        "si": _save_instr,
+                    }
+                    if _type.startswith("struct") and entry["pointer_lvl"] == 0:
+                        stack_pushables = _return_stack_custom_types(store_name, _type, current_symbol_table)
+                        for (var, s, _t) in stack_pushables:
+                            _off = LOCAL_VAR_OFFSET - int(s)
+                            offstring = f"{_off}($fp)"
+                            if entry["pointer_lvl"] >= 1:
+                                _load_instr = "lw"
                                 _save_instr = "sw"
-                                store_func = lambda reg, loc, si: f""
-                            else:
-                                # Terrible hack
-                                _load_instr = LOAD_INSTRUCTIONS[_type] if _type in LOAD_INSTRUCTIONS else "lw"
-                                _save_instr = SAVE_INSTRUCTIONS[_type] if _type in SAVE_INSTRUCTIONS else "sw"
+                                load_func = lambda reg, loc, li: f"\t{li}\t{reg},\t{loc}"
                                 store_func = lambda reg, loc, si: f"\t{si}\t{reg},\t{loc}"
-                            load_func = lambda reg, loc, li: f"\t{li}\t{reg},\t{loc}"
-                        var_to_mem[store_name] = {
-                            "wrt_register": "$fp",
-                            "offset": str(LOCAL_VAR_OFFSET),
-                            "size": _s,
-                            "type": _type,
-                            "memory address": f"{off}($fp)",
-                            "store function": store_func,
-                            "load function": load_func,
-                            "li": _load_instr,
-                            "si": _save_instr,
-                        }
-                        if _type.startswith("struct") and entry["pointer_lvl"] == 0:
-                            stack_pushables = _return_stack_custom_types(store_name, _type, current_symbol_table)
-                            for (var, s, _t) in stack_pushables:
-                                _off = LOCAL_VAR_OFFSET - int(s)
-                                offstring = f"{_off}($fp)"
-                                if entry["pointer_lvl"] >= 1:
-                                    _load_instr = "lw"
-                                    _save_instr = "sw"
-                                    load_func = lambda reg, loc, li: f"\t{li}\t{reg},\t{loc}"
-                                    store_func = lambda reg, loc, si: f"\t{si}\t{reg},\t{loc}"
+                            else:
+                                if entry["is_array"]:
+                                    _load_instr = "la"
                                 else:
-                                    if entry["is_array"]:
-                                        _load_instr = "la"
-                                    else:
-                                        # Terrible hack
-                                        _load_instr = LOAD_INSTRUCTIONS[_t] if _t in LOAD_INSTRUCTIONS else "lw"
-                                    _save_instr = SAVE_INSTRUCTIONS[_t] if _t in SAVE_INSTRUCTIONS else "sw"
-                                    load_func = lambda reg, loc, li: f"\t{li}\t{reg},\t{loc}"
-                                    store_func = lambda reg, loc, si: f"\t{si}\t{reg},\t{loc}"
-                                var_to_mem[var] = {
-                                    "wrt_register": "$fp",
-                                    "offset": str(_off),
-                                    "size": int(s),
-                                    "type": _t,
-                                    "memory address": offstring,
-                                    "store function": store_func,
-                                    "load function": load_func,
-                                    "li": _load_instr,
-                                    "si": _save_instr,
-                                }
-                                LOCAL_VAR_OFFSET -= int(s)
-                        else:
-                            LOCAL_VAR_OFFSET -= _s
-
-                    params = current_symbol_table._paramtab
-                    off = 0
-                    for p in params:
-                        entry = current_symbol_table.lookup(p)
-                        t, offset, entry = get_register(
-                            entry["name"], current_symbol_table, offset, True, no_flush=True, no_load=True
-                        )
-                        # if not entry["pointer_lvl"] >= 1:
-                        #     instr = LOAD_INSTRUCTIONS[entry["type"]]
-                        instr = var_to_mem[p]["li"]
-                        print_text(f"\t{instr}\t{t},\t{off}($fp)")
-                        dump_value_to_mem(t)
-                        # else:
-                        #     print_text(f"\taddi\t{t},\t$fp,\t{off}")
-                        #     print_text(f"\tlw\t{t},\t({t})")
-                        off += entry["size"]
+                                    # Terrible hack
+                                    _load_instr = LOAD_INSTRUCTIONS[_t] if _t in LOAD_INSTRUCTIONS else "lw"
+                                _save_instr = SAVE_INSTRUCTIONS[_t] if _t in SAVE_INSTRUCTIONS else "sw"
+                                load_func = lambda reg, loc, li: f"\t{li}\t{reg},\t{loc}"
+                                store_func = lambda reg, loc, si: f"\t{si}\t{reg},\t{loc}"
+                            var_to_mem[var] = {
+                                "wrt_register": "$fp",
+                                "offset": str(_off),
+                                "size": int(s),
+                                "type": _t,
+                                "memory address": offstring,
+                                "store function": store_func,
+                                "load function": load_func,
+                                "li": _load_instr,
+                                "si": _save_instr,
+                            }
+                            LOCAL_VAR_OFFSET -= int(s)
+                    else:
+                        LOCAL_VAR_OFFSET -= _s
+
+                params = current_symbol_table._paramtab
+                off = 0
+                for p in params:
+                    entry = current_symbol_table.lookup(p)
+                    t, offset, entry = get_register(
+                        entry["name"], current_symbol_table, offset, True, no_flush=True, no_load=True
+                    )
+                    # if not entry["pointer_lvl"] >= 1:
+                    #     instr = LOAD_INSTRUCTIONS[entry["type"]]
+                    load_instr = var_to_mem[p]["li"]
+                    print_text(f"\t{load_instr}\t{t},\t{off}($fp)")
+                    dump_value_to_mem(t)
+                    # else:
+                    #     print_text(f"\taddi\t{t},\t$fp,\t{off}")
+                    #     print_text(f"\tlw\t{t},\t({t})")
+                    off += entry["size"]
+
+            elif op is Op.CAST:
+                # typecast expression
+                datatype = instr.operator[1:-1]
+                if not datatype.endswith("*"):
+                    offset = type_cast_mips(dst.text, args[0], datatype, current_symbol_table, offset)
                 else:
-                    print_text(c)
-
-            elif len(c) == 4:
-                if c[1] == ":=":
-                    # typecast expression
-                    if c[2].startswith("("):
-                        datatype = c[2].replace("(", "").replace(")", "")
-                        if not datatype.endswith("*"):
-                            offset = type_cast_mips(c, datatype, current_symbol_table, offset)
+                    is_num, instr1 = is_number(args[0], True)
+                    is_ch, instr2 = is_char(args[0])
+
+                    if is_num or is_ch:
+                        # Assignment with a constant
+                        instr1 = instr1 if is_num else instr2
+                        if global_scope:
+                            entry = current_symbol_table.lookup(dst.text)
+                            fp = requires_fp_register(entry["value"], entry)[0]
+                            print_data(f"{dst.text}: .{size_to_mips_standard(entry['size'], fp)} {entry['value']}")
                         else:
-                            is_num, instr = is_number(c[3], True)
-                            is_ch, instr2 = is_char(c[3])
-
-                            if is_num or is_ch:
-                                # Assignment with a constant
-                                instr = instr if is_num else instr2
-                                if global_scope:
-                                    entry = current_symbol_table.lookup(c[0])
-                                    fp = requires_fp_register(entry["value"], entry)[0]
-                                    print_data(f"{c[0]}: .{size_to_mips_standard(entry['size'], fp)} {entry['value']}")
-                                else:
-                                    t1, offset, entry = get_register(
-                                        c[0], current_symbol_table, offset, True, no_flush=True
-                                    )
-                                    print_text(instr(t1))
-                                    dump_value_to_mem(t1)
-                            else:
-                                t1, offset, entry = get_register(
-                                    c[0], current_symbol_table, offset, True, no_flush=True
-                                )
-                                if entry["is_array"] == True:
-                                    loc = var_to_mem[c[0]]["memory address"]
-                                    print_text(f"\tla\t{t1},\t{loc}")
-
-                                if global_scope:
-                                    raise Exception("Non constant initialization in global scope")
-
-                                if not c[2] == "NULL":
-                                    t2, offset = get_register(c[3], current_symbol_table, offset)
-                                    _type = entry["type"]
-                                    instr = MOVE_INSTRUCTIONS[_type] if entry["pointer_lvl"] == 0 else "move"
-                                    print_text(f"\t{instr}\t{t1},\t{t2}")
-                                dump_value_to_mem(t1)
-
-                    elif c[2].startswith("&"):  # ref
-                        t1, offset, entry = get_register(c[0], current_symbol_table, offset, True, no_flush=True)
-                        req_fp, _type = requires_fp_register(c[0], entry)
-                        d_size = entry["size"]
-                        bits = int(np.log2(d_size))
-
-                        if c[3].endswith("]"):  # y = & arr [x]
-                            arr_name = c[3].split()[0]
-                            t2, offset, entry_arr = get_register(
-                                arr_name, current_symbol_table, offset, True, no_flush=True
+                            t1, offset, entry = get_register(
+                                dst.text, current_symbol_table, offset, True, no_flush=True
                             )
-
-                            index = c[3].split()[1].replace("[", "").replace("]", "")
-                            is_num, instr = is_number(index, True)
-                            t3, offset = get_register(index, current_symbol_table, offset, no_flush=is_num)
-                            if is_num:
-                                print_text(instr(t3))
-                            tmp_reg, offset = get_register("1", current_symbol_table, offset, no_flush=True)
-                            tmp_reg2, offset = get_register("1", current_symbol_table, offset, no_flush=True)
-
-                            # array out of bounds check
-                            # print_text(f"\tli\t{tmp_reg2},\t{entry_arr['dimensions'][0]}")
-                            # print_text(f"\tslt\t{tmp_reg},\t{t3},\t{tmp_reg2}")
-                            # print_text(f"\tbeq\t{tmp_reg},\t$0,\t{err_label}")
-
-                            print_text(f"\tsll\t{tmp_reg},\t{t3},\t{bits}")
-                            print_text(f"\tadd\t{t1},\t{t2},\t{tmp_reg}")
-                            # print_text(f"\tmove\t{t1},\t{tmp_reg}")
-                            dump_value_to_mem(t1)
-                        else:  # y = & var
-                            # TODO: directly use name if global variable
-                            t2, offset = get_register(c[3], current_symbol_table, offset, no_flush=True)
-                            addr = var_to_mem[c[3]]["memory address"]
-                            off = int(addr.split("(")[0])
-                            bp = addr.split("(")[1].split(")")[0]
-                            print_text(f"\taddi\t{t1},\t{bp},\t{off}")
+                            print_text(instr1(t1))
                             dump_value_to_mem(t1)
+                    else:
+                        t1, offset, entry = get_register(
+                            dst.text, current_symbol_table, offset, True, no_flush=True
+                        )
+                        if entry["is_array"] == True:
+                            loc = var_to_mem[dst.text]["memory address"]
+                            print_text(f"\tla\t{t1},\t{loc}")
 
-                    elif c[2].startswith("*"):  # deref
-                        t1, offset, entry = get_register(c[0], current_symbol_table, offset, True)
-                        req_fp, _type = requires_fp_register(c[0], entry)
-                        load_instr = LOAD_INSTRUCTIONS[_type]
-                        save_instr = SAVE_INSTRUCTIONS[_type]
-
-                        t2, offset = get_register(c[3], current_symbol_table, offset)
-                        print_text(f"\t{load_instr}\t{t1},\t0({t2})")
-                        dump_value_to_mem(t1)
-
-                    elif c[3].startswith("["):  # array indexing
-                        t0, offset, entry = get_register(c[0], current_symbol_table, offset, True, no_flush=True)
-                        req_fp, _type = requires_fp_register(c[0], entry)
-                        load_instr = LOAD_INSTRUCTIONS[_type]
-                        save_instr = SAVE_INSTRUCTIONS[_type]
-                        d_size = DATATYPE2SIZE[entry["type"].upper()]
-                        bits = int(np.log2(d_size))
-
-                        t1, offset, entry_arr = get_register(c[2], current_symbol_table, offset, True)
-
-                        ind = c[3].replace("[", "").replace("]", "")
-                        is_num, instr = is_number(ind, True)
-                        t2, offset = get_register(ind, current_symbol_table, offset, no_flush=is_num)
-                        if is_num:
-                            print_text(instr(t2))
-                        tmp_reg, offset = get_register("1", current_symbol_table, offset, no_flush=True)
-                        tmp_reg2, offset = get_register("1", current_symbol_table, offset, no_flush=True)
-
-                        # array out of bounds check
-                        # print_text(f"\tli\t{tmp_reg2},\t{entry_arr['dimensions'][0]}")
-                        # print_text(f"\tslt\t{tmp_reg},\t{t2},\t{tmp_reg2}")
-                        # print_text(f"\tbeq\t{tmp_reg},\t$0,\t{err_label}")
-
-                        print_text(f"\tsll\t{tmp_reg},\t{t2},\t{bits}")
-                        print_text(f"\tadd\t{tmp_reg},\t{t1},\t{tmp_reg}")
-                        print_text(f"\t{load_instr}\t{t0},\t({tmp_reg})")
-                        dump_value_to_mem(t0)
-
-                    elif c[2] == "-":
-                        t0, offset, entry = get_register(c[0], current_symbol_table, offset, True, no_flush=True)
-                        neg_instr = UNARY_OPS_TO_INSTR[entry["type"]][c[2]]
-                        is_const, instr = is_number(c[3], True)
-                        if not is_const:
-                            is_const, instr = is_char(c[3])
-                        t1, offset = get_register(c[3], current_symbol_table, offset)
-                        if is_const:
-                            print_text(instr(t1))
-                        print_text(f"\t{neg_instr}\t{t0},\t{t1}")
-                        dump_value_to_mem(t0)
-
-                    elif c[2] == "+":
-                        t0, offset, entry = get_register(c[0], current_symbol_table, offset, True, no_flush=True)
-                        pos_instr = MOVE_INSTRUCTIONS[entry["type"]]
-                        is_const, instr = is_number(c[3], True)
-                        if not is_const:
-                            is_const, instr = is_char(c[3])
-                        t1, offset = get_register(c[3], current_symbol_table, offset, no_flush=is_const)
-                        if is_const:
-                            print_text(instr(t1))
-                        print_text(f"\t{pos_instr}\t{t0},\t{t1}")
-                        dump_value_to_mem(t0)
+                        if global_scope:
+                            raise Exception("Non constant initialization in global scope")
 
-                else:
-                    print_text(c)
-
-            elif len(c) == 5:
-                if c[1] == ":=":
-                    if c[2] == "CALL":
-                        # Function Call
-                        DYNAMIC_NESTING_LVL += 1
-                        if first_pushparam:
-                            offset = store_temp_regs_in_use(offset)
-                        for params in all_pushparams:
-                            print_text(params)
-                        all_pushparams = []
-                        print_text(
-                            f"\tjal\t{c[3].replace('(', '__').replace(')', '__').replace(',', '_').replace('*', 'ptr').replace(' ', 'sp')}"
-                        )
-                        # caller pops the arguments
-                        entry = current_symbol_table.lookup(c[0])
+                        t2, offset = get_register(args[0], current_symbol_table, offset)
                         _type = entry["type"]
-
-                        reg = RETURN_REGISTERS.get(_type, None)
-                        if reg is None and _type != "void":
-                            stack_pushables = _return_stack_custom_types(c[0], _type, current_symbol_table)
-                            _o = -12
-                            for (var, s, _t) in stack_pushables:
-                                reg, offset = get_register(var, current_symbol_table, offset, no_flush=True)
-                                load_instr = LOAD_INSTRUCTIONS[_t]
-                                print_text(f"\t{load_instr}\t{reg},\t{_o}($sp)")
-                                _o -= int(s)
-                        elif _type != "void":
-                            t1, offset, entry = get_register(c[0], current_symbol_table, offset, True, no_flush=True)
-                            instr = MOVE_INSTRUCTIONS[_type]
-                            print_text(f"\t{instr}\t{t1},\t{reg}")
-                        print_text(f"\tla\t$sp,\t{c[4]}($sp)")
-                        first_pushparam = True
+                        move_instr = MOVE_INSTRUCTIONS[_type] if entry["pointer_lvl"] == 0 else "move"
+                        print_text(f"\t{move_instr}\t{t1},\t{t2}")
                         dump_value_to_mem(t1)
 
-                    elif c[3] == "->":
-                        raise NotImplementedError
+            elif op is Op.UNARY and instr.operator == "&":  # ref
+                t1, offset, entry = get_register(dst.text, current_symbol_table, offset, True, no_flush=True)
+                req_fp, _type = requires_fp_register(dst.text, entry)
+                d_size = entry["size"]
+                bits = d_size.bit_length() - 1
 
-                    else:
-                        # Assignment + An op
-                        op = c[3]
-                        t1, offset, entry3 = get_register(c[0], current_symbol_table, offset, True, no_flush=True)
-
-                        is_const, instr = is_number(c[2], True)
-                        if not is_const:
-                            is_const, instr = is_char(c[2])
-                        t2, offset, entry1 = get_register(c[2], current_symbol_table, offset, True, no_flush=is_const)
-                        if is_const:
-                            print_text(instr(t2))
-
-                        is_const, instr = is_number(c[4], True)
-                        if not is_const:
-                            is_const, instr = is_char(c[4])
-                        t3, offset, entry2 = get_register(c[4], current_symbol_table, offset, True, no_flush=is_const)
-                        if is_const:
-                            print_text(instr(t3))
-
-                        _type = (
-                            entry1["type"]
-                            if entry1 is not None
-                            else (entry2["type"] if entry2 is not None else entry3["type"])
-                        )
+                src = instr.args[0]
+                if isinstance(src, Memory) and src.index is not None:  # y = & arr [x]
+                    t2, offset, entry_arr = get_register(
+                        src.base.text, current_symbol_table, offset, True, no_flush=True
+                    )
 
-                        if op == "&&":
-                            instrs = []
-                            t4, offset, entry4 = get_register(
-                                "1", current_symbol_table, offset, True, no_flush=is_const
-                            )
-                            t5, offset, entry5 = get_register(
-                                "1", current_symbol_table, offset, True, no_flush=is_const
-                            )
-                            _type4 = entry4["type"] if entry4 is not None else (entry2["type"])
-                            _type5 = entry5["type"] if entry4 is not None else (entry3["type"])
-                            instrs.append(get_mips_instr_from_binary_op("!=", _type4, t2, "$0", t4)[0])
-                            instrs.append(get_mips_instr_from_binary_op("!=", _type5, t3, "$0", t5)[0])
-                            instrs.append(get_mips_instr_from_binary_op("&", _type, t4, t5, t1)[0])
-
-                        elif op == "||":
-                            instrs = []
-                            t4, offset, entry4 = get_register(
-                                "1", current_symbol_table, offset, True, no_flush=is_const
-                            )
-                            t5, offset, entry5 = get_register(
-                                "1", current_symbol_table, offset, True, no_flush=is_const
-                            )
-                            _type4 = entry4["type"] if entry4 is not None else (entry2["type"])
-                            _type5 = entry5["type"] if entry4 is not None else (entry3["type"])
-                            instrs.append(get_mips_instr_from_binary_op("!=", _type4, t2, "$0", t4)[0])
-                            instrs.append(get_mips_instr_from_binary_op("!=", _type5, t3, "$0", t5)[0])
-                            instrs.append(get_mips_instr_from_binary_op("|", _type, t4, t5, t1)[0])
+                    index = src.index.text
+                    is_num, instr1 = is_number(index, True)
+                    t3, offset = get_register(index, current_symbol_table, offset, no_flush=is_num)
+                    if is_num:
+                        print_text(instr1(t3))
+                    tmp_reg, offset = get_register("1", current_symbol_table, offset, no_flush=True)
+                    tmp_reg2, offset = get_register("1", current_symbol_table, offset, no_flush=True)
+
+                    # array out of bounds check
+                    # print_text(f"\tli\t{tmp_reg2},\t{entry_arr['dimensions'][0]}")
+                    # print_text(f"\tslt\t{tmp_reg},\t{t3},\t{tmp_reg2}")
+                    # print_text(f"\tbeq\t{tmp_reg},\t$0,\t{err_label}")
+
+                    print_text(f"\tsll\t{tmp_reg},\t{t3},\t{bits}")
+                    print_text(f"\tadd\t{t1},\t{t2},\t{tmp_reg}")
+                    # print_text(f"\tmove\t{t1},\t{tmp_reg}")
+                    dump_value_to_mem(t1)
+                else:  # y = & var
+                    # TODO: directly use name if global variable
+                    t2, offset = get_register(args[0], current_symbol_table, offset, no_flush=True)
+                    addr = var_to_mem[args[0]]["memory address"]
+                    off = int(addr.split("(")[0])
+                    bp = addr.split("(")[1].split(")")[0]
+                    print_text(f"\taddi\t{t1},\t{bp},\t{off}")
+                    dump_value_to_mem(t1)
+
+            elif op is Op.UNARY and instr.operator == "*":  # deref
+                t1, offset, entry = get_register(dst.text, current_symbol_table, offset, True)
+                req_fp, _type = requires_fp_register(dst.text, entry)
+                load_instr = LOAD_INSTRUCTIONS[_type]
+                save_instr = SAVE_INSTRUCTIONS[_type]
+
+                t2, offset = get_register(args[0], current_symbol_table, offset)
+                print_text(f"\t{load_instr}\t{t1},\t0({t2})")
+                dump_value_to_mem(t1)
+
+            elif op is Op.INDEX:  # array indexing
+                t0, offset, entry = get_register(dst.text, current_symbol_table, offset, True, no_flush=True)
+                req_fp, _type = requires_fp_register(dst.text, entry)
+                load_instr = LOAD_INSTRUCTIONS[_type]
+                save_instr = SAVE_INSTRUCTIONS[_type]
+                d_size = Type.of(entry["type"]).size
+                bits = d_size.bit_length() - 1
+
+                t1, offset, entry_arr = get_register(args[0], current_symbol_table, offset, True)
+
+                ind = args[1]
+                is_num, instr1 = is_number(ind, True)
+                t2, offset = get_register(ind, current_symbol_table, offset, no_flush=is_num)
+                if is_num:
+                    print_text(instr1(t2))
+                tmp_reg, offset = get_register("1", current_symbol_table, offset, no_flush=True)
+                tmp_reg2, offset = get_register("1", current_symbol_table, offset, no_flush=True)
+
+                # array out of bounds check
+                # print_text(f"\tli\t{tmp_reg2},\t{entry_arr['dimensions'][0]}")
+                # print_text(f"\tslt\t{tmp_reg},\t{t2},\t{tmp_reg2}")
+                # print_text(f"\tbeq\t{tmp_reg},\t$0,\t{err_label}")
+
+                print_text(f"\tsll\t{tmp_reg},\t{t2},\t{bits}")
+                print_text(f"\tadd\t{tmp_reg},\t{t1},\t{tmp_reg}")
+                print_text(f"\t{load_instr}\t{t0},\t({tmp_reg})")
+                dump_value_to_mem(t0)
+
+            elif op is Op.UNARY and instr.operator == "-":
+                t0, offset, entry = get_register(dst.text, current_symbol_table, offset, True, no_flush=True)
+                neg_instr = UNARY_OPS_TO_INSTR[entry["type"]][instr.operator]
+                is_const, instr1 = is_number(args[0], True)
+                if not is_const:
+                    is_const, instr1 = is_char(args[0])
+                t1, offset = get_register(args[0], current_symbol_table, offset)
+                if is_const:
+                    print_text(instr1(t1))
+                print_text(f"\t{neg_instr}\t{t0},\t{t1}")
+                dump_value_to_mem(t0)
+
+            elif op is Op.UNARY and instr.operator == "+":
+                t0, offset, entry = get_register(dst.text, current_symbol_table, offset, True, no_flush=True)
+                pos_instr = MOVE_INSTRUCTIONS[entry["type"]]
+                is_const, instr1 = is_number(args[0], True)
+                if not is_const:
+                    is_const, instr1 = is_char(args[0])
+                t1, offset = get_register(args[0], current_symbol_table, offset, no_flush=is_const)
+                if is_const:
+                    print_text(instr1(t1))
+                print_text(f"\t{pos_instr}\t{t0},\t{t1}")
+                dump_value_to_mem(t0)
+
+            elif op is Op.UNARY:
+                # ! and ~ are not supported yet
+                pass
+
+            elif op is Op.CALL:
+                # Function Call
+                DYNAMIC_NESTING_LVL += 1
+                if first_pushparam:
+                    offset = store_temp_regs_in_use(offset)
+                for params in all_pushparams:
+                    print_text(params)
+                all_pushparams = []
+                fname, nbytes = instr.extra
+                print_text(
+                    f"\tjal\t{fname.replace('(', '__').replace(')', '__').replace(',', '_').replace('*', 'ptr').replace(' ', 'sp')}"
+                )
+                # caller pops the arguments
+                entry = current_symbol_table.lookup(dst.text)
+                _type = entry["type"]
+
+                reg = RETURN_REGISTERS.get(_type, None)
+                if reg is None and _type != "void":
+                    stack_pushables = _return_stack_custom_types(dst.text, _type, current_symbol_table)
+                    _o = -12
+                    for (var, s, _t) in stack_pushables:
+                        reg, offset = get_register(var, current_symbol_table, offset, no_flush=True)
+                        load_instr = LOAD_INSTRUCTIONS[_t]
+                        print_text(f"\t{load_instr}\t{reg},\t{_o}($sp)")
+                        _o -= int(s)
+                elif _type != "void":
+                    t1, offset, entry = get_register(dst.text, current_symbol_table, offset, True, no_flush=True)
+                    move_instr = MOVE_INSTRUCTIONS[_type]
+                    print_text(f"\t{move_instr}\t{t1},\t{reg}")
+                print_text(f"\tla\t$sp,\t{nbytes}($sp)")
+                first_pushparam = True
+                dump_value_to_mem(t1)
+
+            elif op is Op.BINARY and instr.operator == "->":
+                raise NotImplementedError
+
+            elif op is Op.BINARY:
+                # Assignment + An op
+                operator = instr.operator
+                t1, offset, entry3 = get_register(dst.text, current_symbol_table, offset, True, no_flush=True)
+
+                is_const, instr1 = is_number(args[0], True)
+                if not is_const:
+                    is_const, instr1 = is_char(args[0])
+                t2, offset, entry1 = get_register(args[0], current_symbol_table, offset, True, no_flush=is_const)
+                if is_const:
+                    print_text(instr1(t2))
+
+                is_const, instr1 = is_number(args[1], True)
+                if not is_const:
+                    is_const, instr1 = is_char(args[1])
+                t3, offset, entry2 = get_register(args[1], current_symbol_table, offset, True, no_flush=is_const)
+                if is_const:
+                    print_text(instr1(t3))
+
+                _type = (
+                    entry1["type"]
+                    if entry1 is not None
+                    else (entry2["type"] if entry2 is not None else entry3["type"])
+                )
 
-                        else:
-                            instrs = get_mips_instr_from_binary_op(op, _type, t2, t3, t1)
+                if operator == "&&":
+                    instrs = []
+                    t4, offset, entry4 = get_register(
+                        "1", current_symbol_table, offset, True, no_flush=is_const
+                    )
+                    t5, offset, entry5 = get_register(
+                        "1", current_symbol_table, offset, True, no_flush=is_const
+                    )
+                    _type4 = entry4["type"] if entry4 is not None else (entry2["type"])
+                    _type5 = entry5["type"] if entry4 is not None else (entry3["type"])
+                    instrs.append(get_mips_instr_from_binary_op("!=", _type4, t2, "$0", t4)[0])
+                    instrs.append(get_mips_instr_from_binary_op("!=", _type5, t3, "$0", t5)[0])
+                    instrs.append(get_mips_instr_from_binary_op("&", _type, t4, t5, t1)[0])
+
+                elif operator == "||":
+                    instrs = []
+                    t4, offset, entry4 = get_register(
+                        "1", current_symbol_table, offset, True, no_flush=is_const
+                    )
+                    t5, offset, entry5 = get_register(
+                        "1", current_symbol_table, offset, True, no_flush=is_const
+                    )
+                    _type4 = entry4["type"] if entry4 is not None else (entry2["type"])
+                    _type5 = entry5["type"] if entry4 is not None else (entry3["type"])
+                    instrs.append(get_mips_instr_from_binary_op("!=", _type4, t2, "$0", t4)[0])
+                    instrs.append(get_mips_instr_from_binary_op("!=", _type5, t3, "$0", t5)[0])
+                    instrs.append(get_mips_instr_from_binary_op("|", _type, t4, t5, t1)[0])
 
-                        for instr in instrs:
-                            print_text(instr)
-                        dump_value_to_mem(t1)
+                else:
+                    instrs = get_mips_instr_from_binary_op(operator, _type, t2, t3, t1)
 
-            elif len(c) == 6:
-                if c[0] == "IF" and c[4] == "GOTO":  # If reg != 0 goto label
-                    op = c[2]
+                for mips_instr in instrs:
+                    print_text(mips_instr)
+                dump_value_to_mem(t1)
 
-                    is_const, instrs = is_number(c[1], True)
-                    _type = None
-                    if not is_const:
-                        is_const, instrs = is_char(c[1])
-                        if is_const:
-                            _type = "char"
-                    else:
-                        _type = type_of_number(c[1])
-                    t1, offset, entry = get_register(c[1], current_symbol_table, offset, True)
-                    if _type is None:
-                        _type = entry["type"]
-                    if is_const:
-                        print_text(instrs(t1))
+            elif op is Op.IF:  # If reg != 0 goto label
+                operator = instr.operator
 
-                    is_const, instrs = is_number(c[3], True)
-                    if not is_const:
-                        is_const, instrs = is_char(c[3])
-                    t2, offset = get_register(c[3], current_symbol_table, offset)
+                is_const, instrs = is_number(args[0], True)
+                _type = None
+                if not is_const:
+                    is_const, instrs = is_char(args[0])
                     if is_const:
-                        print_text(instrs(t2))
+                        _type = "char"
+                else:
+                    _type = type_of_number(args[0])
+                t1, offset, entry = get_register(args[0], current_symbol_table, offset, True)
+                if _type is None:
+                    _type = entry["type"]
+                if is_const:
+                    print_text(instrs(t1))
 
-                    instr = BINARY_OPS_TO_INSTR[_type][op]
-                    instr = "b" + instr[1:]
-                    print_text(f"\t{instr}\t{t1},\t{t2},\t{c[5]}")
+                is_const, instrs = is_number(args[1], True)
+                if not is_const:
+                    is_const, instrs = is_char(args[1])
+                t2, offset = get_register(args[1], current_symbol_table, offset)
+                if is_const:
+                    print_text(instrs(t2))
+
+                branch_instr = BINARY_OPS_TO_INSTR[_type][operator]
+                branch_instr = "b" + branch_instr[1:]
+                print_text(f"\t{branch_instr}\t{t1},\t{t2},\t{args[2]}")
 
             else:
-                print_text(c)
+                print_text(str(instr))
 
     if not no_dump:
         print_assembly()
 
 
 def _return_stack_custom_types(v, vtype, symtab):
-    entry_type = symtab.lookup_type(vtype)
-    var_name_sizes = []
-    for f, t in zip(entry_type["field names"], entry_type["field types"]):
-        d = get_default_value(t)
-        if d is not None:
-            s = DATATYPE2SIZE[t.upper()]
-            var_name_sizes += [[f"{v}.{f}", str(s), t]]
-        else:
-            var_name_sizes += _return_stack_custom_types(f"{v}.{f}", t, symtab)
-    return var_name_sizes
+    leaves = aggregate_layout(symtab.lookup_type(vtype)).leaves(symtab)
+    return [[v + suffix, s, t] for suffix, s, t in leaves]
 
 
 def print_assembly():
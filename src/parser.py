@@ -4,9 +4,12 @@ from typing import cast
 import lex
 import ply.yacc as yacc
 import argparse
-import copy
-from dot import parse_code
-from type_utils import get_type_fields, get_flookup_type
+from dot import draw_scope_tree, parse_code
+from type_utils import CONVERSIONS, Type, get_type_fields, get_flookup_type
+from preprocessor import preprocess, write_dependency_file
+from export import FORMATS
+from ir import CodeRope
+from table_cache import PARSETAB, get_table_cache_dir, load_table_module, table_writer
 from symtab import (
     BASIC_TYPES,
     INTEGER_TYPES,
@@ -21,6 +24,12 @@ from symtab import (
     get_global_symtab,
     get_stdlib_codes,
     compute_storage_size,
+    aggregate_layout,
+    array_strides,
+    export_symbol_tables,
+    TYPE_NAMES,
+    BUILTIN_OPERATORS,
+    OVERLOADS,
     NUMERIC_TYPES,
     CHARACTER_TYPES,
     DATATYPE2SIZE,
@@ -30,7 +39,6 @@ from symtab import (
     SYMBOL_TABLES,
     STATIC_VARIABLE_MAPS,
 )
-import numpy as np
 from mips import generate_mips_from_3ac
 
 flag_for_error = 0
@@ -38,43 +46,50 @@ flag_for_error = 0
 UNKNOWN_ERR = 0
 TYPE_CAST_ERR = 1
 
-GLOBAL_ERROR_LIST = []
 
-# Take two types and return the final dataype to cast to.
+class ErrorList(list):
+    # Errors appended by helpers that don't see the production get the position the lexer has
+    # read up to (the end of the lookahead), resolved only when an error is recorded. Set lexer
+    # to the lexer of the parse
+    lexer = None
+
+    def append(self, message: str) -> None:
+        if self.lexer is not None and not message.startswith("Error at "):
+            message = "Error at " + lex.format_location(self.lexer, self.lexer.lexpos) + ": " + message
+        super().append(message)
+
+
+GLOBAL_ERROR_LIST = ErrorList()
+
+
+def error_location(p, n: int) -> str:
+    # Position of the n-th symbol of the production being reduced
+    return "Error at " + lex.format_location(p.lexer, p.lexpos(n))
+
+
+# Take two types and return the final dataype (lower case) to cast to.
 def _type_cast(s1, s2):
     global flag_for_error
-    s1 = s1.upper()
-    s2 = s2.upper()
-    if s1 == s2:
-        return s1
-    if s1.count("*") != s2.count("*"):
-        err_msg = "Pointer level mismatch. Type Casting not supported"
-        GLOBAL_ERROR_LIST.append(err_msg)
-        raise SyntaxError
-        # raise Exception("Pointer level mismatch. Type Casting not supported")
-    if (s1 not in BASIC_TYPES) or (s2 not in BASIC_TYPES):
-        flag_for_error = TYPE_CAST_ERR
-        err_msg = "Type Cast not possible"
-        GLOBAL_ERROR_LIST.append(err_msg)
-        raise SyntaxError
-    elif s1 == "DOUBLE" or s2 == "DOUBLE":
-        return "DOUBLE"
-    elif s1 == "FLOAT" or s2 == "FLOAT":
-        return "FLOAT"
-    elif DATATYPE2SIZE[s1] > DATATYPE2SIZE[s2]:
-        return s1
-    elif DATATYPE2SIZE[s2] > DATATYPE2SIZE[s1]:
-        return s2
-    elif s1.startswith("UNSIGNED"):
-        return s1
-    elif s2.startswith("UNSIGNED"):
-        return s2
-    else:
+    t1, t2 = Type.of(s1), Type.of(s2)
+    if t1.type_id is not None and t2.type_id is not None:
+        result = CONVERSIONS[t1.type_id][t2.type_id]
+        if result is not None:
+            return result
         flag_for_error = UNKNOWN_ERR
         err_msg = "Type Cast not possible: UNKNOWN"
         GLOBAL_ERROR_LIST.append(err_msg)
         raise SyntaxError
-        # return "error"
+    if t1 is t2 or t1.upper == t2.upper:
+        return t1.upper.lower()
+    if t1.pointer_lvl != t2.pointer_lvl:
+        err_msg = "Pointer level mismatch. Type Casting not supported"
+        GLOBAL_ERROR_LIST.append(err_msg)
+        raise SyntaxError
+        # raise Exception("Pointer level mismatch. Type Casting not supported")
+    flag_for_error = TYPE_CAST_ERR
+    err_msg = "Type Cast not possible"
+    GLOBAL_ERROR_LIST.append(err_msg)
+    raise SyntaxError
 
 
 def type_cast(s1, s2):
@@ -85,7 +100,7 @@ def type_cast(s1, s2):
         GLOBAL_ERROR_LIST.append(err_msg)
         raise SyntaxError
     elif s1.get("pointer_lvl", 0) > 0:
-        if s2["type"].upper() in INTEGER_TYPES:
+        if Type.of(s2["type"]).is_integer:
             return s1
         else:
             err_msg = f"Can not cast {s2['type']} to pointer!"
@@ -93,7 +108,7 @@ def type_cast(s1, s2):
             raise SyntaxError
 
     elif s2.get("pointer_lvl", 0) > 0:
-        if s1["type"].upper() in INTEGER_TYPES:
+        if Type.of(s1["type"]).is_integer:
             return s2
         else:
             err_msg = f"Can not cast {s1['type']} to pointer!"
@@ -101,7 +116,7 @@ def type_cast(s1, s2):
             raise SyntaxError
     else:
         return {
-            "type": _type_cast(s1["type"], s2["type"]).lower(),
+            "type": _type_cast(s1["type"], s2["type"]),
             "pointer_lvl": 0,
         }
 
@@ -112,7 +127,7 @@ def type_cast2(s1, s2):
         if s2.get("pointer_lvl", 0) > 0:
             return s1
 
-        elif s2["type"].upper() in INTEGER_TYPES:
+        elif Type.of(s2["type"]).is_integer:
             return s1
 
         else:
@@ -121,7 +136,7 @@ def type_cast2(s1, s2):
             raise SyntaxError
 
     elif s2.get("pointer_lvl", 0) > 0:
-        if s1["type"].upper() in INTEGER_TYPES:
+        if Type.of(s1["type"]).is_integer:
             return s2
         else:
             err_msg = f"Can not cast {s1['type']} to pointer!"
@@ -129,7 +144,7 @@ def type_cast2(s1, s2):
             raise SyntaxError
     else:
         return {
-            "type": _type_cast(s1["type"], s2["type"]).lower(),
+            "type": _type_cast(s1["type"], s2["type"]),
             "pointer_lvl": 0,
         }
 
@@ -192,30 +207,16 @@ def _get_conversion_function_expr(p, tcast):
         return arg
 
 
-def resolve_function_name_uniform_types(fname, plist, totype=None):
-    symTab = get_current_symtab()
+def _resolve_overload(fname, plist, totype):
+    # Mangled name of the overload to call and the type every argument is converted to (None
+    # when the arguments are passed as is). Only depends on the types of plist and totype
     if len(plist) == 0:
-        entry = symTab.lookup(f"{fname}()")
-        if entry is None:
-            err_msg = f"{fname}() : No such function in symbol table"
-            GLOBAL_ERROR_LIST.append(err_msg)
-            raise SyntaxError
-            # raise Exception
-        return f"{fname}()", entry, plist
-
+        return f"{fname}()", None
     if len(plist) == 1:
-        par_type = get_flookup_type(plist[0])
-        entry = symTab.lookup(f"{fname}({par_type})")
-        if entry is None:
-            err_msg = f"{fname}({plist[0]['type']}) : No such function in symbol table"
-            GLOBAL_ERROR_LIST.append(err_msg)
-            raise SyntaxError
-            # raise Exception
-        return (
-            f"{fname}({par_type})",
-            entry,
-            [_get_conversion_function(plist[0], totype) if totype is not None else plist[0]],
-        )
+        return f"{fname}({get_flookup_type(plist[0])})", None if totype is None else {
+            "type": get_flookup_type(totype),
+            "pointer_lvl": 0,
+        }
     if totype is None:
         # t1, t2 = plist[0]["type"], plist[1]["type"]
         tcast = type_cast(plist[0], plist[1])
@@ -223,16 +224,35 @@ def resolve_function_name_uniform_types(fname, plist, totype=None):
             tcast = type_cast(t, tcast)
     else:
         tcast = totype
+    tcast = get_flookup_type(tcast)
+    return f"{fname}(" + ",".join([tcast] * len(plist)) + ")", {"type": tcast, "pointer_lvl": 0}
+
+
+def resolve_function_name_uniform_types(fname, plist, totype=None):
+    key = (
+        fname,
+        tuple((p["type"], p.get("pointer_lvl", 0), get_flookup_type(p)) for p in plist),
+        None if totype is None else get_flookup_type(totype),
+    )
+    plan = OVERLOADS.get_plan(key)
+    if plan is None:
+        plan = _resolve_overload(fname, plist, totype)
+        OVERLOADS.set_plan(key, plan)
+    funcname, tcast = plan
 
-    funcname = f"{fname}(" + ",".join([get_flookup_type(tcast)] * len(plist)) + ")"
-    entry = get_current_symtab().lookup(funcname)
+    entry = OVERLOADS.lookup(funcname)
     if entry is None:
-        err_msg = f"{funcname} function is not declared!"
+        if len(plist) == 0:
+            err_msg = f"{fname}() : No such function in symbol table"
+        elif len(plist) == 1:
+            err_msg = f"{fname}({plist[0]['type']}) : No such function in symbol table"
+        else:
+            err_msg = f"{funcname} function is not declared!"
         GLOBAL_ERROR_LIST.append(err_msg)
         raise SyntaxError
-        # raise Exception(f"{funcname} function is not declared!!")
+        # raise Exception
 
-    args = [_get_conversion_function(p, tcast) for p in plist]
+    args = plist if tcast is None else [_get_conversion_function(p, tcast) for p in plist]
 
     return funcname, entry, args
 
@@ -366,7 +386,7 @@ def p_identifier(p):
         entry = symTab.lookup(p[1] + ".static." + LAST_FUNCTION_DECLARATION)
         val = p[1] + ".static." + LAST_FUNCTION_DECLARATION
         if entry is None:
-            err_msg = "Error at line number " + str(p.lineno(1)) + ": Undeclared identifier used"
+            err_msg = error_location(p, 1) + ": Undeclared identifier used"
             GLOBAL_ERROR_LIST.append(err_msg)
             raise SyntaxError
     if entry["kind"] == 1:
@@ -424,7 +444,7 @@ def p_postfix_expression(p):
         # check for pointer arguments
         if p[1].get("pointer_lvl", 0) > 0:
             # obtain offset
-            offset = DATATYPE2SIZE[p[1]["type"].upper()]
+            offset = Type.of(p[1]["type"]).size
             arg_type = "long"
 
         else:
@@ -432,10 +452,10 @@ def p_postfix_expression(p):
             arg_type = p[1]["type"]
 
         funcname = p[2] + f"({arg_type})"
-        entry = symTab.lookup(funcname)
+        entry = OVERLOADS.lookup(funcname, symTab)
         if entry is None:
             # Uncessary for this case
-            err_msg = "Error at line number " + str(p.lineno(2)) + ": No entry found in symbol table"
+            err_msg = error_location(p, 2) + ": No entry found in symbol table"
             GLOBAL_ERROR_LIST.append(err_msg)
             raise SyntaxError
             # raise Exception
@@ -466,21 +486,19 @@ def p_postfix_expression(p):
 
             entry = symTab.lookup(struct_identifier)
             if entry is None:
-                err_msg = "Error at line number " + str(p.lineno(1)) + ": Undeclared identifier used"
+                err_msg = error_location(p, 1) + ": Undeclared identifier used"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
                 # raise Exception  # undeclared identifier
 
             _type = entry["type"]
             for d in fields_hierarchy[:-1]:
-                _entry = symTab.lookup_type(_type)
-                _type = _entry["field types"][_entry["field names"].index(d)]
+                _type = aggregate_layout(symTab.lookup_type(_type)).field_types[d]
 
             struct_entry = symTab.lookup_type(_type)  # not needed if already checked at time of storing
             if struct_entry is None:
                 err_msg = (
-                    "Error at line number "
-                    + str(p.lineno(1))
+                    error_location(p, 1)
                     + ": Undeclared Struct/Union used or using . after a non indexable type"
                 )
                 GLOBAL_ERROR_LIST.append(err_msg)
@@ -490,20 +508,21 @@ def p_postfix_expression(p):
                 # check if p[1] is a struct
                 # print(p[1],p[3])
                 if struct_entry["kind"] in [2, 5]:
-                    if p[3] not in struct_entry["field names"]:
-                        err_msg = "Error at line number " + str(p.lineno(3)) + ": No such field exists"
+                    field_types = aggregate_layout(struct_entry).field_types
+                    if p[3] not in field_types:
+                        err_msg = error_location(p, 3) + ": No such field exists"
                         GLOBAL_ERROR_LIST.append(err_msg)
                         raise SyntaxError
                         # raise Exception  # wrong field name
                     else:
                         p[0] = {
-                            "type": struct_entry["field types"][struct_entry["field names"].index(p[3])],
+                            "type": field_types[p[3]],
                             "value": p[1]["value"] + "." + p[3],
                             "code": [],
                         }
                         # print(p[0])
                 else:
-                    err_msg = "Error at line number " + str(p.lineno(1)) + ": No such Struct/Union definition"
+                    err_msg = error_location(p, 1) + ": No such Struct/Union definition"
                     GLOBAL_ERROR_LIST.append(err_msg)
                     raise SyntaxError
                     # raise Exception  # no struct defn found
@@ -513,19 +532,19 @@ def p_postfix_expression(p):
             symTab = get_current_symtab()
             entry = symTab.lookup(p[1]["value"])
             if entry is None:
-                err_msg = "Error at line number " + str(p.lineno(1)) + ": Undeclared identifier used"
+                err_msg = error_location(p, 1) + ": Undeclared identifier used"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
 
             if entry.get("pointer_lvl", 0) == 0:
-                err_msg = "Error at line number " + str(p.lineno(1)) + "Cannot de-reference non-pointer"
+                err_msg = error_location(p, 1) + "Cannot de-reference non-pointer"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
 
             # TODO
             struct_entry = symTab.lookup_type(entry["type"])
             if struct_entry is None:
-                err_msg = "Error at line number " + str(p.lineno(1)) + ": Undeclared Struct/Union used"
+                err_msg = error_location(p, 1) + ": Undeclared Struct/Union used"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
                 # raise Exception  # undeclared struct used
@@ -533,13 +552,14 @@ def p_postfix_expression(p):
                 # check if p[1] is a struct
                 # print(p[1],p[3])
                 if struct_entry["kind"] in [2, 5]:
-                    if p[3] not in struct_entry["field names"]:
-                        err_msg = "Error at line number " + str(p.lineno(3)) + ": No such field exists"
+                    field_types = aggregate_layout(struct_entry).field_types
+                    if p[3] not in field_types:
+                        err_msg = error_location(p, 3) + ": No such field exists"
                         GLOBAL_ERROR_LIST.append(err_msg)
                         raise SyntaxError
                         # raise Exception  # wrong field name
                     else:
-                        _type = struct_entry["field types"][struct_entry["field names"].index(p[3])]
+                        _type = field_types[p[3]]
                         # tvar = get_tmp_var(_type)
                         p[0] = {
                             "type": _type,
@@ -548,7 +568,7 @@ def p_postfix_expression(p):
                         }
                         # print(p[0])
                 else:
-                    err_msg = "Error at line number " + str(p.lineno(1)) + ": No such Struct/Union definition"
+                    err_msg = error_location(p, 1) + ": No such Struct/Union definition"
                     GLOBAL_ERROR_LIST.append(err_msg)
                     raise SyntaxError
                     # raise Exception  # no struct defn found
@@ -557,9 +577,9 @@ def p_postfix_expression(p):
             # function call
             symTab = get_current_symtab()
             funcname = p[1]["value"] + "()"
-            entry = symTab.lookup(funcname)
+            entry = OVERLOADS.lookup(funcname, symTab)
             if entry is None:
-                err_msg = "Error at line number " + str(p.lineno(1)) + ": No such function in symbol table"
+                err_msg = error_location(p, 1) + ": No such function in symbol table"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
                 # raise Exception
@@ -589,9 +609,9 @@ def p_postfix_expression(p):
             symTab = get_current_symtab()
             # print(f"function call {p[3]}")
             funcname = p[1]["value"] + "(" + ",".join(p[3]["type"]) + ")"
-            entry = symTab.lookup(funcname)
+            entry = OVERLOADS.lookup(funcname, symTab)
             if entry is None:
-                err_msg = "Error at line number " + str(p.lineno(1)) + ": No such function in symbol table"
+                err_msg = error_location(p, 1) + ": No such function in symbol table"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
                 # raise Exception  # no function
@@ -620,8 +640,7 @@ def p_postfix_expression(p):
         elif p[2] == "[":
             if p[3]["type"] == "int":
                 symTab = get_current_symtab()
-                temp_dict = copy.deepcopy(p[1])
-                temp_dict["is_array"] = False
+                temp_dict = {**p[1], "is_array": False}
                 funcname = "__get_array_element" + f"({get_flookup_type(temp_dict)}*,int)"
                 # nvar = get_tmp_var(get_flookup_type(temp_dict))
                 nvar = get_tmp_var(temp_dict["type"])
@@ -661,22 +680,39 @@ def p_postfix_expression(p):
                     c_d = p[0]["code"][:-1]
                     c_l = p[0]["code"][-1]
                     ventry = symTab.lookup(c_l[2])
-                    act_dims = [int(z) for z in (ventry["dimensions"] if "dimensions" in ventry else ['0'])]
-                    cact_dims = np.clip(np.cumsum(act_dims[::-1])[::-1] - act_dims, a_min=1, a_max=999999)
+                    strides = ventry.get("strides", None)
+                    if strides is None:
+                        strides = array_strides(ventry["dimensions"] if "dimensions" in ventry else ["0"])
                     idxs = c_l[3].replace("[", " ").replace("]", " ").split()
+                    # Flat element index as a single multiply-add chain into one temporary,
+                    # ((i * d1 + j) * d2 + k), with the constant indices folded into one addend
                     ttvar1 = get_tmp_var("int")
-                    if len(idxs) > 1:
-                        ttvar2 = get_tmp_var("int")
-                        c_d.append([ttvar1, ":=", idxs[0], "*", str(cact_dims[0])])
-                    else:
-                        c_d.append([ttvar1, ":=", idxs[0]])
-                    for _i in range(1, len(idxs)):
-                        _v = str(cact_dims[_i])
-                        if _i == len(idxs) - 1:
-                            c_d.append([ttvar2, ":=", idxs[_i]])
+                    # scale is the product of the dimensions not yet multiplied into ttvar1
+                    const_idx, scale, started = 0, 1, False
+                    for _i, idx in enumerate(idxs):
+                        if _i > 0:
+                            prev = strides[_i - 1] if _i - 1 < len(strides) else 1
+                            dim = prev // (1 if _i == len(idxs) - 1 else strides[_i])
+                            const_idx *= dim
+                            scale *= dim
+                        if idx.isdigit():
+                            const_idx += int(idx)
+                            continue
+                        if not started:
+                            c_d.append([ttvar1, ":=", idx])
+                            started = True
                         else:
-                            c_d.append([ttvar2, ":=", idxs[_i], "*", _v])
-                        c_d.append([ttvar1, ":=", ttvar1, "+", ttvar2])
+                            if scale != 1:
+                                c_d.append([ttvar1, ":=", ttvar1, "*", str(scale)])
+                            c_d.append([ttvar1, ":=", ttvar1, "+", idx])
+                        scale = 1
+                    if not started:
+                        c_d.append([ttvar1, ":=", str(const_idx)])
+                    else:
+                        if scale != 1:
+                            c_d.append([ttvar1, ":=", ttvar1, "*", str(scale)])
+                        if const_idx != 0:
+                            c_d.append([ttvar1, ":=", ttvar1, "+", str(const_idx)])
                     # c_d.append([c_l[0], ":=", c_l[2], f"[{ttvar1}]"])
                     c_d.append(
                         [
@@ -691,7 +727,7 @@ def p_postfix_expression(p):
 
                 del temp_dict
             else:
-                err_msg = "Error at line number " + str(p.lineno(3)) + ": Not an integer index"
+                err_msg = error_location(p, 3) + ": Not an integer index"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
                 # raise Exception
@@ -715,9 +751,10 @@ def p_argument_expression_list(p):
         p[0]["type"] += p[1]["type"]
         p[0]["value"] += p[1]["value"]
     # print(f"arg_expr_list {p[1]}")
-    out_dict = copy.deepcopy(p[ind])
+    out_dict = p[ind]
     if p[ind].get("is_array", False):
-        out_dict["dimensions"][0] = "variable"
+        # The dimensions are shared with the symbol table entry, don't modify them in place
+        out_dict = {**p[ind], "dimensions": ["variable"] + p[ind]["dimensions"][1:]}
     p[0]["code"] += out_dict["code"]
     p[0]["type"].append(get_flookup_type(out_dict))
     p[0]["value"].append(out_dict["value"])
@@ -741,7 +778,7 @@ def p_unary_expression(p):
             # check for pointer arguments
             if p[2].get("pointer_lvl", 0) > 0:
                 # obtain offset
-                offset = DATATYPE2SIZE[p[2]["type"].upper()]
+                offset = Type.of(p[2]["type"]).size
                 arg_type = "long"
 
             else:
@@ -749,10 +786,10 @@ def p_unary_expression(p):
                 arg_type = p[2]["type"]
 
             funcname = p[1] + f"({arg_type})"
-            entry = symTab.lookup(funcname)
+            entry = OVERLOADS.lookup(funcname, symTab)
 
             if entry is None:
-                err_msg = "Error at line number " + str(p.lineno(1)) + ": No such function in symbol table"
+                err_msg = error_location(p, 1) + ": No such function in symbol table"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
                 # raise Exception
@@ -788,7 +825,8 @@ def p_unary_expression(p):
             p[0]["code"] = p[2]["code"]
 
         elif p[1].startswith("*"):
-            p[0] = copy.deepcopy(p[2])
+            # Attribute records are never modified in place, a shallow copy can share everything else
+            p[0] = dict(p[2])
             # p[0]["deref"] = p[0].get("deref", 0) + len(p[1])
             if p[2].get("pointer_lvl", 0) > 0:
                 nvar = get_tmp_var(get_flookup_type(p[2]))
@@ -819,7 +857,7 @@ def p_unary_expression(p):
             # TODO: handle cases when len(p[1]["code"] > 1
             # assert len(p[2]["code"]) <= 1, AssertionError(f"Fix this case-> {p[2]['code']}, len: {len(p[2]['code'])}")
 
-            tmp_code = copy.deepcopy(p[2]["code"])
+            tmp_code = p[2]["code"]
 
             if len(p[2]["code"]) > 1:
                 f_call_ind = len(p[2]["code"]) - 1
@@ -831,11 +869,10 @@ def p_unary_expression(p):
                 rep = p[2]["code"][f_call_ind][3][0]["value"] + " [" + p[2]["code"][f_call_ind][3][1]["value"] + "]"
                 p[2]["value"] = rep
 
-            p[0] = copy.deepcopy(p[2])
-            p[0]["code"] = tmp_code
+            p[0] = dict(p[2])
             p[0]["pointer_lvl"] = p[0].get("pointer_lvl", 0) + 1
             nvar = get_tmp_var(get_flookup_type(p[0]))
-            p[0]["code"] += [
+            p[0]["code"] = tmp_code + [
                 [
                     "FUNCTION CALL",
                     get_flookup_type(p[2]),
@@ -859,10 +896,10 @@ def p_unary_expression(p):
             symTab = get_current_symtab()
             arg = p[2]["type"]
             funcname = p[1] + f"({arg})"
-            entry = symTab.lookup(funcname)
+            entry = OVERLOADS.lookup(funcname, symTab)
 
             if entry is None:
-                err_msg = "Error at line number " + str(p.lineno(1)) + ": No such function in symbol table"
+                err_msg = error_location(p, 1) + ": No such function in symbol table"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
                 # raise Exception
@@ -919,305 +956,45 @@ def p_cast_expression(p):
         # p[0] = ("cast_expression",) + tuple(p[-len(p) + 1 :])
 
 
-def p_multiplicative_expression(p):
-    """multiplicative_expression : cast_expression
-    | multiplicative_expression MULTIPLY cast_expression
-    | multiplicative_expression DIVIDE cast_expression
-    | multiplicative_expression MOD cast_expression"""
-    if len(p) == 2:
-        p[0] = p[1]
-    else:
-        fname, entry, args = resolve_function_name_uniform_types(p[2], [p[1], p[3]])
-
-        p[0] = {
-            "value": fname,
-            "type": entry["return type"],
-            "arguments": args,
-            "kind": "FUNCTION CALL",
-        }
-        nvar = get_tmp_var(p[0]["type"])
-        codes = []
-        for _a in args:
-            if len(_a["code"]) == 0:
-                continue
-            codes += _a["code"]
-            _a["code"] = []
-        # p[0]["code"] = codes + [[p[0]["kind"], p[0]["type"], p[0]["value"], p[0]["arguments"], nvar]]
-        p[0]["code"] = codes + [
-            [
-                nvar,
-                ":=",
-                p[0]["arguments"][0]["value"],
-                p[2],
-                p[0]["arguments"][1]["value"],
-            ]
-        ]
-        p[0]["value"] = nvar
-        del p[0]["arguments"]
-        # p[0] = ("multiplicative_expression",) + tuple(p[-len(p) + 1 :])
-
-
-def p_additive_expression(p):
-    """additive_expression : multiplicative_expression
-    | additive_expression PLUS multiplicative_expression
-    | additive_expression MINUS multiplicative_expression"""
-    if len(p) == 2:
-        p[0] = p[1]
-    else:
-        fname, entry, args = resolve_function_name_uniform_types(p[2], [p[1], p[3]])
-
-        p[0] = {
-            "value": fname,
-            "type": entry["return type"],
-            "arguments": args,
-            "kind": "FUNCTION CALL",
-        }
-        nvar = get_tmp_var(p[0]["type"])
-        codes = []
-        for _a in args:
-            if len(_a["code"]) == 0:
-                continue
-            codes += _a["code"]
-            _a["code"] = []
-        # p[0]["code"] = codes + [[p[0]["kind"], p[0]["type"], p[0]["value"], p[0]["arguments"], nvar]]
-        p[0]["code"] = codes + [
-            [
-                nvar,
-                ":=",
-                p[0]["arguments"][0]["value"],
-                p[2],
-                p[0]["arguments"][1]["value"],
-            ]
-        ]
-        p[0]["value"] = nvar
-        del p[0]["arguments"]
-        # p[0] = ("additive_expression",) + tuple(p[-len(p) + 1 :])
-
-
-def p_shift_expression(p):
-    """shift_expression : additive_expression
-    | shift_expression LEFT_OP additive_expression
-    | shift_expression RIGHT_OP additive_expression"""
-    if len(p) == 2:
-        p[0] = p[1]
-    else:
-        fname, entry, args = resolve_function_name_uniform_types(p[2], [p[1], p[3]])
-
-        p[0] = {
-            "value": fname,
-            "type": entry["return type"],
-            "arguments": args,
-            "kind": "FUNCTION CALL",
-        }
-        nvar = get_tmp_var(p[0]["type"])
-        codes = []
-        for _a in args:
-            if len(_a["code"]) == 0:
-                continue
-            codes += _a["code"]
-            _a["code"] = []
-        # p[0]["code"] = codes + [[p[0]["kind"], p[0]["type"], p[0]["value"], p[0]["arguments"], nvar]]
-        p[0]["code"] = codes + [
-            [
-                nvar,
-                ":=",
-                p[0]["arguments"][0]["value"],
-                p[2],
-                p[0]["arguments"][1]["value"],
-            ]
-        ]
-        p[0]["value"] = nvar
-        del p[0]["arguments"]
-        # p[0] = ("shift_expression",) + tuple(p[-len(p) + 1 :])
-
-
-def p_relational_expression(p):
-    """relational_expression : shift_expression
-    | relational_expression LESS shift_expression
-    | relational_expression GREATER shift_expression
-    | relational_expression LE_OP shift_expression
-    | relational_expression GE_OP shift_expression"""
-    if len(p) == 2:
-        p[0] = p[1]
-    else:
-        fname, entry, args = resolve_function_name_uniform_types(p[2], [p[1], p[3]])
-
-        p[0] = {
-            "value": fname,
-            "type": entry["return type"],
-            "arguments": args,
-            "kind": "FUNCTION CALL",
-        }
-        nvar = get_tmp_var(p[0]["type"])
-        codes = []
-        for _a in args:
-            if len(_a["code"]) == 0:
-                continue
-            codes += _a["code"]
-            _a["code"] = []
-        # p[0]["code"] = codes + [[p[0]["kind"], p[0]["type"], p[0]["value"], p[0]["arguments"], nvar]]
-        p[0]["code"] = codes + [
-            [
-                nvar,
-                ":=",
-                p[0]["arguments"][0]["value"],
-                p[2],
-                p[0]["arguments"][1]["value"],
-            ]
-        ]
-        p[0]["value"] = nvar
-        del p[0]["arguments"]
-        # p[0] = ("relational_expression",) + tuple(p[-len(p) + 1 :])
-
-
-def p_equality_expression(p):
-    """equality_expression : relational_expression
-    | equality_expression EQ_OP relational_expression
-    | equality_expression NE_OP relational_expression"""
-    if len(p) == 2:
-        p[0] = p[1]
-    else:
-        fname, entry, args = resolve_function_name_uniform_types(p[2], [p[1], p[3]])
-
-        p[0] = {
-            "value": fname,
-            "type": entry["return type"],
-            "arguments": args,
-            "kind": "FUNCTION CALL",
-        }
-        nvar = get_tmp_var(p[0]["type"])
-        codes = []
-        for _a in args:
-            if len(_a["code"]) == 0:
-                continue
-            codes += _a["code"]
-            _a["code"] = []
-        # p[0]["code"] = codes + [[p[0]["kind"], p[0]["type"], p[0]["value"], p[0]["arguments"], nvar]]
-        p[0]["code"] = codes + [
-            [
-                nvar,
-                ":=",
-                p[0]["arguments"][0]["value"],
-                p[2],
-                p[0]["arguments"][1]["value"],
-            ]
-        ]
-        p[0]["value"] = nvar
-        del p[0]["arguments"]
-        # p[0] = ("equality_expression",) + tuple(p[-len(p) + 1 :])
-
-
-def p_and_expression(p):
-    """and_expression : equality_expression
-    | and_expression LOGICAL_AND equality_expression"""
-    if len(p) == 2:
-        p[0] = p[1]
-    else:
-        fname, entry, args = resolve_function_name_uniform_types(p[2], [p[1], p[3]])
-
-        p[0] = {
-            "value": fname,
-            "type": entry["return type"],
-            "arguments": args,
-            "kind": "FUNCTION CALL",
-        }
-        nvar = get_tmp_var(p[0]["type"])
-        codes = []
-        for _a in args:
-            if len(_a["code"]) == 0:
-                continue
-            codes += _a["code"]
-            _a["code"] = []
-        # p[0]["code"] = codes + [[p[0]["kind"], p[0]["type"], p[0]["value"], p[0]["arguments"], nvar]]
-        p[0]["code"] = codes + [
-            [
-                nvar,
-                ":=",
-                p[0]["arguments"][0]["value"],
-                p[2],
-                p[0]["arguments"][1]["value"],
-            ]
-        ]
-        p[0]["value"] = nvar
-        del p[0]["arguments"]
-        # p[0] = ("and_expression",) + tuple(p[-len(p) + 1 :])
-
-
-def p_exclusive_or_expression(p):
-    """exclusive_or_expression : and_expression
-    | exclusive_or_expression EXPONENT and_expression"""
-    if len(p) == 2:
-        p[0] = p[1]
-    else:
-        fname, entry, args = resolve_function_name_uniform_types(p[2], [p[1], p[3]])
-
-        p[0] = {
-            "value": fname,
-            "type": entry["return type"],
-            "arguments": args,
-            "kind": "FUNCTION CALL",
-        }
-        nvar = get_tmp_var(p[0]["type"])
-        codes = []
-        for _a in args:
-            if len(_a["code"]) == 0:
-                continue
-            codes += _a["code"]
-            _a["code"] = []
-        p[0]["code"] = codes + [
-            [
-                p[0]["kind"],
-                p[0]["type"],
-                p[0]["value"],
-                p[0]["arguments"],
-                nvar,
-            ]
-        ]
-        # p[0]["code"] = codes + [[nvar, ":=", p[0]["arguments"][0]["value"], p[2], p[0]["arguments"][1]["value"]]]
-        p[0]["value"] = nvar
-        del p[0]["arguments"]
-        # p[0] = ("exclusive_or_expression",) + tuple(p[-len(p) + 1 :])
-
-
-def p_inclusive_or_expression(p):
-    """inclusive_or_expression : exclusive_or_expression
-    | inclusive_or_expression LOGICAL_OR exclusive_or_expression"""
-    if len(p) == 2:
-        p[0] = p[1]
-    else:
-        fname, entry, args = resolve_function_name_uniform_types(p[2], [p[1], p[3]])
-
-        p[0] = {
-            "value": fname,
-            "type": entry["return type"],
-            "arguments": args,
-            "kind": "FUNCTION CALL",
-        }
-        nvar = get_tmp_var(p[0]["type"])
-        codes = []
-        for _a in args:
-            if len(_a["code"]) == 0:
-                continue
-            codes += _a["code"]
-            _a["code"] = []
-        p[0]["code"] = codes + [
-            [
-                p[0]["kind"],
-                p[0]["type"],
-                p[0]["value"],
-                p[0]["arguments"],
-                nvar,
-            ]
-        ]
-        # p[0]["code"] = codes + [[nvar, ":=", p[0]["arguments"][0]["value"], p[2], p[0]["arguments"][1]["value"]]]
-        p[0]["value"] = nvar
-        del p[0]["arguments"]
-        # p[0] = ("inclusive_or_expression",) + tuple(p[-len(p) + 1 :])
-
+# Binary operators from the lowest to the highest precedence. LOGICAL_AND / LOGICAL_OR are the
+# bitwise & / | tokens, AND_OP / OR_OP are && / ||
+precedence = (
+    ("left", "OR_OP"),
+    ("left", "AND_OP"),
+    ("left", "LOGICAL_OR"),
+    ("left", "EXPONENT"),
+    ("left", "LOGICAL_AND"),
+    ("left", "EQ_OP", "NE_OP"),
+    ("left", "LESS", "GREATER", "LE_OP", "GE_OP"),
+    ("left", "LEFT_OP", "RIGHT_OP"),
+    ("left", "PLUS", "MINUS"),
+    ("left", "MULTIPLY", "DIVIDE", "MOD"),
+)
 
-def p_logical_and_expression(p):
-    """logical_and_expression : inclusive_or_expression
-    | logical_and_expression AND_OP inclusive_or_expression"""
+# Operators lowered to a function call instead of a three address instruction
+FUNCTION_CALL_BINARY_OPERATORS = ("^", "|")
+
+
+def p_binary_expression(p):
+    """binary_expression : cast_expression
+    | binary_expression MULTIPLY binary_expression
+    | binary_expression DIVIDE binary_expression
+    | binary_expression MOD binary_expression
+    | binary_expression PLUS binary_expression
+    | binary_expression MINUS binary_expression
+    | binary_expression LEFT_OP binary_expression
+    | binary_expression RIGHT_OP binary_expression
+    | binary_expression LESS binary_expression
+    | binary_expression GREATER binary_expression
+    | binary_expression LE_OP binary_expression
+    | binary_expression GE_OP binary_expression
+    | binary_expression EQ_OP binary_expression
+    | binary_expression NE_OP binary_expression
+    | binary_expression LOGICAL_AND binary_expression
+    | binary_expression EXPONENT binary_expression
+    | binary_expression LOGICAL_OR binary_expression
+    | binary_expression AND_OP binary_expression
+    | binary_expression OR_OP binary_expression"""
     if len(p) == 2:
         p[0] = p[1]
     else:
@@ -1236,60 +1013,33 @@ def p_logical_and_expression(p):
                 continue
             codes += _a["code"]
             _a["code"] = []
-        # p[0]["code"] = codes + [[p[0]["kind"], p[0]["type"], p[0]["value"], p[0]["arguments"], nvar]]
-        p[0]["code"] = codes + [
-            [
-                nvar,
-                ":=",
-                p[0]["arguments"][0]["value"],
-                p[2],
-                p[0]["arguments"][1]["value"],
+        if p[2] in FUNCTION_CALL_BINARY_OPERATORS:
+            p[0]["code"] = codes + [
+                [
+                    p[0]["kind"],
+                    p[0]["type"],
+                    p[0]["value"],
+                    p[0]["arguments"],
+                    nvar,
+                ]
             ]
-        ]
-        p[0]["value"] = nvar
-        del p[0]["arguments"]
-        # p[0] = ("logical_and_expression",) + tuple(p[-len(p) + 1 :])
-
-
-def p_logical_or_expression(p):
-    """logical_or_expression : logical_and_expression
-    | logical_or_expression OR_OP logical_and_expression"""
-    if len(p) == 2:
-        p[0] = p[1]
-    else:
-        fname, entry, args = resolve_function_name_uniform_types(p[2], [p[1], p[3]])
-
-        p[0] = {
-            "value": fname,
-            "type": entry["return type"],
-            "arguments": args,
-            "kind": "FUNCTION CALL",
-        }
-        nvar = get_tmp_var(p[0]["type"])
-        codes = []
-        for _a in args:
-            if len(_a["code"]) == 0:
-                continue
-            codes += _a["code"]
-            _a["code"] = []
-        # p[0]["code"] = codes + [[p[0]["kind"], p[0]["type"], p[0]["value"], p[0]["arguments"], nvar]]
-        p[0]["code"] = codes + [
-            [
-                nvar,
-                ":=",
-                p[0]["arguments"][0]["value"],
-                p[2],
-                p[0]["arguments"][1]["value"],
+        else:
+            p[0]["code"] = codes + [
+                [
+                    nvar,
+                    ":=",
+                    p[0]["arguments"][0]["value"],
+                    p[2],
+                    p[0]["arguments"][1]["value"],
+                ]
             ]
-        ]
         p[0]["value"] = nvar
         del p[0]["arguments"]
-        # p[0] = ("logical_or_expression",) + tuple(p[-len(p) + 1 :])
 
 
 def p_conditional_expression(p):
-    """conditional_expression : logical_or_expression
-    | logical_or_expression QUESTION expression COLON conditional_expression"""
+    """conditional_expression : binary_expression
+    | binary_expression QUESTION expression COLON conditional_expression"""
     if len(p) == 2:
         p[0] = p[1]
     else:
@@ -1488,10 +1238,17 @@ def p_declaration(p):
     p[0] = {"code": [], "value": ""}
     # print(p[1], len(p), p[2], p.lineno(1))
     if len(p) == 3:
-        pass
+        if p[1]["value"].startswith("typedef"):
+            # The declared name was lexed as a TYPE_NAME, i.e. it is already a visible typedef
+            err_msg = error_location(p, 1) + ": Typedef redeclares an existing type name"
+            GLOBAL_ERROR_LIST.append(err_msg)
+            raise SyntaxError
         # p[0] = ("declaration",) + tuple(p[-len(p) + 1 :])
     else:
         tinfo = p[1]["value"]
+        if tinfo.startswith("typedef"):
+            _typedef_declaration(p, tinfo[8:])
+            return
         is_static = False
         if tinfo.startswith("static"):
             tinfo = tinfo[7:]
@@ -1556,12 +1313,12 @@ def p_declaration(p):
                     # print(_p)
                     struct_entry = symTab.lookup_type(p[1]["value"])
                     if struct_entry is None:
-                        err_msg = "Error at line number " + str(p.lineno(1)) + ": Undeclared struct used"
+                        err_msg = error_location(p, 1) + ": Undeclared struct used"
                         GLOBAL_ERROR_LIST.append(err_msg)
                         raise SyntaxError
                         # raise Exception  # undeclared struct used
                     if len(struct_entry["field names"]) != len(_p["store"]["value"]):
-                        err_msg = "Error at line number " + str(p.lineno(1)) + ": Improper Initialization of struct"
+                        err_msg = error_location(p, 1) + ": Improper Initialization of struct"
                         GLOBAL_ERROR_LIST.append(err_msg)
                         raise SyntaxError
                     # raise Exception  # Imroper Initialization of Struct
@@ -1654,7 +1411,7 @@ def p_declaration(p):
 
             else:
                 if tinfo == "void":
-                    err_msg = "Error at line number " + str(p.lineno(2)) + ": Incomplete type is not allowed"
+                    err_msg = error_location(p, 2) + ": Incomplete type is not allowed"
                     GLOBAL_ERROR_LIST.append(err_msg)
                     raise SyntaxError
                     # raise Exception("Incomplete type is not allowed")
@@ -1673,14 +1430,43 @@ def p_declaration(p):
             if not valid:
                 # print(f"Error at {_p}")
                 err_msg = (
-                    "Error at line number "
-                    + str(p.lineno(2))
+                    error_location(p, 2)
                     + ": "
                     + f"Variable {_p['value']} already declared with type {entry['type']}"
                 )
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
                 # raise Exception(f"Variable {_p['value']} already declared with type {entry['type']}")
+            if not TYPE_NAMES.hide(_p["value"]):
+                err_msg = error_location(p, 2) + ": " + f"Variable {_p['value']} redeclares a typedef in the same scope"
+                GLOBAL_ERROR_LIST.append(err_msg)
+                raise SyntaxError
+
+
+def _typedef_declaration(p, tinfo):
+    for _p in p[2]:
+        if "store" in _p:
+            err_msg = error_location(p, 2) + ": " + f"Typedef {_p['value']} cannot be initialized"
+            GLOBAL_ERROR_LIST.append(err_msg)
+            raise SyntaxError
+        if _p.get("is_array", False) or _p.get("pointer_lvl", 0) > 0:
+            err_msg = (
+                error_location(p, 2) + ": " + f"Pointer / Array typedef {_p['value']} not supported"
+            )
+            GLOBAL_ERROR_LIST.append(err_msg)
+            raise SyntaxError
+        if not TYPE_NAMES.define(_p["value"], tinfo):
+            previous = TYPE_NAMES.resolve(_p["value"])
+            if previous is None:
+                err_msg = error_location(p, 2) + ": " + f"Typedef {_p['value']} redeclares a variable in the same scope"
+            else:
+                err_msg = (
+                    error_location(p, 2)
+                    + ": "
+                    + f"Typedef {_p['value']} redefined with type {tinfo}, previously {previous}"
+                )
+            GLOBAL_ERROR_LIST.append(err_msg)
+            raise SyntaxError
 
 
 def p_declaration_specifiers(p):
@@ -1765,7 +1551,7 @@ def p_type_specifier(p):
     # Check if it is a valid type
     symTab = get_current_symtab()
     if not symTab.check_type(p[1]):
-        err_msg = "Error at line number " + str(p.lineno(1)) + ": " + f"{p[1]} is not a valid type"
+        err_msg = error_location(p, 1) + ": " + f"{p[1]} is not a valid type"
         GLOBAL_ERROR_LIST.append(err_msg)
         raise SyntaxError
         # raise Exception(f"{p[1]} is not a valid type")
@@ -1775,8 +1561,7 @@ def p_type_specifier(p):
 def p_type_specifier_custom_types(p):
     """type_specifier : struct_or_union_specifier
     | class_definition
-    | enum_specifier
-    | TYPE_NAME"""
+    | enum_specifier"""
     # print(p[1])
     symTab = get_current_symtab()
     if p[1]["kind"] == 2:
@@ -1794,7 +1579,7 @@ def p_type_specifier_custom_types(p):
         else:
             if not symTab.check_type("struct " + p[1]["name"]):
                 err_msg = (
-                    "Error at line number " + str(p.lineno(1)) + ": " + f"struct {p[1]['name']} is not a valid type"
+                    error_location(p, 1) + ": " + f"struct {p[1]['name']} is not a valid type"
                 )
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
@@ -1816,7 +1601,7 @@ def p_type_specifier_custom_types(p):
         else:
             if not symTab.check_type("union " + p[1]["name"]):
                 err_msg = (
-                    "Error at line number " + str(p.lineno(1)) + ": " + f"union {p[1]['name']} is not a valid type"
+                    error_location(p, 1) + ": " + f"union {p[1]['name']} is not a valid type"
                 )
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
@@ -1835,18 +1620,23 @@ def p_type_specifier_custom_types(p):
             )
         else:
             if not symTab.check_type(p[1]["value"]):
-                err_msg = "Error at line number " + str(p.lineno(1)) + ": " + f"{p[1]['value']} is not a valid type"
+                err_msg = error_location(p, 1) + ": " + f"{p[1]['value']} is not a valid type"
                 GLOBAL_ERROR_LIST.append(err_msg)
                 raise SyntaxError
                 # raise Exception(f"{p[1]['value']} is not a valid type")
         p[0] = {"value": p[1]["value"], "code": []}
     else:
-        err_msg = "Error at line number " + str(p.lineno(1)) + ": Unsupported Custom Type"
+        err_msg = error_location(p, 1) + ": Unsupported Custom Type"
         GLOBAL_ERROR_LIST.append(err_msg)
         raise SyntaxError
         # raise Exception("Unsupported Custom Type")
 
 
+def p_type_specifier_type_name(p):
+    """type_specifier : TYPE_NAME"""
+    p[0] = {"value": TYPE_NAMES.resolve(p[1]), "code": []}
+
+
 def p_inheritance_specifier(p):
     """inheritance_specifier : access_specifier IDENTIFIER"""
     p[0] = ("inheritance_specifier",) + tuple(p[-len(p) + 1 :])
@@ -1938,7 +1728,7 @@ def p_struct_or_union_specifier(p):
         symTab = get_current_symtab()
         struct_union_entry = symTab.lookup_type(p[1] + " " + p[2])
         if struct_union_entry is None:
-            err_msg = "Error at line number " + str(p.lineno(1)) + ": Undeclared Struct Used"
+            err_msg = error_location(p, 1) + ": Undeclared Struct Used"
             GLOBAL_ERROR_LIST.append(err_msg)
             raise SyntaxError
             # raise Exception  # undeclared struct used
@@ -2308,12 +2098,12 @@ def p_labeled_statement(p):
     symTab = get_current_symtab()
     if len(p) == 4:
         if p[1] == "default":
-            p[0] = {"code": [["DEFAULT"]] + p[3]["code"]}
+            p[0] = {"code": CodeRope([["DEFAULT"]], p[3]["code"])}
         else:
             valid, entry = symTab.insert({"name": p[1]}, kind=6)
-            p[0] = {"code": [[p[1] + ":"]] + p[3]["code"]}
+            p[0] = {"code": CodeRope([[p[1] + ":"]], p[3]["code"])}
     else:
-        p[0] = {"code": p[2]["code"] + [["CASE", p[2]["value"]]] + p[4]["code"]}
+        p[0] = {"code": CodeRope(p[2]["code"], [["CASE", p[2]["value"]]], p[4]["code"])}
     # p[0] = ("labeled_statement",) + tuple(p[-len(p) + 1 :])
 
 
@@ -2322,21 +2112,28 @@ def p_compound_statement_1(p):
     | lbrace statement_list rbrace
     | lbrace declaration_list statement_list rbrace"""
     if len(p) == 3:
-        p[0] = {"code": []}
+        body, code = {}, []
     elif len(p) == 4:
-        p[0] = p[2]
+        body, code = p[2], p[2]["code"]
     else:
-        p[0] = p[3]
-        if len(p[2]["code"]) > 0:
-            p[0]["code"] = p[2]["code"] + p[3]["code"]
-    p[0]["code"] = [["SYMTAB", "PUSH", p[len(p) - 1]["popped_table"].table_name]] + p[0]["code"] + [["SYMTAB", "POP"]]
+        body, code = p[3], CodeRope(p[2]["code"], p[3]["code"])
+    p[0] = {
+        **body,
+        "code": CodeRope(
+            [["SYMTAB", "PUSH", p[len(p) - 1]["popped_table"].table_name]], code, [["SYMTAB", "POP"]]
+        ),
+    }
 
 
 def p_compound_statement_2(p):
     """compound_statement : lbrace declaration_list rbrace"""
     # p[0] = ("compound_statement",) + tuple(p[-len(p) + 1 :])
-    p[0] = p[2]
-    p[0]["code"] = [["SYMTAB", "PUSH", p[len(p) - 1]["popped_table"].table_name]] + p[0]["code"] + [["SYMTAB", "POP"]]
+    p[0] = {
+        **p[2],
+        "code": CodeRope(
+            [["SYMTAB", "PUSH", p[len(p) - 1]["popped_table"].table_name]], p[2]["code"], [["SYMTAB", "POP"]]
+        ),
+    }
 
 
 def p_compound_statement_3(p):
@@ -2348,10 +2145,10 @@ def p_declaration_list(p):
     """declaration_list : declaration
     | declaration_list declaration"""
     if len(p) == 2:
-        p[0] = p[1]
+        p[0] = {**p[1], "code": CodeRope(p[1]["code"])}
     else:
-        p[0] = p[2]
-        p[0]["code"] = p[1]["code"] + p[2]["code"]
+        # The rope of p[1] is only referenced from the list being extended
+        p[0] = {**p[2], "code": p[1]["code"].append(p[2]["code"])}
     # p[0] = ("declaration_list",) + tuple(p[-len(p) + 1 :])
 
 
@@ -2359,11 +2156,10 @@ def p_statement_list(p):
     """statement_list : statement
     | statement_list statement"""
     if len(p) == 2:
-        p[0] = p[1]
-        p[0]["kind"] = "STATEMENT"
+        p[0] = {**p[1], "kind": "STATEMENT", "code": CodeRope(p[1]["code"])}
     else:
-        p[0] = p[2]
-        p[0]["code"] = p[1]["code"] + p[2]["code"]
+        # The rope of p[1] is only referenced from the list being extended
+        p[0] = {**p[2], "code": p[1]["code"].append(p[2]["code"])}
     # p[0] = ("statement_list",) + tuple(p[-len(p) + 1 :])
 
 
@@ -2381,7 +2177,7 @@ def p_selection_statement(p):
     | IF LEFT_BRACKET expression RIGHT_BRACKET statement ELSE statement
     | SWITCH LEFT_BRACKET expression RIGHT_BRACKET statement"""
     if p[1] == "if":
-        p[0] = {"code": []}
+        p[0] = {"code": CodeRope()}
         elseLabel = get_tmp_label()
         if p[3]["value"] is not None:
             expr = _get_conversion_function_expr(p[3], {"type": "int", "pointer_lvl": 0})
@@ -2406,14 +2202,13 @@ def p_selection_statement(p):
         # p[0] = ("selection_statement",) + tuple(p[-len(p) + 1 :])
         if p[3]["type"] not in INTEGER_TYPES:
             err_msg = (
-                "Error at line number "
-                + str(p.lineno(1))
+                error_location(p, 1)
                 + ": "
                 + f"Switch Expression must have integral type. Current Type: {p[3]['type']}"
             )
             GLOBAL_ERROR_LIST.append(err_msg)
             raise SyntaxError
-        p[0] = {"code": p[3]["code"] + [["BEGINSWITCH", p[3]["value"]]] + p[5]["code"] + [["ENDSWITCH"]]}
+        p[0] = {"code": CodeRope(p[3]["code"], [["BEGINSWITCH", p[3]["value"]]], p[5]["code"], [["ENDSWITCH"]])}
 
 
 def p_iteration_statement(p):
@@ -2423,7 +2218,7 @@ def p_iteration_statement(p):
     | FOR LEFT_BRACKET expression_statement expression_statement expression RIGHT_BRACKET statement"""
     beginLabel = get_tmp_label()
     endLabel = get_tmp_label()
-    code = [["LOOPBEGIN", beginLabel, endLabel]]
+    code = CodeRope([["LOOPBEGIN", beginLabel, endLabel]])
     if p[1] == "while":
         code += [[beginLabel + ":"]]
         if p[3]["value"] != "":
@@ -2480,7 +2275,7 @@ def p_jump_statement(p):
     symTab = get_current_symtab()
     if p[1] == "goto":
         if symTab.lookup(p[2]["value"]) is None:
-            err_msg = "Error at line number " + str(p.lineno(2)) + ": Label not present"
+            err_msg = error_location(p, 2) + ": Label not present"
             GLOBAL_ERROR_LIST.append(err_msg)
             raise SyntaxError
             # raise Exception("Label not present")
@@ -2535,7 +2330,7 @@ def p_function_definition_full(p):
         kind=1,
     )
     if not valid:
-        err_msg = "Error at line number " + str(p.lineno(2)) + f": Failed to create function named {p[2]['value']}"
+        err_msg = error_location(p, 2) + f": Failed to create function named {p[2]['value']}"
         GLOBAL_ERROR_LIST.append(err_msg)
         raise SyntaxError
         # raise Exception(f"Failed to create function named {p[2]['value']}")
@@ -2553,8 +2348,8 @@ def p_function_definition(p):
     global LAST_FUNCTION_DECLARATION
     symTab = get_current_symtab()
     if len(p) == 3:
-        p[0] = p[1]
-        p[0]["code"] += p[2]["code"] + [["ENDFUNCTION"]]
+        # The only place the statement ropes get flattened
+        p[0] = {**p[1], "code": CodeRope(p[1]["code"], p[2]["code"], [["ENDFUNCTION"]]).flatten()}
 
         no_return = True
         ignorecheck = False
@@ -2566,7 +2361,7 @@ def p_function_definition(p):
                 ignorecheck = False
             elif len(code) > 0 and code[0] == "RETURN" and not ignorecheck:
                 if len(code) == 1 and p[1]["value"] != "void":
-                    err_msg = "Error at line number " + str(p.lineno(1)) + ": Return type not matching declared type"
+                    err_msg = error_location(p, 1) + ": Return type not matching declared type"
                     GLOBAL_ERROR_LIST.append(err_msg)
                     raise SyntaxError
                     # raise Exception("Return type not matching declared type")
@@ -2575,13 +2370,13 @@ def p_function_definition(p):
                     and p[1]["value"] != code[1]["type"]
                     and not (p[1]["value"] == "int" and code[1]["type"].startswith("enum"))
                 ):
-                    err_msg = "Error at line number " + str(p.lineno(1)) + ": Return type not matching declared type"
+                    err_msg = error_location(p, 1) + ": Return type not matching declared type"
                     GLOBAL_ERROR_LIST.append(err_msg)
                     raise SyntaxError
                     # raise Exception("Return type not matching declared type")
                 no_return = False
         if no_return and p[1]["value"] != "void":
-            err_msg = "Error at line number " + str(p.lineno(1)) + ": Return type not matching declared type"
+            err_msg = error_location(p, 1) + ": Return type not matching declared type"
             GLOBAL_ERROR_LIST.append(err_msg)
             raise SyntaxError
             # raise Exception("Return type not matching declared type")
@@ -2611,6 +2406,7 @@ def p_lbrace(p):
             entry["is_parameter"] = True
             # print(entry)
             symTab.insert(entry, param=True)
+            TYPE_NAMES.hide(param[1])
         INITIALIZE_PARAMETERS_IN_NEW_SCOPE = None
     # p[0] = ("lbrace",) + tuple(p[-len(p) + 1 :])
 
@@ -2628,177 +2424,49 @@ def p_error(p):
     global flag_for_error
     # flag_for_error = 1
     if p is not None:
-        print("error at line no:  %s :: %s" % ((p.lineno), (p.value)))
+        print("error at %s :: %s" % (lex.format_location(p.lexer, p.lexpos), p.value))
         parser.errok()
     else:
         print("Unexpected end of input")
 
 
-parser = yacc.yacc()
+def build_parser():
+    module = sys.modules[__name__]
+    cache_dir = get_table_cache_dir(lex.__file__, __file__)
+    if cache_dir is None:
+        return yacc.yacc(module=module, debug=False, write_tables=False)
+    parsetab = load_table_module(cache_dir, PARSETAB)
+    if parsetab is not None:
+        # The cache directory is keyed by the grammar, skip the signature check
+        return yacc.yacc(module=module, tabmodule=parsetab, optimize=True)
+    with table_writer(cache_dir) as outputdir:
+        if outputdir is None:
+            return yacc.yacc(module=module, debug=False, write_tables=False)
+        return yacc.yacc(module=module, tabmodule=PARSETAB, outputdir=outputdir)
 
 
-def populate_global_symbol_table() -> None:
-    # TODO: Need to do this for all the base functions / keywords
-    table = get_current_symtab()
-    codes = get_stdlib_codes()
+def set_scope_default_reductions(parser, names=("declaration", "lbrace", "rbrace")):
+    # PLY only skips the lookahead for states with a single lookahead token. Declarations
+    # (and the scopes that open and close them) must take effect before the lexer classifies
+    # the next identifier, so reduce these rules without reading the lookahead
+    for state, actions in parser.action.items():
+        rules = set(actions.values())
+        if len(rules) == 1:
+            rule = rules.pop()
+            if rule < 0 and parser.productions[-rule].name in names:
+                parser.defaulted_states[state] = rule
 
-    # Some of the binary operators
-    for op in ("+", "-", "/", "*"):
-        for _type in BASIC_TYPES:
-            _type = _type.lower()
-            table.insert(
-                {
-                    "name": op,
-                    "return type": _type,
-                    "parameter types": [_type, _type],
-                },
-                1,
-            )
 
-    for op in ("<", ">", "<=", ">=", "==", "!="):
-        for _type in BASIC_TYPES:
-            _type = _type.lower()
-            table.insert(
-                {
-                    "name": op,
-                    "return type": "int",  # essentially boolean
-                    "parameter types": [_type, _type],
-                },
-                1,
-            )
-
-    for op in ("&&", "||", "&", "|"):
-        for _type in NUMERIC_TYPES:
-            _type = _type.lower()
-            table.insert(
-                {
-                    "name": op,
-                    "return type": "int",  # essentially boolean
-                    "parameter types": [_type, _type],
-                },
-                1,
-            )
-
-    for op in "^":
-        for _type in INTEGER_TYPES:
-            _type = _type.lower()
-            table.insert(
-                {
-                    "name": op,
-                    "return type": "int",  # essentially boolean
-                    "parameter types": [_type, _type],
-                },
-                1,
-            )
-
-    for op in "!":
-        for _type in BASIC_TYPES:
-            _type = _type.lower()
-            table.insert(
-                {
-                    "name": op,
-                    "return type": "int",
-                    "parameter types": [_type],
-                },
-                1,
-            )
-
-    for op in "%":
-        for _type in INTEGER_TYPES:
-            _type = _type.lower()
-            table.insert(
-                {
-                    "name": op,
-                    "return type": _type,
-                    "parameter types": [_type, _type],
-                },
-                1,
-            )
+parser = build_parser()
+set_scope_default_reductions(parser)
 
-    for op in ("++", "--"):
-        for _type in BASIC_TYPES:
-            _type = _type.lower()
-            table.insert(
-                {
-                    "name": op,
-                    "return type": _type,
-                    "parameter types": [_type],
-                },
-                1,
-            )
 
-    for op in ("__store",):
-        for _type in BASIC_TYPES:
-            _type = _type.lower()
-            table.insert(
-                {
-                    "name": op,
-                    "return type": _type,
-                    "parameter types": [f"{_type}*", _type],
-                },
-                1,
-            )
-
-    # for getting array elements from basic types
-    for _type in BASIC_TYPES:
-        _type = _type.lower()
-        table.insert(
-            {
-                "name": "__get_array_element",
-                "return type": _type,
-                "parameter types": [f"{_type}*", "int"],
-            },
-            1,
-        )
-
-    # for & (reference)
-    for _type in BASIC_TYPES:
-        _type = _type.lower()
-        table.insert(
-            {
-                "name": "__ref",
-                "return type": f"{_type}*",
-                "parameter types": [f"{_type}"],
-            },
-            1,
-        )
-
-    # for * (de-reference)
-    for _type in BASIC_TYPES:
-        _type = _type.lower()
-        table.insert(
-            {
-                "name": "__deref",
-                "return type": f"{_type}",
-                "parameter types": [f"{_type}*"],
-            },
-            1,
-        )
-
-    # # for unary operators on pointers
-    # for _type in BASIC_TYPES:
-    #     _type = _type.lower()
-    #     table.insert(
-    #         {
-    #             "name": "__get_array_element",
-    #             "return type": _type,
-    #             "parameter types": [f"{_type}*", "int"],
-    #         },
-    #         1,
-    #     )
-
-    # For unary operators + and - (for p_cast)
-    for op in ("+", "-"):
-        for _type in BASIC_TYPES:
-            _type = _type.lower()
-            table.insert(
-                {
-                    "name": op,
-                    "return type": _type,
-                    "parameter types": [_type],
-                },
-                1,
-            )
+def populate_global_symbol_table() -> None:
+    # TODO: Need to do this for all the base functions / keywords
+    # The builtin operator overloads are shared by every compilation and built lazily, see
+    # symtab.BUILTIN_OPERATOR_SIGNATURES
+    table = get_current_symtab()
+    table.builtins = BUILTIN_OPERATORS
 
     # TODO: Add the convert functions
 
@@ -2811,31 +2479,39 @@ def get_args():
     parser.add_argument("--no-assembly", action="store_true", help="Don't Generate Assembly Code")
     parser.add_argument("-o", "--output", type=str, default="AST", help="Output file")
     parser.add_argument("--no-dump", action="store_true", help="Run MIPS Generator but don't print the output")
+    parser.add_argument(
+        "--draw", action="store_true", help="Draw the scope tree to <output>.dot / .png (needs requirements.txt)"
+    )
+    parser.add_argument("--dep-file", type=str, default=None, help="Write make style dependencies of the input")
+    parser.add_argument(
+        "--lexer", type=str, default="ply", choices=["ply", "fast"], help="Lexer engine (fast: single regex scanner)"
+    )
+    parser.add_argument(
+        "--symtab-format", type=str, default=None, choices=FORMATS, help="Export the symbol tables (default: off)"
+    )
+    parser.add_argument(
+        "--symtab-output", type=str, default=None, help="Symbol table export destination (default: symtables.<format>)"
+    )
     return parser
 
 
-def preprocessor(lines):
-    new_lines = []
-    for line in lines:
-        if "@include" in line:
-            expanded_lines = preprocessor(open(line.split(" ")[-1][1:-2], "r").readlines())
-            new_lines += expanded_lines
-        else:
-            new_lines += [line]
-    return new_lines
-
-
 if __name__ == "__main__":
     args = get_args().parse_args()
     if args.input == None:
         print("No input file specified")
     else:
-        data = "".join(preprocessor(open(args.input)))
+        unit = preprocess(args.input)
+        data = unit.data
+        lexer = lex.get_lexer(args.lexer)
+        lexer.unit = unit
+        GLOBAL_ERROR_LIST.lexer = lexer
+        if args.dep_file is not None:
+            write_dependency_file(unit, args.dep_file, os.path.splitext(args.input)[0] + ".s")
 
         push_scope(new_scope(get_current_symtab()))
         populate_global_symbol_table()
 
-        tree = yacc.parse(data, tracking=True)
+        tree = yacc.parse(data, lexer=lexer, tracking=True)
 
         gtab = pop_scope()
 
@@ -2848,6 +2524,15 @@ if __name__ == "__main__":
         if len(GLOBAL_ERROR_LIST) > 0:
             raise Exception("Compilation Errors detected. Fix before proceeding")
 
+        if args.symtab_format is not None:
+            if args.symtab_output is None:
+                args.symtab_output = "symtables." + {"binary": "bin"}.get(args.symtab_format, args.symtab_format)
+            with open(args.symtab_output, "wb", buffering=1 << 20) as f:
+                export_symbol_tables(gtab, f, args.symtab_format)
+
+        if args.draw:
+            draw_scope_tree(gtab, args.output)
+
         code = parse_code(tree, args.output, args.optimize, args.verbose)
         if not args.no_assembly:
             generate_mips_from_3ac(code, args.no_dump)
@@ -0,0 +1,86 @@
+import os
+import re
+from typing import Dict, List, Tuple, Union
+
+INCLUDE_DIRECTIVE = re.compile(r'@include\s*["<]([^">]+)[">]')
+
+# Parsed source files keyed by path -> (mtime, segments). A segment is either a list of
+# (line number, line) or the path of an included file
+_SOURCE_CACHE: Dict[str, Tuple[int, List[Union[str, List[Tuple[int, str]]]]]] = {}
+
+
+class TranslationUnit:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lines = []
+        # source_map[i] is the (file, line) the i-th expanded line (0 indexed) comes from
+        self.source_map = []
+        # Every file the unit was expanded from, in inclusion order
+        self.dependencies = []
+
+    @property
+    def data(self) -> str:
+        return "".join(self.lines)
+
+    def original_location(self, lineno: int) -> Tuple[str, int]:
+        # lineno as seen by the lexer (1 indexed)
+        if 1 <= lineno <= len(self.source_map):
+            return self.source_map[lineno - 1]
+        return (self.path, lineno)
+
+
+def _load_source(path: str):
+    mtime = os.stat(path).st_mtime_ns
+    cached = _SOURCE_CACHE.get(path, None)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    segments = []
+    with open(path, "r") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.endswith("\n"):
+                # Don't glue the last line of a file to the first line of what follows it
+                line += "\n"
+            if "@include" in line:
+                match = INCLUDE_DIRECTIVE.search(line)
+                if match is None:
+                    raise SyntaxError(f"{path}:{lineno}: Malformed include directive {line.strip()}")
+                segments.append(os.path.normpath(match.group(1)))
+            elif len(segments) > 0 and isinstance(segments[-1], list):
+                segments[-1].append((lineno, line))
+            else:
+                segments.append([(lineno, line)])
+    _SOURCE_CACHE[path] = (mtime, segments)
+    return segments
+
+
+def _expand(unit: TranslationUnit, path: str, included: set) -> None:
+    # Every file is expanded at most once per translation unit (implicit include guard)
+    if path in included:
+        return
+    included.add(path)
+    unit.dependencies.append(path)
+    for segment in _load_source(path):
+        if isinstance(segment, str):
+            _expand(unit, segment, included)
+        else:
+            for lineno, line in segment:
+                unit.lines.append(line)
+                unit.source_map.append((path, lineno))
+
+
+def preprocess(path: str) -> TranslationUnit:
+    # Include paths are resolved relative to the working directory
+    path = os.path.normpath(path)
+    unit = TranslationUnit(path)
+    _expand(unit, path, set())
+    return unit
+
+
+def write_dependency_file(unit: TranslationUnit, dep_file: str, target: str) -> None:
+    # Make style dependency rule, with an empty rule per header so deleting one doesn't break make
+    escape = lambda p: p.replace(" ", "\\ ")
+    with open(dep_file, "w") as f:
+        f.write(f"{escape(target)}: " + " \\\n  ".join(escape(d) for d in unit.dependencies) + "\n")
+        for dep in unit.dependencies[1:]:
+            f.write(f"\n{escape(dep)}:\n")
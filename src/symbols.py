@@ -0,0 +1,127 @@
+from collections.abc import MutableMapping
+from typing import Iterator
+
+
+class SymbolRecord(MutableMapping):
+    # Base class of the typed symbol table entries. Every field is a slot, and the dict interface
+    # maps the old string keys ("return type", "table name", ...) onto the slots so code indexing
+    # entries like dicts keeps working. A field that was never set behaves like a missing key, and
+    # keys without a slot go to a dict that is only allocated when first needed
+    __slots__ = ("extra",)
+    KEYS = {}
+
+    def __init__(self, fields: dict = None) -> None:
+        self.extra = None
+        if fields is not None:
+            keys = self.KEYS
+            for key, value in fields.items():
+                attr = keys.get(key, None)
+                if attr is None:
+                    self[key] = value
+                else:
+                    setattr(self, attr, value)
+
+    def __getitem__(self, key: str):
+        attr = self.KEYS.get(key, None)
+        if attr is not None:
+            try:
+                return getattr(self, attr)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def get(self, key: str, default=None):
+        attr = self.KEYS.get(key, None)
+        if attr is not None:
+            return getattr(self, attr, default)
+        return default if self.extra is None else self.extra.get(key, default)
+
+    def __setitem__(self, key: str, value) -> None:
+        attr = self.KEYS.get(key, None)
+        if attr is not None:
+            setattr(self, attr, value)
+        elif self.extra is None:
+            self.extra = {key: value}
+        else:
+            self.extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        attr = self.KEYS.get(key, None)
+        if attr is None:
+            if self.extra is None:
+                raise KeyError(key)
+            del self.extra[key]
+        else:
+            try:
+                delattr(self, attr)
+            except AttributeError:
+                raise KeyError(key) from None
+
+    def __contains__(self, key) -> bool:
+        attr = self.KEYS.get(key, None)
+        if attr is not None:
+            return hasattr(self, attr)
+        return self.extra is not None and key in self.extra
+
+    def __iter__(self) -> Iterator[str]:
+        for key, attr in self.KEYS.items():
+            if hasattr(self, attr):
+                yield key
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)})"
+
+
+def _keys(*keys: str) -> dict:
+    return {key: key.replace(" ", "_") for key in keys}
+
+
+class VariableSymbol(SymbolRecord):
+    KEYS = _keys(
+        "name",
+        "type",
+        "value",
+        "is_array",
+        "dimensions",
+        "pointer_lvl",
+        "kind",
+        "size",
+        "offset",
+        "table name",
+        "is_parameter",
+        "strides",
+    )
+    __slots__ = tuple(KEYS.values())
+
+
+class FunctionSymbol(SymbolRecord):
+    KEYS = _keys(
+        "name",
+        "return type",
+        "parameter types",
+        "kind",
+        "pointer_lvl",
+        "local scope",
+        "name resolution",
+        "return type size",
+        "param_size",
+    )
+    __slots__ = tuple(KEYS.values())
+
+
+class AggregateType(SymbolRecord):
+    # Structs, unions and classes
+    KEYS = _keys("name", "alt name", "field names", "field types", "field values", "kind", "pointer_lvl", "layout")
+    __slots__ = tuple(KEYS.values())
+
+
+class EnumType(SymbolRecord):
+    KEYS = _keys("name", "field names", "field values", "kind", "pointer_lvl", "field2var")
+    __slots__ = tuple(KEYS.values())
@@ -1,86 +1,39 @@
-from typing import Union, List, Tuple
-import csv
+from typing import Iterator, Union, List, Tuple
+from collections.abc import Mapping
+from types import MappingProxyType
+from bisect import bisect_right
 import os
 
-DATATYPE2SIZE = {
-    "VOID": 0,
-    "CHAR": 4,  # Char is not 4 bytes, but this allows us to support all
-    # unicode characters and also prevents potential alignment
-    # issues
-    "SIGNED CHAR": 4,
-    "UNSIGNED CHAR": 4,
-    "SHORT": 2,
-    "SHORT INT": 2,
-    "SIGNED SHORT": 2,
-    "SIGNED SHORT INT": 2,
-    "UNSIGNED SHORT": 2,
-    "UNSIGNED SHORT INT": 2,
-    "INT": 4,
-    "SIGNED INT": 4,
-    "UNSIGNED INT": 4,
-    "SIGNED": 4,
-    "UNSIGNED": 4,
-    "LONG": 8,
-    "LONG INT": 8,
-    "SIGNED LONG INT": 8,
-    "SIGNED LONG": 8,
-    "UNSIGNED LONG": 8,
-    "UNSIGNED LONG INT": 8,
-    "LONG LONG": 8,
-    "LONG LONG INT": 8,
-    "SIGNED LONG LONG": 8,
-    "SIGNED LONG LONG INT": 8,
-    "UNSIGNED LONG LONG": 8,
-    "UNSIGNED LONG LONG INT": 8,
-    "FLOAT": 4,
-    "DOUBLE": 8,
-    "LONG DOUBLE": 16,
-}
-
-
-CHARACTER_TYPES = ["CHAR", "SIGNED CHAR", "UNSIGNED CHAR"]
-
-INTEGER_TYPES = [
-    "SHORT",
-    "SHORT INT",
-    "SIGNED SHORT",
-    "SIGNED SHORT INT",
-    "UNSIGNED SHORT",
-    "UNSIGNED SHORT INT",
-    "INT",
-    "SIGNED INT",
-    "UNSIGNED INT",
-    "SIGNED",
-    "UNSIGNED",
-    "LONG",
-    "LONG INT",
-    "SIGNED LONG INT",
-    "SIGNED LONG",
-    "UNSIGNED LONG",
-    "UNSIGNED LONG INT",
-    "LONG LONG",
-    "LONG LONG INT",
-    "SIGNED LONG LONG",
-    "SIGNED LONG LONG INT",
-    "UNSIGNED LONG LONG",
-    "UNSIGNED LONG LONG INT",
-]
+from export import FORMATS, RecordWriter
+from symbols import AggregateType, EnumType, FunctionSymbol, VariableSymbol
+from type_utils import (
+    BASIC_TYPES,
+    CHARACTER_TYPES,
+    DATATYPE2SIZE,
+    FLOATING_POINT_TYPES,
+    INTEGER_TYPES,
+    NUMERIC_TYPES,
+    Type,
+)
 
-FLOATING_POINT_TYPES = [
-    "FLOAT",
-    "DOUBLE",
-    "LONG DOUBLE",
-]
 
+# Typed records the entries of each kind are stored as. Set CS335_SYMBOL_RECORDS=off to keep
+# plain dicts instead
+SYMBOL_RECORDS = os.environ.get("CS335_SYMBOL_RECORDS", "on").lower() not in ("", "0", "off", "none")
+RECORD_TYPES = {0: VariableSymbol, 1: FunctionSymbol, 2: AggregateType, 3: AggregateType, 4: EnumType, 5: AggregateType}
+
+TABLENUMBER = 0
 
-NUMERIC_TYPES = INTEGER_TYPES + FLOATING_POINT_TYPES
 
-BASIC_TYPES = NUMERIC_TYPES + CHARACTER_TYPES
+def _lazy_storage(attr: str, empty=MappingProxyType({})) -> property:
+    def storage(self):
+        return empty if self._storage is None else self._storage.get(attr, empty)
 
+    return property(storage)
 
-TABLENUMBER = 0
 
-num_display_invocations = 0
+def _as_record(entry: dict, kind: int):
+    return RECORD_TYPES[kind](entry) if SYMBOL_RECORDS else entry
 
 
 class SymbolTable:
@@ -90,32 +43,68 @@ class SymbolTable:
     #        3 for CL
     #        4 for EN
     #        5 for UN
+    # Most block scopes only ever hold a few temporaries, so the per kind storage (and the list of
+    # children) is only allocated on the first insert of that kind. Until then the attributes below
+    # read as shared empty containers
+    __slots__ = (
+        "func_scope",
+        "parent",
+        "table_number",
+        "current_offset",
+        "builtins",
+        "scope_depth",
+        "_storage",
+    )
+
     def __init__(self, parent=None, function_scope=None) -> None:
         global TABLENUMBER
         self.func_scope = function_scope if TABLENUMBER != 0 else "GLOBAL"
-        self._symtab_variables = dict()
-        self._symtab_functions = dict()
-        self._function_names = dict()
-        self._symtab_structs = dict()
-        self._symtab_typedefs = dict()
-        self._symtab_unions = dict()
-        self._symtab_classes = dict()
-        self._symtab_enums = dict()
-        self._custom_types = dict()
-        self._symtab_labels = dict()
-        self._paramtab = []
+        self._storage = None
+        # Only the global table has the builtin operators, see populate_global_symbol_table
+        self.builtins = None
+        # Position in SCOPE_INDEX while the scope is active, None otherwise
+        self.scope_depth = None
         self.current_offset = 0
         self.parent = parent
         if self.parent is not None:
-            self.parent.children.append(self)
-        self.children = []
+            self.parent._own("children", list).append(self)
         self.table_number = TABLENUMBER
         TABLENUMBER += 1
 
-        if parent is None:
-            self.table_name = "GLOBAL"
-        else:
-            self.table_name = f"BLOCK_{self.table_number}"
+    @property
+    def table_name(self) -> str:
+        # Derived on demand for empty scopes, and kept with the storage once the scope has entries so
+        # that all of them share the same string
+        if self.parent is None:
+            return "GLOBAL"
+        if self._storage is None:
+            return f"BLOCK_{self.table_number}"
+        name = self._storage.get("table_name", None)
+        if name is None:
+            name = self._storage["table_name"] = f"BLOCK_{self.table_number}"
+        return name
+
+    def _own(self, attr: str, factory=dict):
+        # The storage behind attr, allocating it on first use
+        if self._storage is None:
+            self._storage = dict()
+        storage = self._storage.get(attr, None)
+        if storage is None:
+            storage = self._storage[attr] = factory()
+        return storage
+
+    _symtab_variables = _lazy_storage("_symtab_variables")
+    _symtab_functions = _lazy_storage("_symtab_functions")
+    _function_names = _lazy_storage("_function_names")
+    _symtab_structs = _lazy_storage("_symtab_structs")
+    _symtab_typedefs = _lazy_storage("_symtab_typedefs")
+    _symtab_unions = _lazy_storage("_symtab_unions")
+    _symtab_classes = _lazy_storage("_symtab_classes")
+    _symtab_enums = _lazy_storage("_symtab_enums")
+    _custom_types = _lazy_storage("_custom_types")
+    _symtab_labels = _lazy_storage("_symtab_labels")
+    _paramtab = _lazy_storage("_paramtab", ())
+    children = _lazy_storage("children", ())
 
     @staticmethod
     def _get_proper_name(entry: dict, kind: int = 0):
@@ -180,18 +169,21 @@ class SymbolTable:
                                 raise Exception
                             ndims.append(dim["value"])
                     entry["dimensions"] = ndims
+                    if all(isinstance(d, str) and d.isdigit() for d in ndims):
+                        entry["strides"] = array_strides(ndims)
 
                 entry["table name"] = self.table_name
 
-                self._symtab_variables[name] = entry
+                entry = _as_record(entry, kind)
+                self._own("_symtab_variables")[name] = entry
+                self._bind(name)
                 if param:
-                    self._paramtab.append(name)
+                    self._own("_paramtab", list).append(name)
 
             elif kind == 1:
                 # Function
                 entry["local scope"] = None
-                self._symtab_functions[name] = entry
-                self._symtab_functions[name]["name resolution"] = name
+                entry["name resolution"] = name
                 ret_type = entry["return type"]
                 _s = compute_storage_size({"type": ret_type}, self.lookup_type(ret_type))
                 entry["return type size"] = _s
@@ -201,10 +193,15 @@ class SymbolTable:
                     _s = compute_storage_size({"type": p}, t)
                     param_size += _s
                 entry["param_size"] = param_size
+                entry = _as_record(entry, kind)
+                self._own("_symtab_functions")[name] = entry
+                self._bind(name)
                 if entry["name"] in self._function_names:
                     self._function_names[entry["name"]].append(name)
                 else:
-                    self._function_names[entry["name"]] = [name]
+                    self._own("_function_names")[entry["name"]] = [name]
+                    self._bind(entry["name"])
+                OVERLOADS.declare(entry["name"])
 
             elif kind == 2:
                 # Struct
@@ -214,16 +211,21 @@ class SymbolTable:
                 # symtab_structs just stores the translated name
                 if len(set(entry["field names"])) != len(entry["field names"]):
                     raise Exception("Non Unique Field Names detected")
-                self._symtab_structs[name] = entry["alt name"]
-                self._symtab_typedefs[entry["alt name"]] = entry
-                self._custom_types[f"struct {name}"] = entry
-                self._custom_types[entry["alt name"]] = entry
+                entry = _as_record(entry, kind)
+                self._own("_symtab_structs")[name] = entry["alt name"]
+                self._own("_symtab_typedefs")[entry["alt name"]] = entry
+                self._own("_custom_types")[f"struct {name}"] = entry
+                self._own("_custom_types")[entry["alt name"]] = entry
+                self._bind_aggregate("struct ", name, entry["alt name"])
 
             elif kind == 3:
                 # Class
                 # TODO:
-                self._symtab_classes[name] = entry
-                self._custom_types[name] = entry
+                entry = _as_record(entry, kind)
+                self._own("_symtab_classes")[name] = entry
+                self._own("_custom_types")[name] = entry
+                self._bind(name)
+                self._bind_type(name)
 
             elif kind == 4:
                 # Enum
@@ -231,8 +233,11 @@ class SymbolTable:
                 # Insert all the fields as variables
                 for i, var in enumerate(entry["field names"]):
                     entry["field2var"][var] = {}
-                self._symtab_enums[name] = entry
-                self._custom_types[f"enum {name}"] = entry
+                entry = _as_record(entry, kind)
+                self._own("_symtab_enums")[name] = entry
+                self._own("_custom_types")[f"enum {name}"] = entry
+                self._bind(name)
+                self._bind_type(f"enum {name}")
 
                 for i, var in enumerate(entry["field names"]):
                     _, nentry = self.insert(
@@ -253,13 +258,16 @@ class SymbolTable:
                 if len(set(entry["field names"])) != len(entry["field names"]):
                     raise Exception("Non Unique Field Names detected")
                 # symtab_structs just stores the translated name
-                self._symtab_unions[name] = entry["alt name"]
-                self._symtab_typedefs[entry["alt name"]] = entry
-                self._custom_types[f"union {name}"] = entry
-                self._custom_types[entry["alt name"]] = entry
+                entry = _as_record(entry, kind)
+                self._own("_symtab_unions")[name] = entry["alt name"]
+                self._own("_symtab_typedefs")[entry["alt name"]] = entry
+                self._own("_custom_types")[f"union {name}"] = entry
+                self._own("_custom_types")[entry["alt name"]] = entry
+                self._bind_aggregate("union ", name, entry["alt name"])
 
             elif kind == 6:
-                self._symtab_labels[name] = entry
+                self._own("_symtab_labels")[name] = entry
+                self._bind(name)
 
             else:
                 raise Exception(f"{kind} is not a valid kind of identifier")
@@ -270,12 +278,30 @@ class SymbolTable:
         # Variables (ID) -> {"name", "type", "value", "is_array", "dimensions", "kind", "size", "offset", "pointer_lvl"}
         # Functions (FN) -> {"name", "return type", "parameter types", "kind", "local scope"}
 
+    def _bind(self, name: str) -> None:
+        # Record that lookup_current_table finds name in this scope
+        if self.scope_depth is not None:
+            SCOPE_INDEX.bind(SCOPE_INDEX.symbols, name, self)
+
+    def _bind_type(self, typename: str) -> None:
+        if self.scope_depth is not None:
+            SCOPE_INDEX.bind(SCOPE_INDEX.types, typename, self)
+
+    def _bind_aggregate(self, prefix: str, name: str, alt_name: str) -> None:
+        # Mirrors _search_for_struct / _search_for_union, which match "struct X" keys and alt names
+        if name.startswith(prefix):
+            self._bind(name[len(prefix) :])
+        self._bind(alt_name)
+        self._bind_type(prefix + name)
+        self._bind_type(alt_name)
+
     def _check_type_in_current_table(self, typename: str) -> bool:
-        global DATATYPE2SIZE
-        is_basic_type = typename.upper() in DATATYPE2SIZE if not isinstance(typename, (list, tuple)) else False
+        is_basic_type = Type.of(typename).size is not None if not isinstance(typename, (list, tuple)) else False
         return typename in self._custom_types if not is_basic_type else is_basic_type
 
     def check_type(self, typename: str) -> bool:
+        if isinstance(typename, str) and SCOPE_INDEX.is_innermost(self):
+            return Type.of(typename).size is not None or typename in SCOPE_INDEX.types
         is_type = self._check_type_in_current_table(typename)
         return self.parent.check_type(typename) if self.parent is not None and not is_type else is_type
 
@@ -298,6 +324,10 @@ class SymbolTable:
         return self._symtab_variables.get(symname, None)
 
     def _search_for_function(self, symname: str) -> Union[None, List[dict], dict]:
+        if self.builtins is not None:
+            res = self.builtins.lookup(symname, self)
+            if res is not None:
+                return res
         if "(" in symname:
             return self._symtab_functions.get(symname, None)
         else:
@@ -337,6 +367,8 @@ class SymbolTable:
         alt_name: Union[str, None] = None,
         kind: int = -1,
     ) -> Union[None, list, dict]:
+        if self._storage is None and self.builtins is None:
+            return None
         res = self._search_for_variable(symname) if kind <= 0 else None
         res = self._search_for_function(symname) if res is None and kind <= 1 else res
         res = self._search_for_struct(symname, alt_name) if res is None and kind <= 2 else res
@@ -358,10 +390,21 @@ class SymbolTable:
         return self._custom_types.get(typename, None)
 
     def lookup_type(self, typename: str) -> Union[dict, None]:
+        if SCOPE_INDEX.is_innermost(self):
+            return SCOPE_INDEX.lookup_type(typename)
         t = self._lookup_type(typename)
         return self.parent.lookup_type(typename) if self.parent is not None and t is None else t
 
+    def type_owner(self, typename: str) -> Union["SymbolTable", None]:
+        # Table the type is defined in, its field types have to be resolved there
+        table = self
+        while table is not None and table._lookup_type(typename) is None:
+            table = table.parent
+        return table
+
     def lookup(self, symname: str, idx: int = -1, alt_name: Union[str, None] = None) -> Union[None, list, dict]:
+        if alt_name is None and SCOPE_INDEX.is_innermost(self):
+            return SCOPE_INDEX.lookup(symname)
         # Check in the current list of symbols
         res = self.lookup_current_table(symname, paramtab_check=(idx == -1), alt_name=alt_name)
         # Check if present in the parent recursively till root node is reached
@@ -372,11 +415,11 @@ class SymbolTable:
     def add_function_scope(self, funcname: str, table) -> None:
         if "(" not in funcname:
             raise Exception(f"Supply the disambiguated function name for {funcname}")
-        self._symtab_functions[funcname] = SymbolTable
+        self._own("_symtab_functions")[funcname] = SymbolTable
+        self._bind(funcname)
 
     def display(self) -> None:
-        # Simple Pretty Printer
-        global num_display_invocations
+        # Simple Pretty Printer, see export_symbol_tables for a machine readable dump
         print("-" * 100)
         print(f"SYMBOL TABLE: {self.table_name}, TABLE NUMBER: {self.table_number}, FUNCTION SCOPE: {self.func_scope}")
         print("-" * 51)
@@ -401,101 +444,366 @@ class SymbolTable:
         print("-" * 100)
         print()
 
-        # printing symbol tables in csv
-        if num_display_invocations == 0:
-            if os.path.isfile("symtables.csv"):
-                os.remove("symtables.csv")
-
-        with open("symtables.csv", mode="a+") as sym_file:
-            sym_writer = csv.writer(
-                sym_file,
-                delimiter=",",
-                quotechar='"',
-                quoting=csv.QUOTE_MINIMAL,
-            )
-            if num_display_invocations == 0:
-                sym_writer.writerow(
-                    [
-                        "SYMBOL TABLE",
-                        "FUNCTION SCOPE",
-                        "VARIABLE/FUNCTION",
-                        "NAME",
-                        "TYPE",
-                        "SIZE",
-                        "OFFSET",
-                        "DIMENSIONS",
-                        "RETURN TYPE",
-                        "PARAMETERS",
-                        "NAME RESOLUTION",
-                    ]
-                )
-                num_display_invocations += 1
-            for k, v in self._symtab_variables.items():
-                if v["name"][: min(2, len(k))] == "__":
-                    continue
-
-                if not v["is_array"]:
-                    sym_writer.writerow(
-                        [
-                            f"{self.table_name}",
-                            f"{self.func_scope}",
-                            "Variable",
-                            f"{k}",
-                            f"{v['type'] + '*' * v['pointer_lvl']}",
-                            f"{v['size']}",
-                            f"{v['offset']}",
-                            "",
-                            "",
-                            "",
-                            "",
-                        ]
-                    )
-                else:
-                    sym_writer.writerow(
-                        [
-                            f"{self.table_name}",
-                            f"{self.func_scope}",
-                            "Variable",
-                            f"{k}",
-                            f"{v['type'] + '*' * v['pointer_lvl']}",
-                            f"{v['size']}",
-                            f"{v['offset']}",
-                            f"{v['dimensions']}",
-                            "",
-                            "",
-                            "",
-                        ]
-                    )
 
-            for k, v in self._symtab_functions.items():
-                if v["name"][: min(1, len(k))] == "__" or not v["name"][0].isalpha():
-                    continue
-                sym_writer.writerow(
-                    [
-                        f"{self.table_name}",
-                        f"{self.func_scope}",
-                        "Function",
-                        f"{v['name']}",
-                        "",
-                        "",
-                        "",
-                        "",
-                        f"{v['return type']}",
-                        f"{v['parameter types']}",
-                        f"{k}",
-                    ]
-                )
+# One record per variable and function of every table. Sizes and offsets are -1 where they don't
+# apply (functions) or aren't known at compile time (variable length arrays)
+SYMTAB_EXPORT_FIELDS = [
+    ("SYMBOL TABLE", "str"),
+    ("FUNCTION SCOPE", "str"),
+    ("VARIABLE/FUNCTION", ("enum", ("Variable", "Function"))),
+    ("NAME", "str"),
+    ("TYPE", "str"),
+    ("SIZE", "i64"),
+    ("OFFSET", "i64"),
+    ("DIMENSIONS", "str"),
+    ("RETURN TYPE", "str"),
+    ("PARAMETERS", "str"),
+    ("NAME RESOLUTION", "str"),
+]
 
 
+def _symtab_records(table: SymbolTable) -> Iterator[tuple]:
+    table_name, func_scope = table.table_name, str(table.func_scope)
+    for k, v in table._symtab_variables.items():
+        if v["name"][: min(2, len(k))] == "__":
+            continue
+        size, offset = v["size"], v["offset"]
+        yield (
+            table_name,
+            func_scope,
+            "Variable",
+            k,
+            v["type"] + "*" * v["pointer_lvl"],
+            size if isinstance(size, int) else -1,
+            offset if isinstance(offset, int) else -1,
+            str(v["dimensions"]) if v["is_array"] else "",
+            "",
+            "",
+            "",
+        )
+    for k, v in table._symtab_functions.items():
+        if not v["name"][0].isalpha():
+            continue
+        yield (table_name, func_scope, "Function", v["name"], "", -1, -1, "", v["return type"], str(v["parameter types"]), k)
+
+
+def export_symbol_tables(root: SymbolTable, stream, fmt: str = "csv", batch_size: int = 4096) -> int:
+    # Writes the records of root and every table below it (depth first, in creation order) to the
+    # binary stream in one pass, returns the number of records
+    writer = RecordWriter(stream, fmt, SYMTAB_EXPORT_FIELDS, batch_size)
+    stack = [root]
+    while len(stack) > 0:
+        table = stack.pop()
+        writer.write_many(_symtab_records(table))
+        stack.extend(reversed(table.children))
+    writer.close()
+    return writer.count
+
+
+class TypeNameRegistry:
+    # Typedef names visible at the current point of the parse. The lexer queries this for
+    # every identifier, so membership is a single hash lookup. A typedef or an object declared
+    # in an inner scope shadows an outer typedef of the same name until that scope is popped
+    def __init__(self) -> None:
+        self._aliases = dict()
+        # name -> stack of (scope depth, aliased type or None for an object) bindings
+        self._bindings = dict()
+        self._scopes = []
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._aliases
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def push_scope(self) -> None:
+        self._scopes.append([])
+
+    def pop_scope(self) -> None:
+        for name in self._scopes.pop():
+            bindings = self._bindings[name]
+            bindings.pop()
+            if len(bindings) == 0:
+                del self._bindings[name]
+            if len(bindings) == 0 or bindings[-1][1] is None:
+                self._aliases.pop(name, None)
+            else:
+                self._aliases[name] = bindings[-1][1]
+
+    def _bind(self, name: str, typename: Union[None, str]) -> bool:
+        bindings = self._bindings.setdefault(name, [])
+        depth = len(self._scopes)
+        if len(bindings) > 0 and bindings[-1][0] == depth:
+            # Redeclaring a name in the same scope is only valid if it aliases the same type
+            return bindings[-1][1] == typename
+        bindings.append((depth, typename))
+        self._scopes[-1].append(name)
+        if typename is None:
+            self._aliases.pop(name, None)
+        else:
+            self._aliases[name] = typename
+        return True
+
+    def define(self, name: str, typename: str) -> bool:
+        return self._bind(name, typename)
+
+    def hide(self, name: str) -> bool:
+        # An object or parameter declaration. It is bound as well when no typedef of that name is
+        # visible, so that a later typedef of the name in the same scope is reported
+        return self._bind(name, None)
+
+    def resolve(self, name: str) -> Union[None, str]:
+        return self._aliases.get(name, None)
+
+
+TYPE_NAMES = TypeNameRegistry()
+
+# Overload families of the builtin operators as (names, operand types, parameter types, return type)
+# where "{t}" stands for the operand type. The order is the order the overloads are listed in
+BUILTIN_OPERATOR_SIGNATURES = (
+    (("+", "-", "/", "*"), BASIC_TYPES, ("{t}", "{t}"), "{t}"),
+    (("<", ">", "<=", ">=", "==", "!="), BASIC_TYPES, ("{t}", "{t}"), "int"),
+    (("&&", "||", "&", "|"), NUMERIC_TYPES, ("{t}", "{t}"), "int"),
+    (("^",), INTEGER_TYPES, ("{t}", "{t}"), "int"),
+    (("!",), BASIC_TYPES, ("{t}",), "int"),
+    (("%",), INTEGER_TYPES, ("{t}", "{t}"), "{t}"),
+    (("++", "--"), BASIC_TYPES, ("{t}",), "{t}"),
+    (("__store",), BASIC_TYPES, ("{t}*", "{t}"), "{t}"),
+    (("__get_array_element",), BASIC_TYPES, ("{t}*", "int"), "{t}"),
+    (("__ref",), BASIC_TYPES, ("{t}",), "{t}*"),
+    (("__deref",), BASIC_TYPES, ("{t}*",), "{t}"),
+    (("+", "-"), BASIC_TYPES, ("{t}",), "{t}"),
+)
+
+
+class BuiltinOperatorTable:
+    # Function entries of the builtin operators, shared by every global symbol table. An entry is
+    # only built the first time its overload is looked up and is read only from then on
+    def __init__(self, signatures) -> None:
+        self._families = dict()
+        for names, types, params, ret in signatures:
+            for name in names:
+                self._families.setdefault(name, []).append((dict.fromkeys(t.lower() for t in types), params, ret))
+        self._entries = dict()
+        self._overloads = dict()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._families
+
+    def _operand_type(self, params: tuple, args: List[str]) -> Union[None, str]:
+        # Recover "{t}" from the first parameter (which always starts with it), e.g. "int*"
+        # against "{t}*" gives "int"
+        suffix = params[0][3:]
+        if not args[0].endswith(suffix):
+            return None
+        return args[0][: len(args[0]) - len(suffix)]
+
+    def _build_entry(self, name: str, t: str, params: tuple, ret: str, symTab) -> MappingProxyType:
+        ptypes = [p.format(t=t) for p in params]
+        ret = ret.format(t=t)
+        name_resolution = name + "(" + ",".join(ptypes) + ")"
+        entry = self._entries.get(name_resolution, None)
+        if entry is not None:
+            return entry
+        entry = MappingProxyType(
+            {
+                "name": name,
+                "return type": ret,
+                "parameter types": ptypes,
+                "kind": 1,
+                "pointer_lvl": 0,
+                "local scope": None,
+                "name resolution": name_resolution,
+                "return type size": compute_storage_size({"type": ret}, None, symTab),
+                "param_size": sum(compute_storage_size({"type": p}, None, symTab) for p in ptypes),
+            }
+        )
+        self._entries[name_resolution] = entry
+        return entry
+
+    def lookup(self, symname: str, symTab) -> Union[None, MappingProxyType, List[MappingProxyType]]:
+        if "(" not in symname:
+            # Base name lookup, every overload of the operator
+            if symname not in self._families:
+                return None
+            if symname not in self._overloads:
+                self._overloads[symname] = [
+                    self._build_entry(symname, t, params, ret, symTab)
+                    for types, params, ret in self._families[symname]
+                    for t in types
+                ]
+            return self._overloads[symname]
+
+        if symname in self._entries:
+            return self._entries[symname]
+        i = symname.index("(")
+        name = symname[:i]
+        if name not in self._families or symname[-1] != ")":
+            return None
+        args = symname[i + 1 : -1].split(",") if i + 2 < len(symname) else []
+        for types, params, ret in self._families[name]:
+            if len(params) != len(args):
+                continue
+            t = self._operand_type(params, args)
+            if t in types and [p.format(t=t) for p in params] == args:
+                return self._build_entry(name, t, params, ret, symTab)
+        return None
+
+
+BUILTIN_OPERATORS = BuiltinOperatorTable(BUILTIN_OPERATOR_SIGNATURES)
+
+
+class OverloadResolver:
+    # Memoized function lookups for the semantic actions. A mangled name like "+(int,int)" is only
+    # searched for in the function tables of the scope chain, and when it resolves to the global
+    # scope the entry is remembered until an overload of the same name is declared in any scope
+    # (or a new global scope is pushed). Resolution plans, i.e. the mangled name and the type the
+    # arguments are converted to, only depend on the argument types and are cached separately
+    def __init__(self) -> None:
+        self._versions = dict()
+        self._entries = dict()
+        self._plans = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def declare(self, name: str) -> None:
+        self._versions[name] = self._versions.get(name, 0) + 1
+
+    def lookup(self, symname: str, symTab=None) -> Union[None, dict]:
+        name = symname.partition("(")[0]
+        cached = self._entries.get(symname, None)
+        if cached is not None and cached[0] is GLOBAL_SYMBOL_TABLE and cached[1] == self._versions.get(name, 0):
+            self.hits += 1
+            return cached[2]
+        self.misses += 1
+        table = get_current_symtab() if symTab is None else symTab
+        while table is not None:
+            res = table._search_for_function(symname)
+            if res is not None:
+                if table.parent is None:
+                    self._entries[symname] = (table, self._versions.get(name, 0), res)
+                return res
+            table = table.parent
+        return None
+
+    def get_plan(self, key: tuple):
+        return self._plans.get(key, None)
+
+    def set_plan(self, key: tuple, plan: tuple) -> None:
+        self._plans[key] = plan
+
+
+OVERLOADS = OverloadResolver()
+
+
+class ScopeIndex:
+    # Flattened view of the active scopes (SYMBOL_TABLES, each one a child of the previous). Every
+    # name maps to the stack of active scopes that define it, innermost last, with ordinary
+    # identifiers and type names in separate namespaces. A lookup from the innermost scope is then
+    # answered by the one scope the name resolves to, independent of the nesting depth. Every scope
+    # keeps an undo log of the names it bound, which are unbound when it is popped. Lookups from
+    # scopes that are not the innermost active one (e.g. after parsing) walk the parents as before
+    def __init__(self) -> None:
+        self.enabled = True
+        self.scopes = []
+        self.symbols = dict()
+        self.types = dict()
+        self._undo = []
+
+    def is_innermost(self, table: SymbolTable) -> bool:
+        return self.enabled and table.scope_depth is not None and table.scope_depth == len(self.scopes) - 1
+
+    def enter(self, table: SymbolTable) -> None:
+        table.scope_depth = len(self.scopes)
+        self.scopes.append(table)
+        self._undo.append([])
+
+    def exit(self) -> SymbolTable:
+        table = self.scopes.pop()
+        for namespace, name in self._undo.pop():
+            stack = namespace[name]
+            stack.pop()
+            if len(stack) == 0:
+                del namespace[name]
+        table.scope_depth = None
+        return table
+
+    def bind(self, namespace: dict, name: str, table: SymbolTable) -> None:
+        stack = namespace.get(name, None)
+        if stack is None:
+            namespace[name] = [table]
+        elif stack[-1] is table or table in stack:
+            return
+        elif stack[-1].scope_depth < table.scope_depth:
+            stack.append(table)
+        else:
+            # Inserting into an enclosing scope, keep the stack ordered by depth
+            depths = [t.scope_depth for t in stack]
+            stack.insert(bisect_right(depths, table.scope_depth), table)
+        self._undo[table.scope_depth].append((namespace, name))
+
+    def lookup(self, symname: str) -> Union[None, list, dict]:
+        stack = self.symbols.get(symname, None)
+        # The builtin operators of the global scope aren't bound, they are only found in the end
+        table = self.scopes[0] if stack is None else stack[-1]
+        return table.lookup_current_table(symname, False)
+
+    def lookup_type(self, typename: str) -> Union[dict, None]:
+        stack = self.types.get(typename, None)
+        return None if stack is None else stack[-1]._lookup_type(typename)
+
+
+SCOPE_INDEX = ScopeIndex()
+
 SYMBOL_TABLES = []
 GLOBAL_SYMBOL_TABLE = None
-SYMTAB_NAME_TO_TABLE = {}
+
+
+class ScopeRegistry(Mapping):
+    # Every scope pushed so far by table name. Block scopes ("BLOCK_<n>") sit in a list indexed by
+    # their table number, so registering one costs a single list slot instead of a dict entry
+    def __init__(self) -> None:
+        self._global = None
+        self._blocks = []
+
+    def register(self, table: SymbolTable) -> None:
+        if table.parent is None:
+            self._global = table
+            return
+        if len(self._blocks) <= table.table_number:
+            self._blocks.extend([None] * (table.table_number + 1 - len(self._blocks)))
+        self._blocks[table.table_number] = table
+
+    def __getitem__(self, name: str) -> SymbolTable:
+        table = None
+        if name == "GLOBAL":
+            table = self._global
+        elif name.startswith("BLOCK_") and name[6:].isdigit() and int(name[6:]) < len(self._blocks):
+            table = self._blocks[int(name[6:])]
+        if table is None:
+            raise KeyError(name)
+        return table
+
+    def __iter__(self) -> Iterator[str]:
+        if self._global is not None:
+            yield "GLOBAL"
+        for table in self._blocks:
+            if table is not None:
+                yield table.table_name
+
+    def __len__(self) -> int:
+        return (self._global is not None) + sum(table is not None for table in self._blocks)
+
+
+SYMTAB_NAME_TO_TABLE = ScopeRegistry()
 STATIC_VARIABLE_MAPS = {}
 
 
 def pop_scope() -> SymbolTable:
     global SYMBOL_TABLES
     s = SYMBOL_TABLES.pop()
+    SCOPE_INDEX.exit()
+    TYPE_NAMES.pop_scope()
     # if s.table_name != "GLOBAL":
     # s.display()
     # print(
@@ -511,7 +819,9 @@ def push_scope(s: SymbolTable) -> None:
     if len(SYMBOL_TABLES) == 0:
         GLOBAL_SYMBOL_TABLE = s
     SYMBOL_TABLES.append(s)
-    SYMTAB_NAME_TO_TABLE[s.table_name] = s
+    SCOPE_INDEX.enter(s)
+    TYPE_NAMES.push_scope()
+    SYMTAB_NAME_TO_TABLE.register(s)
     # print("[DEBUG INFO] PUSH SYMBOL TABLE: ", s.table_number, s.table_name)
 
 
@@ -534,15 +844,21 @@ def get_global_symtab():
     return GLOBAL_SYMBOL_TABLE
 
 
+def array_strides(dimensions: List[str]) -> Tuple[int, ...]:
+    # Row major stride (in elements) of every dimension, the last one is always 1
+    strides = [1] * len(dimensions)
+    for i in range(len(dimensions) - 2, -1, -1):
+        strides[i] = strides[i + 1] * int(dimensions[i + 1])
+    return tuple(strides)
+
+
 def compute_offset_size(dsize: int, is_array: bool, dimensions: List[int], entry, typeentry) -> int:
+    # Strides in bytes of an array entry
     if not is_array:
         return dsize
     else:
-        offset = [DATATYPE2SIZE[entry["type"].upper()]]
-        for i, d in enumerate(reversed(entry["dimensions"])):
-            if i is not len(entry["dimensions"]) - 1:
-                offset.append(offset[i] * int(d["value"]))
-        return offset[::-1]
+        size = Type.of(entry["type"]).size
+        return [size * s for s in entry["strides"]]
 
 
 def _get_correct_type(entry: dict):
@@ -555,18 +871,17 @@ def _get_correct_type(entry: dict):
 
 
 def compute_storage_size(entry, typeentry, symTab=None) -> int:
-    _c = entry["type"].count("*")
+    ty = Type.of(entry["type"])
     symTab = get_current_symtab() if symTab is None else symTab
-    if _c > 0:
-        t = "".join(filter(lambda x: x != "*", entry["type"])).strip()
-        return compute_storage_size({"type": t, "pointer_lvl": _c}, symTab.lookup_type(t), symTab)
+    if ty.pointer_lvl > 0:
+        t = ty.unpointed
+        return compute_storage_size({"type": t, "pointer_lvl": ty.pointer_lvl}, symTab.lookup_type(t), symTab)
     # if "[" in entry["type"]:
     #     # FIXME
     #     t = entry["type"][:entry["type"].index("[")]
     #     return compute_storage_size({"type":t, "pointer_lvl": 1}, get_current_symtab().lookup_type(t))
-    global DATATYPE2SIZE
     if entry.get("is_array", False):
-        prod = DATATYPE2SIZE[entry["type"].upper()]
+        prod = ty.size
         for d in entry["dimensions"]:
             if d == "variable":
                 return "var"
@@ -580,30 +895,78 @@ def compute_storage_size(entry, typeentry, symTab=None) -> int:
 
     if entry.get("pointer_lvl", 0) > 0:
         return 4
-    if entry["type"].startswith("enum "):
+    if ty.aggregate == "enum":
         return 4
-    if entry["type"].startswith("struct "):
-        size = 0
-        temp = "".join(filter(lambda x: x != "*", entry["type"])).strip()
-        typeentry = symTab.lookup_type(temp)
-        for t in typeentry["field types"]:
-            size += compute_storage_size({"type": t}, symTab.lookup_type(t), symTab)
-        return size
-    if entry["type"].startswith("union "):
-        size = 0
-        temp = "".join(filter(lambda x: x != "*", entry["type"])).strip()
-        typeentry = symTab.lookup_type(temp)
-        for t in typeentry["field types"]:
-            size = max(size, compute_storage_size({"type": t}, symTab.lookup_type(t), symTab))
-        return size
+    if ty.aggregate == "struct" or ty.aggregate == "union":
+        return aggregate_layout(symTab.lookup_type(ty.unpointed)).compute(symTab).size
     if typeentry is None:
-        s = DATATYPE2SIZE[entry["type"].upper()]
-        return s
+        return ty.size
     else:
         raise NotImplementedError
     return 0
 
 
+class AggregateLayout:
+    # Layout of a struct or union definition, computed once and cached on its entry (see
+    # aggregate_layout). The fields by name are known right away, the sizes and offsets only once
+    # compute is called since they need the field types to be complete. Fields are packed: the MIPS
+    # backend spills the fields of a struct to consecutive stack slots, so there is no padding and
+    # align is the alignment the definition would need
+    __slots__ = ("is_union", "field_types", "size", "align", "offsets", "_leaves")
+
+    def __init__(self, entry) -> None:
+        self.is_union = entry["kind"] == 5
+        self.field_types = dict(zip(entry["field names"], entry["field types"]))
+        self.size = None
+        self.align = None
+        # field name -> (offset, type)
+        self.offsets = None
+        self._leaves = None
+
+    def compute(self, symTab=None) -> "AggregateLayout":
+        if self.size is not None:
+            return self
+        symTab = get_current_symtab() if symTab is None else symTab
+        size, align, offsets = 0, 1, dict()
+        for name, t in self.field_types.items():
+            typeentry = symTab.lookup_type(t)
+            fsize = compute_storage_size({"type": t}, typeentry, symTab)
+            ft = Type.of(t)
+            if ft.aggregate in ("struct", "union") and ft.pointer_lvl == 0:
+                align = max(align, aggregate_layout(typeentry).align)
+            else:
+                align = max(align, min(fsize, 8))
+            if self.is_union:
+                offsets[name] = (0, t)
+                size = max(size, fsize)
+            else:
+                offsets[name] = (size, t)
+                size += fsize
+        self.size, self.align, self.offsets = size, align, offsets
+        return self
+
+    def leaves(self, symTab) -> List[Tuple[str, str, str]]:
+        # (".field.subfield", size, type) of every field of a basic type, nested aggregates
+        # flattened in order
+        if self._leaves is None:
+            leaves = []
+            for name, t in self.field_types.items():
+                if get_default_value(t) is not None:
+                    leaves.append((f".{name}", str(Type.of(t).size), t))
+                else:
+                    nested = aggregate_layout(symTab.lookup_type(t)).leaves(symTab)
+                    leaves.extend((f".{name}{suffix}", s, _t) for suffix, s, _t in nested)
+            self._leaves = leaves
+        return self._leaves
+
+
+def aggregate_layout(typeentry) -> AggregateLayout:
+    layout = typeentry.get("layout", None)
+    if layout is None:
+        layout = typeentry["layout"] = AggregateLayout(typeentry)
+    return layout
+
+
 TMP_VAR_COUNTER = 0
 TMP_LABEL_COUNTER = 0
 TMP_CLOSURE_COUNTER = 0
@@ -616,7 +979,7 @@ def get_tmp_var(vartype=None, symTab=None) -> str:
     if vartype is not None:
         symTab = get_current_symtab() if symTab is None else symTab
 
-        ptr_level = vartype.count("*")
+        ptr_level = Type.of(vartype).pointer_lvl
         if ptr_level > 0:
             symTab.insert(
                 {
@@ -658,11 +1021,12 @@ def get_tmp_label() -> str:
 
 
 def get_default_value(type: str):
-    if type.upper() in INTEGER_TYPES:
+    ty = Type.of(type)
+    if ty.is_integer:
         return 0
-    elif type.upper() in FLOATING_POINT_TYPES:
+    elif ty.is_floating_point:
         return 0.0
-    elif type.upper() in CHARACTER_TYPES:
+    elif ty.is_character:
         return 0
     elif type[-1] == "*":
         return "NULL"
@@ -0,0 +1,85 @@
+import hashlib
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import ply
+
+# Set to a directory to relocate the cache, or to "off" to rebuild the tables on every run
+TABLE_CACHE_ENV = "CS335_TABLE_CACHE"
+DEFAULT_TABLE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__tablecache__")
+
+LEXTAB = "cs335_lextab"
+PARSETAB = "cs335_parsetab"
+
+
+def table_cache_enabled() -> bool:
+    return os.environ.get(TABLE_CACHE_ENV, DEFAULT_TABLE_CACHE).lower() not in ("", "0", "off", "none")
+
+
+def get_table_cache_dir(*sources):
+    # Tables are keyed by the PLY version and a hash of the files defining the grammar,
+    # so editing lex.py / parser.py transparently invalidates the cache
+    if not table_cache_enabled():
+        return None
+    digest = hashlib.sha1()
+    for source in sources:
+        with open(source, "rb") as f:
+            digest.update(f.read())
+    cache_dir = os.path.join(
+        os.environ.get(TABLE_CACHE_ENV, DEFAULT_TABLE_CACHE),
+        f"ply-{ply.__version__}",
+        digest.hexdigest()[:16],
+    )
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        _warn(e)
+        return None
+    return cache_dir
+
+
+def _warn(error: OSError) -> None:
+    # Like PLY when it can't write its tables, the compiler goes on with uncached tables
+    sys.stderr.write(f"WARNING: Couldn't use the table cache, building the tables uncached. {error}\n")
+
+
+def load_table_module(cache_dir: str, name: str):
+    path = os.path.join(cache_dir, name + ".py")
+    if not os.path.isfile(path):
+        return None
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except Exception:
+        # Partially written / corrupted table, regenerate it
+        return None
+    return module
+
+
+@contextmanager
+def table_writer(cache_dir: str):
+    # PLY writes the tables in place, so generate them in a scratch directory and move
+    # them over once complete. Concurrent compiler invocations never see a partial table.
+    # Yields None if the cache directory can't be written to
+    try:
+        tmpdir = tempfile.mkdtemp(dir=cache_dir)
+    except OSError as e:
+        _warn(e)
+        yield None
+        return
+    try:
+        yield tmpdir
+        # Errors of the caller's body propagate, only a failed move falls back to no cache
+        try:
+            for f in os.listdir(tmpdir):
+                if f.endswith(".py") or f.endswith(".out"):
+                    os.replace(os.path.join(tmpdir, f), os.path.join(cache_dir, f))
+        except OSError as e:
+            _warn(e)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
@@ -1,4 +1,118 @@
-def get_type_fields(type):
+import re
+from typing import Union
+
+DATATYPE2SIZE = {
+    "VOID": 0,
+    "CHAR": 4,  # Char is not 4 bytes, but this allows us to support all
+    # unicode characters and also prevents potential alignment
+    # issues
+    "SIGNED CHAR": 4,
+    "UNSIGNED CHAR": 4,
+    "SHORT": 2,
+    "SHORT INT": 2,
+    "SIGNED SHORT": 2,
+    "SIGNED SHORT INT": 2,
+    "UNSIGNED SHORT": 2,
+    "UNSIGNED SHORT INT": 2,
+    "INT": 4,
+    "SIGNED INT": 4,
+    "UNSIGNED INT": 4,
+    "SIGNED": 4,
+    "UNSIGNED": 4,
+    "LONG": 8,
+    "LONG INT": 8,
+    "SIGNED LONG INT": 8,
+    "SIGNED LONG": 8,
+    "UNSIGNED LONG": 8,
+    "UNSIGNED LONG INT": 8,
+    "LONG LONG": 8,
+    "LONG LONG INT": 8,
+    "SIGNED LONG LONG": 8,
+    "SIGNED LONG LONG INT": 8,
+    "UNSIGNED LONG LONG": 8,
+    "UNSIGNED LONG LONG INT": 8,
+    "FLOAT": 4,
+    "DOUBLE": 8,
+    "LONG DOUBLE": 16,
+}
+
+
+CHARACTER_TYPES = ["CHAR", "SIGNED CHAR", "UNSIGNED CHAR"]
+
+INTEGER_TYPES = [
+    "SHORT",
+    "SHORT INT",
+    "SIGNED SHORT",
+    "SIGNED SHORT INT",
+    "UNSIGNED SHORT",
+    "UNSIGNED SHORT INT",
+    "INT",
+    "SIGNED INT",
+    "UNSIGNED INT",
+    "SIGNED",
+    "UNSIGNED",
+    "LONG",
+    "LONG INT",
+    "SIGNED LONG INT",
+    "SIGNED LONG",
+    "UNSIGNED LONG",
+    "UNSIGNED LONG INT",
+    "LONG LONG",
+    "LONG LONG INT",
+    "SIGNED LONG LONG",
+    "SIGNED LONG LONG INT",
+    "UNSIGNED LONG LONG",
+    "UNSIGNED LONG LONG INT",
+]
+
+FLOATING_POINT_TYPES = [
+    "FLOAT",
+    "DOUBLE",
+    "LONG DOUBLE",
+]
+
+
+NUMERIC_TYPES = INTEGER_TYPES + FLOATING_POINT_TYPES
+
+BASIC_TYPES = NUMERIC_TYPES + CHARACTER_TYPES
+
+
+QUALIFIERS = ("const", "volatile")
+_INTEGER_SET = frozenset(INTEGER_TYPES)
+_FLOATING_POINT_SET = frozenset(FLOATING_POINT_TYPES)
+_CHARACTER_SET = frozenset(CHARACTER_TYPES)
+# Small integer id of every basic type, indexes CONVERSIONS
+BASIC_TYPE_IDS = {t: i for i, t in enumerate(BASIC_TYPES)}
+
+
+def _usual_arithmetic_conversion(s1: str, s2: str) -> Union[None, str]:
+    # Result of mixing the basic types s1 and s2 (upper case), None if it is ambiguous
+    if s1 == s2:
+        return s1
+    elif s1 == "DOUBLE" or s2 == "DOUBLE":
+        return "DOUBLE"
+    elif s1 == "FLOAT" or s2 == "FLOAT":
+        return "FLOAT"
+    elif DATATYPE2SIZE[s1] > DATATYPE2SIZE[s2]:
+        return s1
+    elif DATATYPE2SIZE[s2] > DATATYPE2SIZE[s1]:
+        return s2
+    elif s1.startswith("UNSIGNED"):
+        return s1
+    elif s2.startswith("UNSIGNED"):
+        return s2
+    return None
+
+
+# CONVERSIONS[i][j] is the type (lower case) the basic types with ids i and j are converted to,
+# or None where the conversion is an error
+CONVERSIONS = [
+    [None if c is None else c.lower() for c in (_usual_arithmetic_conversion(s1, s2) for s2 in BASIC_TYPES)]
+    for s1 in BASIC_TYPES
+]
+
+
+def _parse_type_fields(type: str) -> dict:
     entry = {}
     entry["pointer_lvl"] = type.count("*")
     if entry["pointer_lvl"] > 0:
@@ -24,6 +138,109 @@ def get_type_fields(type):
     return entry
 
 
+_KEYWORDS = frozenset(
+    ("void", "char", "short", "int", "long", "float", "double", "signed", "unsigned", "struct", "union", "enum")
+    + QUALIFIERS
+)
+_TAG_KEYWORDS = ("struct", "union", "enum")
+_SPELLING_TOKENS = re.compile(r"[*\[\]]|[^\s*\[\]]+")
+
+
+def _canonical_spelling(spelling: str) -> str:
+    # Single spaces between words, none around "*", "[" and "]", and the keywords in lower case
+    # (but not a tag that happens to be spelled like one)
+    words = []
+    prev = None
+    for token in _SPELLING_TOKENS.findall(spelling):
+        lower = token.lower()
+        if lower in _KEYWORDS and prev not in _TAG_KEYWORDS:
+            token = lower
+        if prev is not None and prev not in "*[]" and token not in "*[]":
+            words.append(" ")
+        words.append(token)
+        prev = lower
+    return "".join(words)
+
+
+class Type:
+    # Interned type. Types still travel through the compiler as their spelling ("int*",
+    # "float[3][2]", "struct foo"), Type.of parses a spelling once and returns the same object for
+    # every later use, so two types are equal iff they are the same object. Spellings that only
+    # differ in case or spacing ("unsigned int", "UNSIGNED  INT") are the same type, its spelling
+    # is the canonical one
+    __slots__ = (
+        "spelling",
+        "upper",
+        "base",
+        "pointer_lvl",
+        "dimensions",
+        "qualifiers",
+        "fields",
+        "unpointed",
+        "size",
+        "is_integer",
+        "is_floating_point",
+        "is_character",
+        "is_basic",
+        "type_id",
+        "aggregate",
+    )
+
+    def __init__(self, spelling: str) -> None:
+        self.spelling = spelling
+        self.upper = spelling.upper()
+        # Only meant for get_type_fields, never modified
+        self.fields = _parse_type_fields(spelling)
+        words = self.fields["type"].split()
+        self.qualifiers = frozenset(w for w in words if w in QUALIFIERS)
+        self.base = self.fields["type"]
+        self.pointer_lvl = self.fields["pointer_lvl"]
+        # None for an unsized ("[]") dimension
+        self.dimensions = tuple(
+            None if d == "variable" else d["value"] for d in self.fields.get("dimensions", ())
+        )
+        # Spelling without the pointers, used for the size of the pointee
+        self.unpointed = spelling.replace("*", "").strip()
+        # Categories of the whole spelling, a pointer to int is not an integer type
+        self.size = DATATYPE2SIZE.get(self.upper, None)
+        self.is_integer = self.upper in _INTEGER_SET
+        self.is_floating_point = self.upper in _FLOATING_POINT_SET
+        self.is_character = self.upper in _CHARACTER_SET
+        self.type_id = BASIC_TYPE_IDS.get(self.upper, None)
+        self.is_basic = self.type_id is not None
+        self.aggregate = None
+        for prefix in ("struct ", "union ", "enum "):
+            if spelling.startswith(prefix):
+                self.aggregate = prefix[:-1]
+
+    # Any spelling seen -> Type, a plain dict lookup once the spelling has been seen
+    _interned = {}
+
+    @classmethod
+    def of(cls, spelling: str) -> "Type":
+        # The only way types should be created
+        try:
+            return cls._interned[spelling]
+        except KeyError:
+            canonical = _canonical_spelling(spelling)
+            t = cls._interned.get(canonical, None)
+            if t is None:
+                t = cls._interned[canonical] = cls(canonical)
+            cls._interned[spelling] = t
+            return t
+
+    def __repr__(self) -> str:
+        return f"Type({self.spelling!r})"
+
+
+def get_type_fields(type: Union[str, Type]) -> dict:
+    # A fresh dict every time, callers modify it
+    fields = (type if isinstance(type, Type) else Type.of(type)).fields
+    if not fields["is_array"]:
+        return dict(fields)
+    return {**fields, "dimensions": [d if isinstance(d, str) else dict(d) for d in fields["dimensions"]]}
+
+
 def get_flookup_type(p):
     final_type = p["type"] + "*" * p.get("pointer_lvl", 0)
     if p.get("is_array", False):
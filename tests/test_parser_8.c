@@ -0,0 +1,27 @@
+// Typedef names redeclared as objects in a declarator list
+typedef int T;
+
+struct Pair {
+    T first, second;
+};
+
+int main(){
+    T a, b;
+    a = 1;
+    b = 2;
+    {
+        int x, T;
+        T = 4;
+        x = T + a;
+    }
+    {
+        T *p, T;
+        T = b;
+        p = &T;
+    }
+    {
+        int y = 3, T = 5;
+        a = y + T;
+    }
+    return a;
+}